@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+
+import numpy as np
+
+from pokerapp.entity.cards import CARD_BY_CODE
+from pokerapp.model.handevaluator import HandEvaluator
+from pokerapp.model.winnerdetermination import WinnerDetermination
+
+
+def random_hands(count: int, seed: int) -> np.ndarray:
+    rnd = np.random.default_rng(seed)
+    return np.argsort(rnd.random((count, 52)), axis=1)[:, :7]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare batch and scalar 7-card hand scoring.",
+    )
+    parser.add_argument("--hands", type=int, default=1_000_000)
+    parser.add_argument("--scalar-hands", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    determinator = WinnerDetermination()
+    hands = random_hands(args.hands, args.seed)
+
+    start = time.perf_counter()
+    determinator.score_batch(hands)
+    batch_sec = time.perf_counter() - start
+
+    scalar_codes = hands[:args.scalar_hands].tolist()
+    start = time.perf_counter()
+    for codes in scalar_codes:
+        HandEvaluator.score_codes(codes)
+    lookup_sec = time.perf_counter() - start
+
+    scalar_cards = [
+        [CARD_BY_CODE[c] for c in codes]
+        for codes in scalar_codes[:args.scalar_hands // 10]
+    ]
+    start = time.perf_counter()
+    for cards in scalar_cards:
+        determinator._best_hand_score(determinator._make_combinations(cards))
+    reference_sec = time.perf_counter() - start
+
+    rows = [
+        ("score_batch", len(hands), batch_sec),
+        ("HandEvaluator.score_codes", len(scalar_codes), lookup_sec),
+        ("_best_hand_score", len(scalar_cards), reference_sec),
+    ]
+    for name, count, sec in rows:
+        print(f"{name:<28}{count / sec:>14,.0f} hands/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+from pokerapp.entity.cards import CARD_BY_CODE, Cards, get_cards
+from pokerapp.entity.entities import Money
+from pokerapp.entity.game import Game
+from pokerapp.entity.player import Player
+from pokerapp.entity.wallet import Wallet
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.model.handwallet import reserve_hand, settle_hand
+from pokerapp.model.rangeequity import parse_range, range_equity
+from pokerapp.model.roundratemodel import RoundRateModel
+from pokerapp.model.walletmanagermodel import WalletManagerModel
+from pokerapp.model.winnerdetermination import WinnerDetermination
+
+PLAYER_COUNTS = range(2, 9)
+RANGE_FLOPS = 3
+
+
+class MemoryWallet(Wallet):
+    """ Wallet kept in a dict, so finish_rate runs without Redis. """
+
+    def __init__(self, money: Money = 0):
+        self._money = money
+        self._authorized: Dict[str, Money] = {}
+
+    def inc(self, amount: Money = 0) -> None:
+        self._money += amount
+
+    def inc_authorized_money(self, game_id: str, amount: Money) -> None:
+        self._authorized[game_id] = self._authorized.get(game_id, 0) + amount
+
+    def authorized_money(self, game_id: str) -> Money:
+        return self._authorized.get(game_id, 0)
+
+    def authorize(self, game_id: str, amount: Money) -> None:
+        self.inc_authorized_money(game_id, amount)
+        self._money -= amount
+
+    def authorize_all(self, game_id: str) -> Money:
+        money = self._money
+        self.authorize(game_id, money)
+        return money
+
+    def value(self) -> Money:
+        return self._money
+
+    def approve(self, game_id: str) -> None:
+        self._authorized.pop(game_id, None)
+
+
+def random_cards(rnd: random.Random, count: int) -> Cards:
+    return [CARD_BY_CODE[c] for c in rnd.sample(range(52), count)]
+
+
+def new_player(user_id: int, wallet: Wallet) -> Player:
+    return Player(
+        user_id=str(user_id),
+        user_name=str(user_id),
+        mention_markdown="@" + str(user_id),
+        wallet=wallet,
+        ready_message_id="",
+    )
+
+
+def deal(rnd: random.Random, players_count: int) -> Game:
+    """ A game with dealt hands, a full table and all-ins of any size. """
+    cards = random_cards(rnd, 5 + 2 * players_count)
+    game = Game()
+    game.cards_table = cards[:5]
+    for i in range(players_count):
+        stake = rnd.randint(1, 20) * 10
+        player = new_player(i, MemoryWallet(stake))
+        player.cards = cards[5 + 2 * i:7 + 2 * i]
+        player.wallet.authorize(game.id, stake)
+        game.pot += stake
+        game.players.append(player)
+    return game
+
+
+def measure(
+    name: str,
+    prepare: Callable[[], Callable[[int], object]],
+    ops: int,
+    repeat: int,
+) -> dict:
+    """ Best of `repeat` runs of func(i) for i in range(ops).
+
+        Every run gets a fresh func from prepare(), outside of the timing,
+        so runs do not share caches or paid out games.
+    """
+    runs = []
+    for _ in range(repeat):
+        func = prepare()
+        start = time.perf_counter()
+        for i in range(ops):
+            func(i)
+        runs.append(time.perf_counter() - start)
+
+    best = min(runs)
+    return {
+        "name": name,
+        "ops": ops,
+        "repeat": repeat,
+        "best_sec": best,
+        "mean_sec": sum(runs) / len(runs),
+        "ops_per_sec": ops / best if best > 0 else None,
+    }
+
+
+def _determinate_scores(games: List[Game]) -> Callable[[int], object]:
+    determinator = WinnerDetermination()
+    return lambda i: determinator.determinate_scores(
+        games[i].players, games[i].cards_table,
+    )
+
+
+def _finish_rate(
+    rnd: random.Random,
+    players_count: int,
+    ops: int,
+) -> Callable[[int], object]:
+    determinator = WinnerDetermination()
+    round_rate = RoundRateModel()
+    games = [deal(rnd, players_count) for _ in range(ops)]
+    scores = [
+        determinator.determinate_scores(g.players, g.cards_table)
+        for g in games
+    ]
+    return lambda i: round_rate.finish_rate(games[i], scores[i])
+
+
+def _hand_wallets(players_count: int, ops: int) -> Callable[[int], object]:
+    """ A hand of wallets on the in-memory backend: reserve, bet, settle. """
+    kv = MemoryKv()
+    games = []
+    for i in range(ops):
+        game = Game()
+        for j in range(players_count):
+            user_id = i * players_count + j
+            game.players.append(
+                new_player(user_id, WalletManagerModel(user_id, kv)),
+            )
+        games.append(game)
+
+    def hand(i: int) -> None:
+        game = games[i]
+        reserve_hand(kv, game)
+        for player in game.players:
+            player.wallet.authorize(game.id, 10)
+        settle_hand(kv, game)
+    return hand
+
+
+def _range_equity(flops: List[Cards]) -> Callable[[int], object]:
+    """ Full range against full range on a flop, every runout. """
+    full = parse_range("top 100%")
+    return lambda i: range_equity(full, full, flops[i])
+
+
+def run(ops: int, repeat: int, seed: int) -> List[dict]:
+    rnd = random.Random(seed)
+    determinator = WinnerDetermination()
+    results = []
+
+    hands5 = [random_cards(rnd, 5) for _ in range(ops)]
+    results.append(measure(
+        "check_hand_get_score",
+        lambda: lambda i: determinator._check_hand_get_score(hands5[i]),
+        ops,
+        repeat,
+    ))
+
+    hands7 = [random_cards(rnd, 7) for _ in range(ops // 10)]
+    results.append(measure(
+        "best_hand_score",
+        lambda: lambda i: determinator._best_hand_score(
+            determinator._make_combinations(hands7[i]),
+        ),
+        len(hands7),
+        repeat,
+    ))
+
+    for count in PLAYER_COUNTS:
+        games = [deal(rnd, count) for _ in range(ops // count)]
+        results.append(measure(
+            "determinate_scores_{}p".format(count),
+            lambda: _determinate_scores(games),
+            len(games),
+            repeat,
+        ))
+
+    for count in PLAYER_COUNTS:
+        results.append(measure(
+            "finish_rate_{}p".format(count),
+            lambda: _finish_rate(rnd, count, ops // count),
+            ops // count,
+            repeat,
+        ))
+
+    for count in PLAYER_COUNTS:
+        results.append(measure(
+            "hand_wallets_memory_{}p".format(count),
+            lambda: _hand_wallets(count, ops // count),
+            ops // count,
+            repeat,
+        ))
+
+    flops = [random_cards(rnd, 3) for _ in range(RANGE_FLOPS)]
+    results.append(measure(
+        "range_equity_full_flop",
+        lambda: _range_equity(flops),
+        len(flops),
+        repeat,
+    ))
+
+    results.append(measure(
+        "get_cards",
+        lambda: lambda i: get_cards(),
+        ops,
+        repeat,
+    ))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time hand scoring, showdowns and payouts, "
+                    "print the results as JSON.",
+    )
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="file to write instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": run(args.ops, args.repeat, args.seed),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import gc
+import random
+import tracemalloc
+from typing import Callable, List, NamedTuple
+from uuid import uuid4
+
+from pokerapp.entity.cards import RANKS, SUITS, Card, card_codes
+from pokerapp.entity.game import Game
+from pokerapp.entity.gamestate import GameState
+from pokerapp.entity.player import Player
+from pokerapp.entity.playerbet import PlayerBet
+from pokerapp.entity.playerstate import PlayerState
+from pokerapp.model.handstrength import HandStrength
+from pokerapp.model.handwallet import HandWallet
+
+STREETS = (
+    GameState.ROUND_PRE_FLOP,
+    GameState.ROUND_FLOP,
+    GameState.ROUND_TURN,
+    GameState.ROUND_RIVER,
+)
+
+
+# The entities as they were before they got slots and packed arrays, for
+# the --baseline numbers: a __dict__ per object, a list of bet objects
+# with dict totals, a list of wallet entry tuples and a deck of new
+# card strings dealt with every game.
+
+class PlainBet:
+    def __init__(self, user_id, amount, game_state):
+        self.user_id = user_id
+        self.amount = amount
+        self.game_state = game_state
+
+
+class PlainLedger:
+    def __init__(self):
+        self._bets = []
+        self._total = 0
+        self._by_player = {}
+        self._by_state = {}
+
+    def append(self, bet: PlainBet) -> None:
+        self._bets.append(bet)
+        self._total += bet.amount
+        self._by_player[bet.user_id] = \
+            self._by_player.get(bet.user_id, 0) + bet.amount
+        self._by_state[bet.game_state] = \
+            self._by_state.get(bet.game_state, 0) + bet.amount
+
+
+class PlainGame:
+    def __init__(self):
+        self.id = str(uuid4())
+        self.pot = 0
+        self.max_round_rate = 0
+        self.state = GameState.INITIAL
+        self.players = []
+        self.cards_table = []
+        self.board_strength = None
+        self.current_player_index = -1
+        self.remain_cards = [Card(rank + suit) for suit in SUITS
+                             for rank in RANKS]
+        random.shuffle(self.remain_cards)
+        self.trading_end_user_id = 0
+        self.ready_users = set()
+        self.last_turn_time = datetime.datetime.now()
+        self.players_bets = PlainLedger()
+        self.all_in_equity = {}
+
+
+class PlainPlayer:
+    def __init__(self, user_id, user_name, mention_markdown, wallet,
+                 ready_message_id):
+        self.user_id = user_id
+        self.user_name = user_name
+        self.mention_markdown = mention_markdown
+        self.state = PlayerState.ACTIVE
+        self.wallet = wallet
+        self.cards = []
+        self.hand_strength = None
+        self.round_rate = 0
+        self.ready_message_id = ready_message_id
+
+
+class PlainHandWallet:
+    def __init__(self, user_id, game_id, stack):
+        self.user_id = user_id
+        self.game_id = game_id
+        self._stack = stack
+        self._authorized = 0
+        self.entries = []
+
+    def authorize(self, game_id: str, amount: int) -> None:
+        self._stack -= amount
+        self.entries.append(("bet", amount, self._stack))
+        self._authorized += amount
+
+
+class Entities(NamedTuple):
+    game: Callable
+    player: Callable
+    wallet: Callable
+    bet: Callable
+
+
+CURRENT = Entities(Game, Player, HandWallet, PlayerBet)
+BASELINE = Entities(PlainGame, PlainPlayer, PlainHandWallet, PlainBet)
+
+
+def idle_table(rnd: random.Random, entities: Entities = CURRENT):
+    """ The game every chat gets with its first update. """
+    return entities.game()
+
+
+def active_table(
+    rnd: random.Random,
+    entities: Entities = CURRENT,
+    players_count: int = 6,
+    raises: int = 2,
+):
+    """ A hand on the river: dealt players, five table cards and every
+        player calling a few raises on every street.
+    """
+    game = entities.game()
+    game.state = GameState.ROUND_RIVER
+    game.board_strength = HandStrength()
+    for i in range(players_count):
+        user_id = rnd.getrandbits(40)
+        player = entities.player(
+            user_id=user_id,
+            user_name="player" + str(i),
+            mention_markdown="[player{}](tg://user?id={})".format(
+                i, user_id,
+            ),
+            wallet=entities.wallet(user_id, game.id, 1000),
+            ready_message_id=str(rnd.getrandbits(20)),
+        )
+        player.cards = [game.remain_cards.pop() for _ in range(2)]
+        player.hand_strength = HandStrength(card_codes(player.cards))
+        game.players.append(player)
+        game.ready_users.add(user_id)
+
+    for street in STREETS:
+        game.state = street
+        for _ in range(raises + 1):
+            for player in game.players:
+                player.wallet.authorize(game.id, 10)
+                game.players_bets.append(
+                    entities.bet(player.user_id, 10, street),
+                )
+    game.cards_table = [game.remain_cards.pop() for _ in range(5)]
+    return game
+
+
+def bytes_per_table(
+    build: Callable[[random.Random, Entities], Game],
+    entities: Entities,
+    tables: int,
+    seed: int,
+) -> float:
+    """ Memory the tables hold once built, by tracemalloc. """
+    rnd = random.Random(seed)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games: List[Game] = [build(rnd, entities) for _ in range(tables)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(games) == tables
+    return (after - before) / tables
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Bytes held by idle and active tables.",
+    )
+    parser.add_argument("--tables", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--baseline", action="store_true",
+        help="also measure plain copies of the entities as they were "
+             "before slots and packed arrays",
+    )
+    args = parser.parse_args()
+
+    columns = [("current", CURRENT)]
+    if args.baseline:
+        columns.insert(0, ("baseline", BASELINE))
+
+    print("{:<8}".format("") + "".join(
+        "{:>10}".format(name) for name, _ in columns
+    ))
+    for name, build in (("idle", idle_table), ("active", active_table)):
+        print("{:<8}".format(name) + "".join(
+            "{:>10.0f}".format(
+                bytes_per_table(build, entities, args.tables, args.seed),
+            )
+            for _, entities in columns
+        ) + " bytes/table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable
+
+from telegram import Update
+from telegram.ext import Dispatcher
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_WORKERS = 8
+# Updates a mailbox handles before it lets the other chats take the
+# worker, so a busy chat can not hold a worker forever.
+MAILBOX_BATCH = 16
+
+
+class _ChatTask:
+    """ A call that waits its turn in the mailbox of a chat. """
+
+    def __init__(self, callback: Callable[[], Any]):
+        self.callback = callback
+        self.future: Future = Future()
+
+    def run(self) -> None:
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            self.future.set_result(self.callback())
+        except Exception as e:
+            self.future.set_exception(e)
+
+
+class ChatDispatcher(Dispatcher):
+    """
+    Handles updates on a pool of threads, one update of a chat at a
+    time and in the order they came. Every chat is an actor: updates go
+    to the mailbox of the chat and only the chat's current task takes
+    them out, so the handlers never see two updates of one chat at
+    once while different chats run side by side.
+    """
+
+    def __init__(
+        self,
+        *args,
+        dispatch_workers: int = DISPATCH_WORKERS,
+        **kwargs,
+    ):
+        super(ChatDispatcher, self).__init__(*args, **kwargs)
+        self._pool = ThreadPoolExecutor(
+            max_workers=dispatch_workers,
+            thread_name_prefix="chat",
+        )
+        self._mailboxes: Dict[Hashable, Deque[object]] = {}
+        self._mailboxes_lock = threading.Lock()
+
+    @staticmethod
+    def _chat_of(update: object) -> Hashable:
+        """ The chat id, updates without a chat share one mailbox. """
+        if isinstance(update, Update) and update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    def process_update(self, update: object) -> None:
+        self._post(self._chat_of(update), update)
+
+    def run_in_chat(
+        self,
+        chat_id: Hashable,
+        callback: Callable[[], Any],
+    ) -> Future:
+        """ Calls back after the updates of the chat that came before,
+            and before the ones that come after.
+        """
+        task = _ChatTask(callback)
+        self._post(chat_id, task)
+        return task.future
+
+    def _post(self, chat_id: Hashable, update: object) -> None:
+        with self._mailboxes_lock:
+            mailbox = self._mailboxes.get(chat_id)
+            if mailbox is not None:
+                mailbox.append(update)
+                return
+            # A chat without a mailbox has no running task, it is
+            # started with the update in its new mailbox.
+            self._mailboxes[chat_id] = deque((update,))
+        try:
+            self._pool.submit(self._drain, chat_id)
+        except RuntimeError:
+            # The pool is shut down, nothing else runs for the chat.
+            self._drain(chat_id)
+
+    def _drain(self, chat_id: Hashable) -> None:
+        while True:
+            for _ in range(MAILBOX_BATCH):
+                with self._mailboxes_lock:
+                    mailbox = self._mailboxes[chat_id]
+                    update = mailbox[0]
+                try:
+                    if isinstance(update, _ChatTask):
+                        update.run()
+                    else:
+                        super(ChatDispatcher, self).process_update(update)
+                except Exception:
+                    logger.exception("update of chat %s failed", chat_id)
+
+                with self._mailboxes_lock:
+                    mailbox.popleft()
+                    if not mailbox:
+                        del self._mailboxes[chat_id]
+                        return
+            try:
+                self._pool.submit(self._drain, chat_id)
+                return
+            except RuntimeError:
+                # The pool is shutting down, the rest is handled here.
+                pass
+
+    def stop(self) -> None:
+        """ Stops taking updates, waits for the mailboxes to empty. """
+        super(ChatDispatcher, self).stop()
+        self._pool.shutdown(wait=True)
@@ -3,6 +3,10 @@ import os
 
 class Config:
     def __init__(self):
+        self.KV_BACKEND: str = os.getenv(
+            "POKERBOT_KV_BACKEND",
+            default="redis",
+        )
         self.REDIS_HOST: str = os.getenv(
             "POKERBOT_REDIS_HOST",
             default="localhost",
@@ -19,10 +23,94 @@ class Config:
             "POKERBOT_REDIS_DB",
             default="0"
         ))
+        self.REDIS_POOL_SIZE: int = int(os.getenv(
+            "POKERBOT_REDIS_POOL_SIZE",
+            default="16"
+        ))
+        self.REDIS_POOL_TIMEOUT: float = float(os.getenv(
+            "POKERBOT_REDIS_POOL_TIMEOUT",
+            default="5.0"
+        ))
+        self.REDIS_SOCKET_TIMEOUT: float = float(os.getenv(
+            "POKERBOT_REDIS_SOCKET_TIMEOUT",
+            default="5.0"
+        ))
+        self.REDIS_CONNECT_TIMEOUT: float = float(os.getenv(
+            "POKERBOT_REDIS_CONNECT_TIMEOUT",
+            default="2.0"
+        ))
+        self.KV_METRICS_INTERVAL: float = float(os.getenv(
+            "POKERBOT_KV_METRICS_INTERVAL",
+            default="600"
+        ))
         self.TOKEN: str = os.getenv(
             "POKERBOT_TOKEN",
             default="",
         )
+        self.EQUITY_TRIALS: int = int(os.getenv(
+            "POKERBOT_EQUITY_TRIALS",
+            default="20000"
+        ))
+        self.EQUITY_WORKERS: int = int(os.getenv(
+            "POKERBOT_EQUITY_WORKERS",
+            default="2"
+        ))
+        self.EQUITY_TIME_BUDGET: float = float(os.getenv(
+            "POKERBOT_EQUITY_TIME_BUDGET",
+            default="2.0"
+        ))
+        self.EQUITY_EXACT_LIMIT: int = int(os.getenv(
+            "POKERBOT_EQUITY_EXACT_LIMIT",
+            default="1128"
+        ))
+        self.RESERVATION_MAX_AGE: float = float(os.getenv(
+            "POKERBOT_RESERVATION_MAX_AGE",
+            default="21600"
+        ))
+        self.JOURNAL_RETENTION: float = float(os.getenv(
+            "POKERBOT_JOURNAL_RETENTION",
+            default="604800"
+        ))
+        self.JOURNAL_FILE: str = os.getenv(
+            "POKERBOT_JOURNAL_FILE",
+            default="",
+        )
+        self.SNAPSHOT_DELAY: float = float(os.getenv(
+            "POKERBOT_SNAPSHOT_DELAY",
+            default="1.0"
+        ))
+        self.INGEST: str = os.getenv(
+            "POKERBOT_INGEST",
+            default="polling",
+        )
+        self.WEBHOOK_LISTEN: str = os.getenv(
+            "POKERBOT_WEBHOOK_LISTEN",
+            default="0.0.0.0",
+        )
+        self.WEBHOOK_PORT: int = int(os.getenv(
+            "POKERBOT_WEBHOOK_PORT",
+            default="8443"
+        ))
+        self.WEBHOOK_URL: str = os.getenv(
+            "POKERBOT_WEBHOOK_URL",
+            default="",
+        )
+        self.DISPATCH_WORKERS: int = int(os.getenv(
+            "POKERBOT_DISPATCH_WORKERS",
+            default="8"
+        ))
+        self.SHARDED: bool = bool(os.getenv(
+            "POKERBOT_SHARDED",
+            default="0"
+        ) == "1")
+        self.NODE_ID: str = os.getenv(
+            "POKERBOT_NODE_ID",
+            default="",
+        )
+        self.CHAT_LEASE: float = float(os.getenv(
+            "POKERBOT_CHAT_LEASE",
+            default="30"
+        ))
         self.DEBUG: bool = bool(os.getenv(
             "POKERBOT_DEBUG",
             default="0"
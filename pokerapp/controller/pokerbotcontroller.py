@@ -6,6 +6,7 @@ from telegram.ext import (
     CommandHandler,
     CallbackQueryHandler,
     CallbackContext,
+    TypeHandler,
     Updater,
 )
 
@@ -27,8 +28,16 @@ class PokerBotController:
             ('reset_game', 'Reset game and refund players', self._handle_reset_game),
             ('top_up', 'Top up your balance.', self._handle_top_up),
             ('table', 'Show the table.', self._show_table),
+            ('odds', 'Show your odds to win.', self._handle_odds),
+            ('top', 'Show the richest players.', self._handle_top),
         ]
 
+        # Group -1 runs before the handlers of the commands and buttons.
+        updater.dispatcher.add_handler(
+            TypeHandler(Update, self._model.restore_game),
+            group=-1,
+        )
+
         model._bot.set_my_commands(list(map(lambda e: BotCommand('/' + e[0], e[1]), commands)))
 
         list(map(lambda e: updater.dispatcher.add_handler(CommandHandler(e[0], e[2])), commands))
@@ -68,6 +77,12 @@ class PokerBotController:
     def _handle_top_up(self, update: Update, context: CallbackContext) -> None:
         self._model.top_up(update, context)
 
+    def _handle_odds(self, update: Update, context: CallbackContext) -> None:
+        self._model.odds(update, context)
+
+    def _handle_top(self, update: Update, context: CallbackContext) -> None:
+        self._model.top(update, context)
+
     def _show_table(self, update: Update, context: CallbackContext) -> None:
         self._model.show_table(update, context)
 
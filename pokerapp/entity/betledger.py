@@ -0,0 +1,86 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List
+
+from pokerapp.entity.entities import Money, UserId
+from pokerapp.entity.gamestate import GameState
+from pokerapp.entity.playerbet import PlayerBet
+
+_STATES = list(GameState)
+
+
+class BetLedger:
+    """
+    Append-only record of the bets of a game with running totals by
+    player and by game state.
+
+    Bets are packed in parallel arrays: the index of the player, the
+    amount and the game state as a small int. A table has a handful of
+    players, so they are looked up in a list rather than a dict.
+    """
+
+    __slots__ = (
+        "_players",
+        "_player_totals",
+        "_bet_players",
+        "_amounts",
+        "_states",
+        "_by_state",
+        "_total",
+    )
+
+    def __init__(self, bets: Iterable[PlayerBet] = ()):
+        self._players: List[UserId] = []
+        self._player_totals = array("q")
+        self._bet_players = array("H")
+        self._amounts = array("q")
+        self._states = array("b")
+        self._by_state = array("q", [0]) * len(_STATES)
+        self._total: Money = 0
+        for bet in bets:
+            self.append(bet)
+
+    def _player_index(self, user_id: UserId) -> int:
+        try:
+            return self._players.index(user_id)
+        except ValueError:
+            return -1
+
+    def append(self, bet: PlayerBet) -> None:
+        i = self._player_index(bet.user_id)
+        if i < 0:
+            i = len(self._players)
+            self._players.append(bet.user_id)
+            self._player_totals.append(0)
+        self._bet_players.append(i)
+        self._amounts.append(bet.amount)
+        self._states.append(bet.game_state.value)
+        self._total += bet.amount
+        self._player_totals[i] += bet.amount
+        self._by_state[bet.game_state.value] += bet.amount
+
+    def total(self) -> Money:
+        return self._total
+
+    def player_total(self, user_id: UserId) -> Money:
+        i = self._player_index(user_id)
+        return self._player_totals[i] if i >= 0 else 0
+
+    def state_total(self, game_state: GameState) -> Money:
+        return self._by_state[game_state.value]
+
+    def player_totals(self) -> Dict[UserId, Money]:
+        return dict(zip(self._players, self._player_totals))
+
+    def __iter__(self) -> Iterator[PlayerBet]:
+        for i, amount, state in zip(
+            self._bet_players, self._amounts, self._states,
+        ):
+            yield PlayerBet(self._players[i], amount, _STATES[state])
+
+    def __len__(self) -> int:
+        return len(self._amounts)
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, [
+            (b.user_id, b.amount, b.game_state) for b in self
+        ])
@@ -1,10 +1,35 @@
 #!/usr/bin/env python3
+"""
+Cards and their integer codes.
+
+Games, players and decks hold Card strings, the ones of DECK. Integer
+codes, rank index (0..12 for 2..A) in the high bits and suit index
+(0..3) in the low two, so code = rank << 2 | suit, are used where hands
+are scored and odds computed: card_codes() converts at that boundary.
+A set of cards there is a 64-bit deck mask with the bit 1 << code set
+for each card.
+"""
 
 import random
-from typing import List
+from typing import Iterable, List, Tuple
+
+CardCode = int
+DeckMask = int
+
+RANKS = ("2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A")
+SUITS = ("♥", "♦", "♣", "♠")
+SUIT_ALIASES = {"♡": "♥", "♢": "♦", "♧": "♣", "♤": "♠"}
+
+# The mask of every card code.
+CODE_MASKS: Tuple[DeckMask, ...] = tuple(
+    1 << code for code in range(len(RANKS) * len(SUITS))
+)
+FULL_DECK_MASK: DeckMask = (1 << len(CODE_MASKS)) - 1
 
 
 class Card(str):
+    __slots__ = ()
+
     @property
     def suit(self) -> str:
         return self[-1:]
@@ -14,36 +39,101 @@ class Card(str):
         return self[:-1]
 
     @property
-    def value(self) -> str:
-        if self[0] == "J":
-            return 11
-        elif self[0] == "Q":
-            return 12
-        elif self[0] == "K":
-            return 13
-        elif self[0] == "A":
-            return 14
-        return int(self[:-1])
+    def value(self) -> int:
+        value = _VALUE_BY_RANK.get(self[:-1])
+        if value is None:
+            raise ValueError("unknown card rank: " + self)
+        return value
+
+    @property
+    def code(self) -> CardCode:
+        return CODE_BY_CARD[self]
+
+    @staticmethod
+    def from_code(code: CardCode) -> "Card":
+        return CARD_BY_CODE[code]
 
 
 Cards = List[Card]
 
+_VALUE_BY_RANK = {rank: i + 2 for i, rank in enumerate(RANKS)}
+
+CARD_BY_CODE: Cards = [
+    Card(rank + suit) for rank in RANKS for suit in SUITS
+]
+CODE_BY_CARD = {card: code for code, card in enumerate(CARD_BY_CODE)}
+CODE_BY_CARD.update({
+    rank + alias: CODE_BY_CARD[rank + suit]
+    for alias, suit in SUIT_ALIASES.items()
+    for rank in RANKS
+})
+
+
+def card_codes(cards: Iterable[str]) -> List[CardCode]:
+    return [CODE_BY_CARD[card] for card in cards]
+
+
+def codes_mask(codes: Iterable[CardCode]) -> DeckMask:
+    mask = 0
+    for code in codes:
+        mask |= CODE_MASKS[code]
+    return mask
+
+
+def cards_mask(cards: Iterable[str]) -> DeckMask:
+    return codes_mask(CODE_BY_CARD[card] for card in cards)
+
+
+def mask_codes(mask: DeckMask) -> List[CardCode]:
+    """ The codes of the cards in the mask, lowest first. """
+    codes = []
+    while mask:
+        low = mask & -mask
+        codes.append(low.bit_length() - 1)
+        mask ^= low
+    return codes
+
+
+def mask_cards(mask: DeckMask) -> Cards:
+    return [CARD_BY_CODE[code] for code in mask_codes(mask)]
+
+
+# The deck of every game in code order. It is never changed, games keep
+# shuffled lists of references to its interned cards.
+DECK: Tuple[Card, ...] = tuple(CARD_BY_CODE)
+
+# SystemRandom reads os.urandom and keeps no state of its own, so one
+# instance serves every game and thread.
+_system_random = random.SystemRandom()
+
+_DRAW_BITS = 32
+_DRAW_MASK = (1 << _DRAW_BITS) - 1
+# Draws at or above the limit of a position are rejected, so every
+# position is equally likely.
+_DRAW_LIMITS = [
+    (1 << _DRAW_BITS) - (1 << _DRAW_BITS) % (i + 1)
+    for i in range(len(DECK))
+]
+
+
+def shuffled_codes() -> bytearray:
+    """ A random permutation of the card codes.
+
+        Fisher-Yates with the bits of all swaps taken in one read of
+        the system random source, rather than a read per swap.
+    """
+    codes = bytearray(range(len(DECK)))
+    bits = _system_random.getrandbits(_DRAW_BITS * (len(DECK) - 1))
+    for i in range(len(DECK) - 1, 0, -1):
+        draw = bits & _DRAW_MASK
+        bits >>= _DRAW_BITS
+        while draw >= _DRAW_LIMITS[i]:
+            draw = _system_random.getrandbits(_DRAW_BITS)
+        j = draw % (i + 1)
+        codes[i], codes[j] = codes[j], codes[i]
+    return codes
+
 
 def get_cards() -> Cards:
-    cards = [
-        Card("2♥"), Card("3♥"), Card("4♥"), Card("5♥"),
-        Card("6♥"), Card("7♥"), Card("8♥"), Card("9♥"),
-        Card("10♥"), Card("J♥"), Card("Q♥"), Card("K♥"),
-        Card("A♥"), Card("2♦"), Card("3♦"), Card("4♦"),
-        Card("5♦"), Card("6♦"), Card("7♦"), Card("8♦"),
-        Card("9♦"), Card("10♦"), Card("J♦"), Card("Q♦"),
-        Card("K♦"), Card("A♦"), Card("2♣"), Card("3♣"),
-        Card("4♣"), Card("5♣"), Card("6♣"), Card("7♣"),
-        Card("8♣"), Card("9♣"), Card("10♣"), Card("J♣"),
-        Card("Q♣"), Card("K♣"), Card("A♣"), Card("2♠"),
-        Card("3♠"), Card("4♠"), Card("5♠"), Card("6♠"),
-        Card("7♠"), Card("8♠"), Card("9♠"), Card("10♠"),
-        Card("J♠"), Card("Q♠"), Card("K♠"), Card("A♠"),
-    ]
-    random.SystemRandom().shuffle(cards)
-    return cards
+    """ A shuffled deck of the interned cards of DECK. """
+    return [DECK[code] for code in shuffled_codes()]
@@ -0,0 +1,25 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass(frozen=True)
+class PlayerEquity:
+    """
+    Win and tie percentages of one hand, margin is the 95% confidence
+    bound of the win percentage.
+    """
+
+    win: float
+    tie: float
+    margin: float = 0.0
+
+    @property
+    def equity(self) -> float:
+        return self.win + self.tie / 2
+
+
+@dataclass(frozen=True)
+class EquityResult:
+    players: List[PlayerEquity]
+    trials: int
+    exact: bool = False
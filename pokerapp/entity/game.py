@@ -1,8 +1,11 @@
 import datetime
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from uuid import uuid4
 
-from pokerapp.entity.cards import get_cards
+from pokerapp.entity.betledger import BetLedger
+from pokerapp.entity.cards import Cards, get_cards
+from pokerapp.entity.entities import UserId
+from pokerapp.entity.equity import PlayerEquity
 from pokerapp.entity.gamestate import GameState
 from pokerapp.entity.player import Player
 from pokerapp.entity.playerbet import PlayerBet
@@ -10,6 +13,23 @@ from pokerapp.entity.playerstate import PlayerState
 
 
 class Game:
+    __slots__ = (
+        "id",
+        "pot",
+        "max_round_rate",
+        "state",
+        "players",
+        "cards_table",
+        "board_strength",
+        "current_player_index",
+        "_remain_cards",
+        "trading_end_user_id",
+        "ready_users",
+        "last_turn_time",
+        "_players_bets",
+        "all_in_equity",
+    )
+
     def __init__(self):
         self.reset()
 
@@ -20,15 +40,47 @@ class Game:
         self.state = GameState.INITIAL
         self.players: List[Player] = []
         self.cards_table = []
+        # HandStrength of the cards on the table.
+        self.board_strength = None
         self.current_player_index = -1
-        self.remain_cards = get_cards()
+        # Shuffled when the hand first deals, games of chats that never
+        # play do not pay for a deck.
+        self._remain_cards: Optional[Cards] = None
         self.trading_end_user_id = 0
         self.ready_users = set()
         self.last_turn_time = datetime.datetime.now()
-        self.players_bets: List[PlayerBet] = []
+        self.players_bets = BetLedger()
+        self.all_in_equity: Dict[UserId, PlayerEquity] = {}
+
+    @property
+    def remain_cards(self) -> Cards:
+        if self._remain_cards is None:
+            self._remain_cards = get_cards()
+        return self._remain_cards
+
+    @remain_cards.setter
+    def remain_cards(self, cards: Cards) -> None:
+        self._remain_cards = cards
+
+    @property
+    def has_deck(self) -> bool:
+        """ Whether the deck of the hand has been shuffled. """
+        return self._remain_cards is not None
+
+    @property
+    def players_bets(self) -> BetLedger:
+        return self._players_bets
+
+    @players_bets.setter
+    def players_bets(self, bets: Iterable[PlayerBet]) -> None:
+        if not isinstance(bets, BetLedger):
+            bets = BetLedger(bets)
+        self._players_bets = bets
 
     def players_by(self, states: Tuple[PlayerState]) -> List[Player]:
         return list(filter(lambda p: p.state in states, self.players))
 
     def __repr__(self):
-        return "{}({!r})".format(self.__class__.__name__, self.__dict__)
+        return "{}({!r})".format(self.__class__.__name__, {
+            name: getattr(self, name) for name in Game.__slots__
+        })
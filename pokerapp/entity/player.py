@@ -4,6 +4,18 @@ from pokerapp.entity.wallet import Wallet
 
 
 class Player:
+    __slots__ = (
+        "user_id",
+        "user_name",
+        "mention_markdown",
+        "state",
+        "wallet",
+        "cards",
+        "hand_strength",
+        "round_rate",
+        "ready_message_id",
+    )
+
     def __init__(
             self,
             user_id: UserId,
@@ -18,11 +30,15 @@ class Player:
         self.state = PlayerState.ACTIVE
         self.wallet = wallet
         self.cards = []
+        # HandStrength of the cards and the table, updated every street.
+        self.hand_strength = None
         self.round_rate = 0
         self.ready_message_id = ready_message_id
 
     def __repr__(self):
-        return "{}({!r})".format(self.__class__.__name__, self.__dict__)
+        return "{}({!r})".format(self.__class__.__name__, {
+            name: getattr(self, name) for name in Player.__slots__
+        })
 
     def __eq__(self, other):
         return self.user_id == other.user_id
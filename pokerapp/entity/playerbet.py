@@ -3,6 +3,8 @@ from pokerapp.entity.gamestate import GameState
 
 
 class PlayerBet:
+    __slots__ = ("user_id", "amount", "game_state")
+
     def __init__(self, user_id: UserId, amount: Money, game_state: GameState):
         self.user_id = user_id
         self.amount = amount
@@ -5,6 +5,8 @@ from pokerapp.entity.entities import Money
 
 @abstractmethod
 class Wallet:
+    __slots__ = ()
+
     @staticmethod
     def _prefix(id: int, suffix: str = ""):
         pass
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import redis
+
+Value = Union[bytes, str, int, float]
+
+
+class KvBackend(ABC):
+    """
+    The key-value commands the bot uses, with the arguments and results
+    of redis-py: values come back as bytes, counters as ints and a
+    missing key as None. redis.Redis is registered as an implementation.
+    """
+
+    @abstractmethod
+    def get(self, name: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(
+        self,
+        name: str,
+        value: Value,
+        ex: Optional[int] = None,
+        px: Optional[int] = None,
+        nx: bool = False,
+        xx: bool = False,
+    ) -> Optional[bool]:
+        pass
+
+    @abstractmethod
+    def incrby(self, name: str, amount: int = 1) -> int:
+        pass
+
+    @abstractmethod
+    def delete(self, *names: str) -> int:
+        pass
+
+    @abstractmethod
+    def expire(self, name: str, time: int) -> bool:
+        pass
+
+    @abstractmethod
+    def hget(self, name: str, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def hgetall(self, name: str) -> Dict[bytes, bytes]:
+        pass
+
+    @abstractmethod
+    def hset(self, name: str, key: str, value: Value) -> int:
+        pass
+
+    @abstractmethod
+    def hsetnx(self, name: str, key: str, value: Value) -> int:
+        pass
+
+    @abstractmethod
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        pass
+
+    @abstractmethod
+    def hdel(self, name: str, *keys: str) -> int:
+        pass
+
+    @abstractmethod
+    def rpush(self, name: str, *values: Value) -> int:
+        pass
+
+    @abstractmethod
+    def rpop(self, name: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def lpop(
+        self,
+        name: str,
+        count: Optional[int] = None,
+    ) -> Union[Optional[bytes], Optional[List[bytes]]]:
+        pass
+
+    @abstractmethod
+    def lrange(self, name: str, start: int, end: int) -> List[bytes]:
+        pass
+
+    @abstractmethod
+    def sadd(self, name: str, *values: Value) -> int:
+        pass
+
+    @abstractmethod
+    def smembers(self, name: str) -> Set[bytes]:
+        pass
+
+    @abstractmethod
+    def zadd(
+        self,
+        name: str,
+        mapping: Dict[Value, float],
+        nx: bool = False,
+        xx: bool = False,
+    ) -> int:
+        pass
+
+    @abstractmethod
+    def zrem(self, name: str, *values: Value) -> int:
+        pass
+
+    @abstractmethod
+    def zincrby(self, name: str, amount: float, value: Value) -> float:
+        pass
+
+    @abstractmethod
+    def zscore(self, name: str, value: Value) -> Optional[float]:
+        pass
+
+    @abstractmethod
+    def zcard(self, name: str) -> int:
+        pass
+
+    @abstractmethod
+    def zrevrange(
+        self,
+        name: str,
+        start: int,
+        end: int,
+        withscores: bool = False,
+    ) -> list:
+        pass
+
+    @abstractmethod
+    def zrangebyscore(
+        self,
+        name: str,
+        min: Union[float, str],
+        max: Union[float, str],
+    ) -> List[bytes]:
+        pass
+
+    @abstractmethod
+    def xadd(
+        self,
+        name: str,
+        fields: Dict[Value, Value],
+        id: str = "*",
+        maxlen: Optional[int] = None,
+    ) -> bytes:
+        pass
+
+    @abstractmethod
+    def xrange(
+        self,
+        name: str,
+        min: str = "-",
+        max: str = "+",
+        count: Optional[int] = None,
+    ) -> List[Tuple[bytes, Dict[bytes, bytes]]]:
+        pass
+
+    @abstractmethod
+    def xtrim(
+        self,
+        name: str,
+        maxlen: Optional[int] = None,
+        approximate: bool = True,
+        minid: Optional[str] = None,
+    ) -> int:
+        pass
+
+    @abstractmethod
+    def scan(
+        self,
+        cursor: int = 0,
+        match: Optional[str] = None,
+        count: Optional[int] = None,
+    ) -> Tuple[int, List[bytes]]:
+        pass
+
+    @abstractmethod
+    def pipeline(self, transaction: bool = True):
+        pass
+
+    @abstractmethod
+    def script_load(self, script: str) -> str:
+        pass
+
+    @abstractmethod
+    def evalsha(self, sha: str, numkeys: int, *keys_and_args: Value):
+        pass
+
+
+KvBackend.register(redis.Redis)
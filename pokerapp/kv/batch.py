@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+from typing import List
+
+from pokerapp.kv.backend import KvBackend
+
+_NOT_SENT = object()
+
+
+class PendingRead:
+    """ The result of a read queued in a ReadBatch. """
+
+    def __init__(self, batch: "ReadBatch"):
+        self._batch = batch
+        self._value = _NOT_SENT
+
+    def result(self):
+        if self._value is _NOT_SENT:
+            self._batch.flush()
+        return self._value
+
+
+class ReadBatch:
+    """
+    Independent reads of a handler, sent together in one pipeline the
+    first time the result of any of them is needed.
+    """
+
+    def __init__(self, kv: KvBackend):
+        self._kv = kv
+        self._queued: List[tuple] = []
+
+    def _queue(self, name: str, *args) -> PendingRead:
+        read = PendingRead(self)
+        self._queued.append((read, name, args))
+        return read
+
+    def get(self, name: str) -> PendingRead:
+        return self._queue("get", name)
+
+    def hget(self, name: str, key: str) -> PendingRead:
+        return self._queue("hget", name, key)
+
+    def hgetall(self, name: str) -> PendingRead:
+        return self._queue("hgetall", name)
+
+    def hmget(self, name: str, keys: List[str]) -> PendingRead:
+        return self._queue("hmget", name, keys)
+
+    def lrange(self, name: str, start: int, end: int) -> PendingRead:
+        return self._queue("lrange", name, start, end)
+
+    def zscore(self, name: str, value: str) -> PendingRead:
+        return self._queue("zscore", name, value)
+
+    def flush(self) -> None:
+        queued, self._queued = self._queued, []
+        if not queued:
+            return
+        if len(queued) == 1:
+            read, name, args = queued[0]
+            read._value = getattr(self._kv, name)(*args)
+            return
+
+        pipe = self._kv.pipeline(transaction=False)
+        for _, name, args in queued:
+            getattr(pipe, name)(*args)
+        for (read, _, _), value in zip(queued, pipe.execute()):
+            read._value = value
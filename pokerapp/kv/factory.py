@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import redis
+
+from pokerapp.config import Config
+from pokerapp.kv.backend import KvBackend
+from pokerapp.kv.memory import MemoryKv
+
+KV_BACKEND_REDIS = "redis"
+KV_BACKEND_MEMORY = "memory"
+
+
+def create_pool(cfg: Config) -> redis.BlockingConnectionPool:
+    """ Handlers wait up to REDIS_POOL_TIMEOUT for a free connection
+        instead of opening more than REDIS_POOL_SIZE of them.
+    """
+    return redis.BlockingConnectionPool(
+        max_connections=cfg.REDIS_POOL_SIZE,
+        timeout=cfg.REDIS_POOL_TIMEOUT,
+        host=cfg.REDIS_HOST,
+        port=cfg.REDIS_PORT,
+        db=cfg.REDIS_DB,
+        password=cfg.REDIS_PASS if cfg.REDIS_PASS != "" else None,
+        socket_timeout=cfg.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=cfg.REDIS_CONNECT_TIMEOUT,
+    )
+
+
+def create_kv(cfg: Config) -> KvBackend:
+    """ The backend named by POKERBOT_KV_BACKEND.
+
+        The memory backend keeps its streams in POKERBOT_JOURNAL_FILE,
+        if it is set, so the wallet journal outlives the process.
+    """
+    if cfg.KV_BACKEND == KV_BACKEND_MEMORY:
+        return MemoryKv(stream_log=cfg.JOURNAL_FILE or None)
+    if cfg.KV_BACKEND == KV_BACKEND_REDIS:
+        return redis.Redis(connection_pool=create_pool(cfg))
+    raise ValueError("unknown kv backend: " + cfg.KV_BACKEND)
@@ -0,0 +1,779 @@
+#!/usr/bin/env python3
+
+import bisect
+import fnmatch
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import redis
+
+from pokerapp.kv.backend import KvBackend, Value
+from pokerapp.kv.script import PYTHON_SCRIPTS, script_sha
+
+ResponseError = redis.exceptions.ResponseError
+
+StreamId = Tuple[int, int]
+
+STREAM_SEQ_MAX = 2 ** 64 - 1
+
+WRONG_TYPE = "WRONGTYPE Operation against a key holding the wrong kind " \
+    "of value"
+
+
+class _Hash(dict):
+    pass
+
+
+class _List(list):
+    pass
+
+
+class _Set(set):
+    pass
+
+
+class _ZSet(dict):
+    pass
+
+
+class _Stream(list):
+    """ Entries (id, fields) in the order of their ids. """
+
+    def __init__(self):
+        super().__init__()
+        self.last_id: StreamId = (0, 0)
+
+
+def _name(name: Union[str, bytes]) -> str:
+    return name.decode("utf-8") if isinstance(name, bytes) else str(name)
+
+
+def _encode(value: Value) -> bytes:
+    """ Values are stored the way redis-py sends them. """
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise redis.exceptions.DataError(
+            "Invalid input of type: '{}'".format(type(value).__name__)
+        )
+    return repr(value).encode("utf-8")
+
+
+def _now() -> float:
+    return time.monotonic()
+
+
+def _int(value: bytes) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise ResponseError("value is not an integer or out of range")
+
+
+def _seconds(time: Union[int, timedelta]) -> float:
+    if isinstance(time, timedelta):
+        return time.total_seconds()
+    return float(time)
+
+
+def _parse_id(value: Union[str, bytes], seq: int) -> StreamId:
+    """ "<ms>-<seq>", "<ms>" gets seq, "-" and "+" are the bounds. """
+    value = _name(value)
+    if value == "-":
+        return 0, 0
+    if value == "+":
+        return STREAM_SEQ_MAX, STREAM_SEQ_MAX
+    ms, _, rest = value.partition("-")
+    return int(ms), int(rest) if rest else seq
+
+
+def _format_id(stream_id: StreamId) -> bytes:
+    return "{}-{}".format(*stream_id).encode("utf-8")
+
+
+def _score_bound(bound: Union[float, str]) -> Tuple[float, bool]:
+    """ The score and whether it is excluded, "(1" is 1 excluded. """
+    if isinstance(bound, bytes):
+        bound = bound.decode("utf-8")
+    if isinstance(bound, str) and bound.startswith("("):
+        return float(bound[1:]), True
+    return float(bound), False
+
+
+class MemoryKv(KvBackend):
+    """
+    Strings, hashes, lists, sets, sorted sets and streams kept in the
+    process with the semantics of Redis. Every command, pipeline and
+    script runs under one lock, so each of them is atomic. Keys expire
+    lazily when they are read.
+
+    Only streams survive a restart, and only with stream_log: every
+    entry is appended to that file and trimming a stream rewrites it.
+    """
+
+    def __init__(self, stream_log: Optional[str] = None):
+        self._data: Dict[str, object] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        # The last name returned by a running SCAN, by its cursor.
+        self._scans: Dict[int, str] = {}
+        self._next_scan = 1
+        self._stream_log_path = stream_log
+        self._stream_log = None
+        if stream_log is not None:
+            self._replay_stream_log()
+            self._stream_log = open(stream_log, "a", encoding="utf-8")
+
+    def _live(self, name: str) -> bool:
+        deadline = self._expires.get(name)
+        if deadline is not None and deadline <= _now():
+            del self._expires[name]
+            self._data.pop(name, None)
+        return name in self._data
+
+    def _read(self, name: str, kind: type):
+        name = _name(name)
+        if not self._live(name):
+            return None
+        value = self._data[name]
+        if type(value) is not kind:
+            raise ResponseError(WRONG_TYPE)
+        return value
+
+    def _write(self, name: str, kind: type):
+        value = self._read(name, kind)
+        if value is None:
+            value = kind()
+            self._data[_name(name)] = value
+        return value
+
+    def _drop_if_empty(self, name: str, value) -> None:
+        if not value:
+            self.delete(name)
+
+    # Keys
+
+    def ping(self) -> bool:
+        return True
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+        return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            deleted = 0
+            streams = False
+            for name in map(_name, names):
+                if self._live(name):
+                    streams |= type(self._data.pop(name)) is _Stream
+                    self._expires.pop(name, None)
+                    deleted += 1
+            if streams:
+                self._rewrite_stream_log()
+            return deleted
+
+    def exists(self, *names: str) -> int:
+        with self._lock:
+            return sum(1 for name in map(_name, names) if self._live(name))
+
+    def expire(self, name: str, time: Union[int, timedelta]) -> bool:
+        return self.pexpire(name, _seconds(time) * 1000)
+
+    def pexpire(self, name: str, time: Union[int, timedelta]) -> bool:
+        if isinstance(time, timedelta):
+            time = time.total_seconds() * 1000
+        with self._lock:
+            name = _name(name)
+            if not self._live(name):
+                return False
+            if time <= 0:
+                self.delete(name)
+            else:
+                self._expires[name] = _now() + time / 1000
+            return True
+
+    def persist(self, name: str) -> bool:
+        with self._lock:
+            name = _name(name)
+            return self._live(name) and \
+                self._expires.pop(name, None) is not None
+
+    def pttl(self, name: str) -> int:
+        with self._lock:
+            name = _name(name)
+            if not self._live(name):
+                return -2
+            deadline = self._expires.get(name)
+            if deadline is None:
+                return -1
+            return max(0, round((deadline - _now()) * 1000))
+
+    def ttl(self, name: str) -> int:
+        ms = self.pttl(name)
+        return ms if ms < 0 else round(ms / 1000)
+
+    def rename(self, src: str, dst: str) -> bool:
+        with self._lock:
+            src, dst = _name(src), _name(dst)
+            if not self._live(src):
+                raise ResponseError("no such key")
+            value = self._data.pop(src)
+            deadline = self._expires.pop(src, None)
+            self.delete(dst)
+            self._data[dst] = value
+            if deadline is not None:
+                self._expires[dst] = deadline
+            return True
+
+    def keys(self, pattern: str = "*") -> List[bytes]:
+        with self._lock:
+            return [
+                name.encode("utf-8") for name in list(self._data)
+                if self._live(name) and fnmatch.fnmatchcase(name, pattern)
+            ]
+
+    def scan(
+        self,
+        cursor: int = 0,
+        match: Optional[str] = None,
+        count: Optional[int] = None,
+    ) -> Tuple[int, List[bytes]]:
+        """ Walks the sorted key names, a cursor stands for the last name
+            returned, so keys deleted meanwhile do not shift the walk.
+        """
+        count = count or 10
+        with self._lock:
+            names = sorted(self._data)
+            start = 0
+            if cursor:
+                start = bisect.bisect_right(names, self._scans.pop(cursor))
+            page = names[start:start + count]
+            found = [
+                name.encode("utf-8") for name in page
+                if self._live(name) and
+                (match is None or fnmatch.fnmatchcase(name, match))
+            ]
+            if start + count >= len(names):
+                return 0, found
+            cursor, self._next_scan = self._next_scan, self._next_scan + 1
+            self._scans[cursor] = page[-1]
+            return cursor, found
+
+    # Strings
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            return self._read(name, bytes)
+
+    def set(
+        self,
+        name: str,
+        value: Value,
+        ex: Optional[Union[int, timedelta]] = None,
+        px: Optional[Union[int, timedelta]] = None,
+        nx: bool = False,
+        xx: bool = False,
+        keepttl: bool = False,
+    ) -> Optional[bool]:
+        with self._lock:
+            name = _name(name)
+            exists = self._live(name)
+            if (nx and exists) or (xx and not exists):
+                return None
+            deadline = self._expires.pop(name, None)
+            self._data[name] = _encode(value)
+            if ex is not None:
+                self._expires[name] = _now() + _seconds(ex)
+            elif px is not None:
+                self._expires[name] = _now() + _seconds(px) / 1000
+            elif keepttl and deadline is not None:
+                self._expires[name] = deadline
+            return True
+
+    def incrby(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            value = _int(self._read(name, bytes) or b"0") + amount
+            self._data[_name(name)] = _encode(value)
+            return value
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        return self.incrby(name, amount)
+
+    # Hashes
+
+    def hget(self, name: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            fields = self._read(name, _Hash)
+            return None if fields is None else fields.get(_name(key))
+
+    def hmget(self, name: str, keys: List[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            fields = self._read(name, _Hash) or {}
+            return [fields.get(_name(key)) for key in keys]
+
+    def hgetall(self, name: str) -> Dict[bytes, bytes]:
+        with self._lock:
+            fields = self._read(name, _Hash) or {}
+            return {k.encode("utf-8"): v for k, v in fields.items()}
+
+    def hlen(self, name: str) -> int:
+        with self._lock:
+            return len(self._read(name, _Hash) or ())
+
+    def hset(
+        self,
+        name: str,
+        key: Optional[str] = None,
+        value: Optional[Value] = None,
+        mapping: Optional[Dict[str, Value]] = None,
+    ) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        with self._lock:
+            fields = self._write(name, _Hash)
+            added = 0
+            for k, v in items.items():
+                k = _name(k)
+                added += k not in fields
+                fields[k] = _encode(v)
+            return added
+
+    def hsetnx(self, name: str, key: str, value: Value) -> int:
+        with self._lock:
+            fields = self._write(name, _Hash)
+            if _name(key) in fields:
+                return 0
+            fields[_name(key)] = _encode(value)
+            return 1
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        with self._lock:
+            fields = self._write(name, _Hash)
+            value = _int(fields.get(_name(key), b"0")) + int(amount)
+            fields[_name(key)] = _encode(value)
+            return value
+
+    def hdel(self, name: str, *keys: str) -> int:
+        with self._lock:
+            fields = self._read(name, _Hash)
+            if fields is None:
+                return 0
+            deleted = 0
+            for key in map(_name, keys):
+                if fields.pop(key, None) is not None:
+                    deleted += 1
+            self._drop_if_empty(name, fields)
+            return deleted
+
+    # Lists
+
+    def rpush(self, name: str, *values: Value) -> int:
+        with self._lock:
+            items = self._write(name, _List)
+            items.extend(_encode(v) for v in values)
+            return len(items)
+
+    def lpush(self, name: str, *values: Value) -> int:
+        with self._lock:
+            items = self._write(name, _List)
+            for value in values:
+                items.insert(0, _encode(value))
+            return len(items)
+
+    def rpop(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            items = self._read(name, _List)
+            if not items:
+                return None
+            value = items.pop()
+            self._drop_if_empty(name, items)
+            return value
+
+    def lpop(
+        self,
+        name: str,
+        count: Optional[int] = None,
+    ) -> Union[Optional[bytes], Optional[List[bytes]]]:
+        """ The first item, or a list of up to count first items. """
+        with self._lock:
+            items = self._read(name, _List)
+            if not items:
+                return None
+            if count is None:
+                value = items.pop(0)
+            else:
+                value = items[:count]
+                del items[:count]
+            self._drop_if_empty(name, items)
+            return value
+
+    def llen(self, name: str) -> int:
+        with self._lock:
+            return len(self._read(name, _List) or ())
+
+    def lrange(self, name: str, start: int, end: int) -> List[bytes]:
+        with self._lock:
+            items = self._read(name, _List) or []
+            end = len(items) if end == -1 else end + 1
+            return items[start:end]
+
+    # Sets
+
+    def sadd(self, name: str, *values: Value) -> int:
+        with self._lock:
+            members = self._write(name, _Set)
+            size = len(members)
+            members.update(_encode(v) for v in values)
+            return len(members) - size
+
+    def srem(self, name: str, *values: Value) -> int:
+        with self._lock:
+            members = self._read(name, _Set)
+            if members is None:
+                return 0
+            size = len(members)
+            members.difference_update(_encode(v) for v in values)
+            self._drop_if_empty(name, members)
+            return size - len(members)
+
+    def smembers(self, name: str) -> Set[bytes]:
+        with self._lock:
+            return set(self._read(name, _Set) or ())
+
+    def sismember(self, name: str, value: Value) -> bool:
+        with self._lock:
+            return _encode(value) in (self._read(name, _Set) or ())
+
+    def scard(self, name: str) -> int:
+        with self._lock:
+            return len(self._read(name, _Set) or ())
+
+    # Sorted sets
+
+    def zadd(
+        self,
+        name: str,
+        mapping: Dict[Value, float],
+        nx: bool = False,
+        xx: bool = False,
+    ) -> int:
+        with self._lock:
+            scores = self._write(name, _ZSet)
+            added = 0
+            for member, score in mapping.items():
+                member = _encode(member)
+                exists = member in scores
+                if (nx and exists) or (xx and not exists):
+                    continue
+                added += not exists
+                scores[member] = float(score)
+            self._drop_if_empty(name, scores)
+            return added
+
+    def zincrby(self, name: str, amount: float, value: Value) -> float:
+        with self._lock:
+            scores = self._write(name, _ZSet)
+            member = _encode(value)
+            scores[member] = scores.get(member, 0.0) + float(amount)
+            return scores[member]
+
+    def zrem(self, name: str, *values: Value) -> int:
+        with self._lock:
+            scores = self._read(name, _ZSet)
+            if scores is None:
+                return 0
+            removed = 0
+            for value in values:
+                if scores.pop(_encode(value), None) is not None:
+                    removed += 1
+            self._drop_if_empty(name, scores)
+            return removed
+
+    def zscore(self, name: str, value: Value) -> Optional[float]:
+        with self._lock:
+            scores = self._read(name, _ZSet) or {}
+            return scores.get(_encode(value))
+
+    def zcard(self, name: str) -> int:
+        with self._lock:
+            return len(self._read(name, _ZSet) or ())
+
+    def _sorted(self, name: str) -> List[Tuple[bytes, float]]:
+        scores = self._read(name, _ZSet) or {}
+        return sorted(scores.items(), key=lambda item: (item[1], item[0]))
+
+    def zrange(
+        self,
+        name: str,
+        start: int,
+        end: int,
+        desc: bool = False,
+        withscores: bool = False,
+    ) -> list:
+        with self._lock:
+            items = self._sorted(name)
+            if desc:
+                items.reverse()
+            end = len(items) if end == -1 else end + 1
+            items = items[start:end]
+        return items if withscores else [member for member, _ in items]
+
+    def zrevrange(
+        self,
+        name: str,
+        start: int,
+        end: int,
+        withscores: bool = False,
+    ) -> list:
+        return self.zrange(name, start, end, True, withscores)
+
+    def zrevrank(self, name: str, value: Value) -> Optional[int]:
+        with self._lock:
+            members = [member for member, _ in self._sorted(name)]
+        member = _encode(value)
+        if member not in members:
+            return None
+        return len(members) - 1 - members.index(member)
+
+    def zrangebyscore(
+        self,
+        name: str,
+        min: Union[float, str],
+        max: Union[float, str],
+        withscores: bool = False,
+    ) -> list:
+        low, low_open = _score_bound(min)
+        high, high_open = _score_bound(max)
+        with self._lock:
+            items = self._sorted(name)
+        scores = [score for _, score in items]
+        first = (bisect.bisect_right if low_open else bisect.bisect_left)(
+            scores, low,
+        )
+        last = (bisect.bisect_left if high_open else bisect.bisect_right)(
+            scores, high,
+        )
+        items = items[first:last]
+        return items if withscores else [member for member, _ in items]
+
+    # Streams
+
+    def _replay_stream_log(self) -> None:
+        if not os.path.exists(self._stream_log_path):
+            return
+        with open(self._stream_log_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                stream = self._write(record["key"], _Stream)
+                stream_id = _parse_id(record["id"], 0)
+                stream.append((stream_id, {
+                    k.encode("utf-8"): v.encode("utf-8")
+                    for k, v in record["fields"].items()
+                }))
+                stream.last_id = stream_id
+
+    @staticmethod
+    def _stream_record(name: str, entry: tuple) -> str:
+        stream_id, fields = entry
+        return json.dumps({
+            "key": name,
+            "id": _format_id(stream_id).decode("utf-8"),
+            "fields": {
+                k.decode("utf-8"): v.decode("utf-8")
+                for k, v in fields.items()
+            },
+        }) + "\n"
+
+    def _rewrite_stream_log(self) -> None:
+        """ Writes the streams as they are now and swaps the file. """
+        if self._stream_log is None:
+            return
+        path = self._stream_log_path
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for name, value in self._data.items():
+                if type(value) is _Stream:
+                    for entry in value:
+                        f.write(self._stream_record(name, entry))
+            f.flush()
+            os.fsync(f.fileno())
+        self._stream_log.close()
+        os.replace(path + ".tmp", path)
+        self._stream_log = open(path, "a", encoding="utf-8")
+
+    def xadd(
+        self,
+        name: str,
+        fields: Dict[Value, Value],
+        id: str = "*",
+        maxlen: Optional[int] = None,
+        approximate: bool = True,
+    ) -> bytes:
+        with self._lock:
+            stream = self._write(name, _Stream)
+            last = stream.last_id
+            if id == "*":
+                ms = int(time.time() * 1000)
+                stream_id = (ms, 0) if ms > last[0] else (last[0], last[1] + 1)
+            else:
+                stream_id = _parse_id(id, 0)
+                if stream_id <= last:
+                    raise ResponseError(
+                        "The ID specified in XADD is equal or smaller than "
+                        "the target stream top item"
+                    )
+            entry = (
+                stream_id,
+                {_encode(k): _encode(v) for k, v in fields.items()},
+            )
+            stream.append(entry)
+            stream.last_id = stream_id
+            if self._stream_log is not None:
+                self._stream_log.write(self._stream_record(_name(name), entry))
+                self._stream_log.flush()
+            if maxlen is not None and len(stream) > maxlen:
+                self.xtrim(name, maxlen=maxlen)
+            return _format_id(stream_id)
+
+    def xlen(self, name: str) -> int:
+        with self._lock:
+            return len(self._read(name, _Stream) or ())
+
+    def xrange(
+        self,
+        name: str,
+        min: str = "-",
+        max: str = "+",
+        count: Optional[int] = None,
+    ) -> List[Tuple[bytes, Dict[bytes, bytes]]]:
+        low = _parse_id(min, 0)
+        high = _parse_id(max, STREAM_SEQ_MAX)
+        with self._lock:
+            stream = self._read(name, _Stream) or []
+            first = bisect.bisect_left(stream, (low,))
+            found = []
+            for stream_id, fields in stream[first:]:
+                if stream_id > high or (count is not None and
+                                        len(found) >= count):
+                    break
+                found.append((_format_id(stream_id), dict(fields)))
+            return found
+
+    def xtrim(
+        self,
+        name: str,
+        maxlen: Optional[int] = None,
+        approximate: bool = True,
+        minid: Optional[str] = None,
+    ) -> int:
+        """ Drops the oldest entries, exactly even if approximate. """
+        with self._lock:
+            stream = self._read(name, _Stream)
+            if stream is None:
+                return 0
+            if minid is not None:
+                drop = bisect.bisect_left(stream, (_parse_id(minid, 0),))
+            else:
+                drop = max(0, len(stream) - maxlen)
+            if drop:
+                del stream[:drop]
+                self._rewrite_stream_log()
+            return drop
+
+    def xdel(self, name: str, *ids: str) -> int:
+        with self._lock:
+            stream = self._read(name, _Stream)
+            if stream is None:
+                return 0
+            drop = {_parse_id(i, 0) for i in ids}
+            kept = [entry for entry in stream if entry[0] not in drop]
+            deleted = len(stream) - len(kept)
+            if deleted:
+                stream[:] = kept
+                self._rewrite_stream_log()
+            return deleted
+
+    def close(self) -> None:
+        with self._lock:
+            if self._stream_log is not None:
+                self._stream_log.close()
+                self._stream_log = None
+
+    # Pipelines and scripts
+
+    def pipeline(self, transaction: bool = True) -> "MemoryPipeline":
+        return MemoryPipeline(self)
+
+    def script_load(self, script: str) -> str:
+        sha = script_sha(script)
+        if sha not in PYTHON_SCRIPTS:
+            raise ResponseError("no Python version of the script")
+        return sha
+
+    def evalsha(self, sha: str, numkeys: int, *keys_and_args: Value):
+        """ Runs the Python version of a script registered by LuaScript. """
+        func = PYTHON_SCRIPTS.get(sha)
+        if func is None:
+            raise redis.exceptions.NoScriptError(
+                "No matching script. Please use EVAL."
+            )
+        keys = [_name(key) for key in keys_and_args[:numkeys]]
+        args = list(keys_and_args[numkeys:])
+        with self._lock:
+            return func(self, keys, args)
+
+
+class MemoryPipeline:
+    """
+    Commands queued and run in one go under the lock of the backend,
+    like MULTI/EXEC. Errors of commands are returned in their place or
+    raised after all commands ran.
+    """
+
+    def __init__(self, kv: MemoryKv):
+        self._kv = kv
+        self._commands: List[tuple] = []
+
+    def __getattr__(self, name: str):
+        command = getattr(self._kv, name)
+
+        def queue(*args, **kwargs) -> "MemoryPipeline":
+            self._commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __enter__(self) -> "MemoryPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._commands = []
+
+    def execute(self, raise_on_error: bool = True) -> list:
+        commands, self._commands = self._commands, []
+        results = []
+        with self._kv._lock:
+            for command, args, kwargs in commands:
+                try:
+                    results.append(command(*args, **kwargs))
+                except ResponseError as e:
+                    results.append(e)
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, ResponseError):
+                    raise result
+        return results
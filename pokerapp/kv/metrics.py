@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+import bisect
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from pokerapp.kv.backend import KvBackend
+
+# Upper bounds of the latency buckets in seconds, 50us doubling to ~3s.
+LATENCY_BUCKETS_SEC = tuple(50e-6 * 2 ** i for i in range(17))
+
+PIPELINE = "pipeline"
+
+
+class LatencyHistogram:
+    """ Counts of latencies by bucket, quantiles are bucket bounds. """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_SEC) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_SEC, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                if i == len(LATENCY_BUCKETS_SEC):
+                    return float("inf")
+                return LATENCY_BUCKETS_SEC[i]
+        return float("inf")
+
+
+class KvMetrics:
+    """
+    Round trips, commands and latencies of an InstrumentedKv. A command
+    sent in a pipeline is counted as a command, the pipeline as one
+    round trip.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands: Dict[str, int] = {}
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self.round_trips = 0
+        self.hands = 0
+
+    def observe(
+        self,
+        name: str,
+        seconds: float,
+        commands: Sequence[str] = (),
+    ) -> None:
+        with self._lock:
+            self.round_trips += 1
+            for command in commands or (name,):
+                self._commands[command] = self._commands.get(command, 0) + 1
+            histogram = self._latency.get(name)
+            if histogram is None:
+                histogram = self._latency[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def hand_finished(self) -> None:
+        with self._lock:
+            self.hands += 1
+
+    def round_trips_per_hand(self) -> Optional[float]:
+        with self._lock:
+            if self.hands == 0:
+                return None
+            return self.round_trips / self.hands
+
+    def report(self) -> dict:
+        per_hand = self.round_trips_per_hand()
+        with self._lock:
+            latency = {
+                name: {
+                    "count": h.count,
+                    "mean_ms": 1000 * h.total / h.count,
+                    "p50_ms": 1000 * h.quantile(0.5),
+                    "p99_ms": 1000 * h.quantile(0.99),
+                }
+                for name, h in sorted(self._latency.items())
+            }
+            return {
+                "round_trips": self.round_trips,
+                "hands": self.hands,
+                "round_trips_per_hand": per_hand,
+                "commands": dict(sorted(self._commands.items())),
+                "latency": latency,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._commands.clear()
+            self._latency.clear()
+            self.round_trips = 0
+            self.hands = 0
+
+
+def log_report(metrics: KvMetrics) -> None:
+    logging.getLogger(__name__).info(
+        "kv round trips per hand: %s, report: %s",
+        metrics.round_trips_per_hand(),
+        json.dumps(metrics.report()),
+    )
+
+
+class InstrumentedKv(KvBackend):
+    """ A backend that times every round trip to the wrapped one. """
+
+    def __init__(self, kv: KvBackend, metrics: Optional[KvMetrics] = None):
+        self._kv = kv
+        self.metrics = metrics or KvMetrics()
+
+    def _call(self, name: str, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return getattr(self._kv, name)(*args, **kwargs)
+        finally:
+            self.metrics.observe(name, time.perf_counter() - start)
+
+    def __getattr__(self, name: str):
+        """ Commands outside of KvBackend are timed as well. """
+        if name.startswith("_"):
+            raise AttributeError(name)
+        command = getattr(self._kv, name)
+        if not callable(command):
+            return command
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self._call("get", *args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._call("set", *args, **kwargs)
+
+    def incrby(self, *args, **kwargs):
+        return self._call("incrby", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call("delete", *args, **kwargs)
+
+    def expire(self, *args, **kwargs):
+        return self._call("expire", *args, **kwargs)
+
+    def hget(self, *args, **kwargs):
+        return self._call("hget", *args, **kwargs)
+
+    def hgetall(self, *args, **kwargs):
+        return self._call("hgetall", *args, **kwargs)
+
+    def hset(self, *args, **kwargs):
+        return self._call("hset", *args, **kwargs)
+
+    def hsetnx(self, *args, **kwargs):
+        return self._call("hsetnx", *args, **kwargs)
+
+    def hincrby(self, *args, **kwargs):
+        return self._call("hincrby", *args, **kwargs)
+
+    def hdel(self, *args, **kwargs):
+        return self._call("hdel", *args, **kwargs)
+
+    def rpush(self, *args, **kwargs):
+        return self._call("rpush", *args, **kwargs)
+
+    def rpop(self, *args, **kwargs):
+        return self._call("rpop", *args, **kwargs)
+
+    def lpop(self, *args, **kwargs):
+        return self._call("lpop", *args, **kwargs)
+
+    def lrange(self, *args, **kwargs):
+        return self._call("lrange", *args, **kwargs)
+
+    def sadd(self, *args, **kwargs):
+        return self._call("sadd", *args, **kwargs)
+
+    def smembers(self, *args, **kwargs):
+        return self._call("smembers", *args, **kwargs)
+
+    def zadd(self, *args, **kwargs):
+        return self._call("zadd", *args, **kwargs)
+
+    def zrem(self, *args, **kwargs):
+        return self._call("zrem", *args, **kwargs)
+
+    def zincrby(self, *args, **kwargs):
+        return self._call("zincrby", *args, **kwargs)
+
+    def zscore(self, *args, **kwargs):
+        return self._call("zscore", *args, **kwargs)
+
+    def zcard(self, *args, **kwargs):
+        return self._call("zcard", *args, **kwargs)
+
+    def zrevrange(self, *args, **kwargs):
+        return self._call("zrevrange", *args, **kwargs)
+
+    def zrangebyscore(self, *args, **kwargs):
+        return self._call("zrangebyscore", *args, **kwargs)
+
+    def xadd(self, *args, **kwargs):
+        return self._call("xadd", *args, **kwargs)
+
+    def xrange(self, *args, **kwargs):
+        return self._call("xrange", *args, **kwargs)
+
+    def xtrim(self, *args, **kwargs):
+        return self._call("xtrim", *args, **kwargs)
+
+    def scan(self, *args, **kwargs):
+        return self._call("scan", *args, **kwargs)
+
+    def script_load(self, *args, **kwargs):
+        return self._call("script_load", *args, **kwargs)
+
+    def evalsha(self, *args, **kwargs):
+        return self._call("evalsha", *args, **kwargs)
+
+    def pipeline(self, transaction: bool = True) -> "InstrumentedPipeline":
+        return InstrumentedPipeline(
+            self._kv.pipeline(transaction=transaction),
+            self.metrics,
+        )
+
+
+class InstrumentedPipeline:
+    """ Records the names of the queued commands for the metrics. """
+
+    def __init__(self, pipe, metrics: KvMetrics):
+        self._pipe = pipe
+        self._metrics = metrics
+        self._names: List[str] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        command = getattr(self._pipe, name)
+
+        def queue(*args, **kwargs) -> "InstrumentedPipeline":
+            command(*args, **kwargs)
+            self._names.append(name)
+            return self
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __enter__(self) -> "InstrumentedPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._pipe.reset()
+        self._names = []
+
+    def execute(self, raise_on_error: bool = True) -> list:
+        names, self._names = self._names, []
+        if not names:
+            return self._pipe.execute(raise_on_error=raise_on_error)
+        start = time.perf_counter()
+        try:
+            return self._pipe.execute(raise_on_error=raise_on_error)
+        finally:
+            self._metrics.observe(
+                PIPELINE, time.perf_counter() - start, names,
+            )
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+
+from pokerapp.kv.backend import KvBackend
+
+# func(kv, keys, args) doing what the Lua source does with the commands
+# of the backend. The in-memory backend runs it under its lock.
+ScriptFunc = Callable[[KvBackend, List[str], List], object]
+
+PYTHON_SCRIPTS: Dict[str, ScriptFunc] = {}
+
+
+def script_sha(source: str) -> str:
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+class LuaScript:
+    """
+    A script loaded with SCRIPT LOAD once and called by its SHA1. The
+    Python version of the script is what backends without Lua run.
+    """
+
+    def __init__(self, source: str, python: Optional[ScriptFunc] = None):
+        self._source = source
+        self._sha = script_sha(source)
+        self._loaded = False
+        if python is not None:
+            PYTHON_SCRIPTS[self._sha] = python
+
+    def load(self, kv: KvBackend) -> None:
+        if not self._loaded:
+            kv.script_load(self._source)
+            self._loaded = True
+
+    def queue(self, pipe, keys: List[str], args: List) -> "ScriptCall":
+        """ Adds the call to a pipeline, the script must be loaded.
+
+            Returns the call for execute_pipeline().
+        """
+        call = (len(pipe), self, keys, args)
+        pipe.evalsha(self._sha, len(keys), *keys, *args)
+        return call
+
+    def __call__(self, kv: KvBackend, keys: List[str], args: List):
+        self.load(kv)
+        try:
+            return kv.evalsha(self._sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            # The script cache was flushed or the server restarted.
+            kv.script_load(self._source)
+            return kv.evalsha(self._sha, len(keys), *keys, *args)
+
+
+# Position in the pipeline, script, keys and args of a queued call.
+ScriptCall = Tuple[int, LuaScript, List[str], List]
+
+
+def execute_pipeline(kv: KvBackend, pipe, calls: List[ScriptCall]) -> list:
+    """ Executes a pipeline with the script calls queued in it.
+
+        After a restart or a failover the server has no scripts, the
+        calls it rejected are run again on their own, which loads their
+        scripts. The other commands of the pipeline are not repeated,
+        in a MULTI/EXEC they are committed already.
+    """
+    results = pipe.execute(raise_on_error=False)
+    for i, script, keys, args in calls:
+        if isinstance(results[i], redis.exceptions.NoScriptError):
+            results[i] = script(kv, keys, args)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    return results
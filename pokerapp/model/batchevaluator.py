@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+from itertools import combinations_with_replacement
+from math import comb
+
+import numpy as np
+
+from pokerapp.model.handevaluator import (
+    FLUSH_TABLE,
+    RANK_KEYS,
+    RANK_TABLE,
+    RANKS_COUNT,
+)
+
+# Rows are scored in chunks to keep the temporary arrays small.
+CHUNK_SIZE = 1 << 16
+
+HAND_SIZES = (5, 6, 7)
+
+# A sorted multiset of ranks r0 <= r1 <= ... is indexed densely by the
+# combinatorial number system: sum of C(r_i + i, i + 1).
+_BINOMIALS = np.array(
+    [[comb(n, k) for k in range(max(HAND_SIZES) + 1)]
+     for n in range(RANKS_COUNT + max(HAND_SIZES))],
+    dtype=np.int64,
+)
+
+
+def _multiset_index(sorted_ranks: np.ndarray) -> np.ndarray:
+    i = np.arange(sorted_ranks.shape[1])
+    return _BINOMIALS[sorted_ranks + i, i + 1].sum(axis=1)
+
+
+def _build_rank_table(size: int) -> np.ndarray:
+    multisets = np.array(
+        list(combinations_with_replacement(range(RANKS_COUNT), size)),
+        dtype=np.int64,
+    )
+    keys = np.array(RANK_KEYS, dtype=np.int64)[multisets].sum(axis=1)
+    table = np.zeros(len(multisets), dtype=np.int64)
+    # Multisets with five cards of one rank do not exist and score 0.
+    table[_multiset_index(multisets)] = [
+        RANK_TABLE.get(key, 0) for key in keys.tolist()
+    ]
+    return table
+
+
+def _build_grow_table(size: int) -> np.ndarray:
+    """ Index of the multiset with one more rank, by multiset and rank. """
+    multisets = np.array(
+        list(combinations_with_replacement(range(RANKS_COUNT), size)),
+        dtype=np.int64,
+    )
+    table = np.zeros((len(multisets), RANKS_COUNT), dtype=np.int64)
+    for rank in range(RANKS_COUNT):
+        grown = np.hstack([multisets, np.full((len(multisets), 1), rank)])
+        table[_multiset_index(multisets), rank] = _multiset_index(
+            np.sort(grown, axis=1),
+        )
+    return table
+
+
+_RANK_TABLES = {size: _build_rank_table(size) for size in HAND_SIZES}
+_GROW_TABLES = {size: _build_grow_table(size) for size in (5, 6)}
+_FLUSH_TABLE = np.array(FLUSH_TABLE, dtype=np.int64)
+
+
+def _score_chunk(hands: np.ndarray) -> np.ndarray:
+    # Sorting the codes sorts the ranks too: the rank is the high bits.
+    ranks = np.sort(hands, axis=1) >> 2
+    suits = hands & 3
+
+    scores = _RANK_TABLES[hands.shape[1]][_multiset_index(ranks)]
+
+    # Suit counts packed into 4-bit nibbles, one nibble per suit.
+    suit_counts = (1 << (suits * 4)).sum(axis=1)
+    for suit in range(4):
+        rows = np.nonzero(((suit_counts >> (suit * 4)) & 15) >= 5)[0]
+        if len(rows) == 0:
+            continue
+        in_suit = suits[rows] == suit
+        # Suited cards have distinct ranks, so the sum is the rank mask.
+        masks = np.where(in_suit, 1 << (hands[rows] >> 2), 0).sum(axis=1)
+        scores[rows] = _FLUSH_TABLE[masks]
+
+    return scores
+
+
+def score_batch(hands: np.ndarray) -> np.ndarray:
+    """ Scores of an [N, 5..7] array of card codes, one hand per row.
+
+        The scores are the same as HandEvaluator.score_codes of every row.
+    """
+    hands = np.asarray(hands, dtype=np.int64)
+    if hands.ndim != 2 or hands.shape[1] not in HAND_SIZES:
+        raise ValueError(
+            "expected an [N, 5..7] array of card codes, got shape " +
+            str(hands.shape)
+        )
+
+    scores = np.empty(hands.shape[0], dtype=np.int64)
+    for start in range(0, hands.shape[0], CHUNK_SIZE):
+        stop = start + CHUNK_SIZE
+        scores[start:stop] = _score_chunk(hands[start:stop])
+    return scores
+
+
+def score_boards(boards: np.ndarray, holes: np.ndarray) -> np.ndarray:
+    """ Scores of every [N, 2] hole with every [R, 5] board as [R, N].
+
+        The rank multiset of a board is grown by the hole ranks through
+        lookup tables instead of sorting every hand. Holes sharing a card
+        with the board get meaningless scores, the caller masks them.
+    """
+    boards = np.asarray(boards, dtype=np.int64)
+    holes = np.asarray(holes, dtype=np.int64)
+    if boards.ndim != 2 or boards.shape[1] != 5 or \
+            holes.ndim != 2 or holes.shape[1] != 2:
+        raise ValueError(
+            "expected [R, 5] boards and [N, 2] holes, got shapes " +
+            str(boards.shape) + " and " + str(holes.shape)
+        )
+
+    base = _multiset_index(np.sort(boards, axis=1) >> 2)
+    hole_ranks = holes >> 2
+    grown = _GROW_TABLES[5][base[:, None], hole_ranks[None, :, 0]]
+    grown = _GROW_TABLES[6][grown, hole_ranks[None, :, 1]]
+    scores = _RANK_TABLES[7][grown]
+
+    # A flush needs three board cards of the suit, and with seven cards
+    # it beats any hand the ranks alone make.
+    board_suits = boards & 3
+    hole_suits = holes & 3
+    for suit in range(4):
+        in_board = board_suits == suit
+        rows = np.nonzero(in_board.sum(axis=1) >= 3)[0]
+        if len(rows) == 0:
+            continue
+        in_hole = hole_suits == suit
+        board_masks = np.where(
+            in_board[rows], 1 << (boards[rows] >> 2), 0,
+        ).sum(axis=1)
+        hole_masks = np.where(in_hole, 1 << hole_ranks, 0).sum(axis=1)
+        flush = in_board[rows].sum(axis=1)[:, None] + \
+            in_hole.sum(axis=1)[None, :] >= 5
+        masks = board_masks[:, None] | hole_masks[None, :]
+        block = scores[rows]
+        block[flush] = _FLUSH_TABLE[masks[flush]]
+        scores[rows] = block
+
+    return scores
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from pokerapp.entity.entities import ChatId
+from pokerapp.kv.backend import KvBackend, Value
+from pokerapp.kv.script import LuaScript, execute_pipeline
+from pokerapp.model.kvschema import inbox_key, lease_key
+
+CHAT_LEASE_SEC = 30
+CHAT_IDLE_SEC = 10 * 60
+INBOX_BATCH = 100
+INBOX_POLL_SEC = 0.2
+# A forwarded update is handled where it lands after this many hops,
+# it only bounces while leases move between nodes.
+MAX_HOPS = 3
+
+# KEYS[1] is the lease. ARGV: node id, lease in ms.
+# Returns the owner of the chat, the node itself if the lease was free.
+ACQUIRE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if owner then
+    return owner
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return ARGV[1]
+"""
+
+# KEYS[1] is the lease. ARGV: node id, lease in ms.
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS[1] is the lease. ARGV[1] is the node id.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('DEL', KEYS[1])
+"""
+
+
+def _text(value: Value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def _acquire_python(kv: KvBackend, keys: List[str], args: List):
+    node_id, lease_ms = args
+    owner = kv.get(keys[0])
+    if owner is None:
+        kv.set(keys[0], node_id, px=int(lease_ms))
+        return node_id
+    if _text(owner) == node_id:
+        kv.set(keys[0], node_id, px=int(lease_ms), xx=True)
+    return owner
+
+
+def _renew_python(kv: KvBackend, keys: List[str], args: List):
+    node_id, lease_ms = args
+    if _text(kv.get(keys[0]) or b"") != node_id:
+        return 0
+    kv.set(keys[0], node_id, px=int(lease_ms), xx=True)
+    return 1
+
+
+def _release_python(kv: KvBackend, keys: List[str], args: List):
+    if _text(kv.get(keys[0]) or b"") != args[0]:
+        return 0
+    return kv.delete(keys[0])
+
+
+_acquire = LuaScript(ACQUIRE_SCRIPT, _acquire_python)
+_renew = LuaScript(RENEW_SCRIPT, _renew_python)
+_release = LuaScript(RELEASE_SCRIPT, _release_python)
+
+
+class ChatRouter:
+    """
+    Shares the chats between the nodes of one kv instance. The node
+    that first sees an update of a chat leases it and handles all its
+    updates until it releases the chat or stops renewing the lease,
+    other nodes push the updates of the chat to its inbox.
+
+    Chats of this node are answered from memory, a chat of another
+    node costs one script call and the push. Leases are renewed by
+    heartbeat() in one pipeline, chats idle for idle seconds are
+    handed back. on_release is called with the chats before their
+    leases are deleted, to write and drop what the node kept of them.
+    on_lost is called with the chats whose leases ran out, another node
+    may own them already, so what the node kept of them is only dropped.
+    """
+
+    def __init__(
+        self,
+        kv: KvBackend,
+        node_id: str,
+        lease: float = CHAT_LEASE_SEC,
+        idle: float = CHAT_IDLE_SEC,
+        on_release: Optional[Callable[[List[ChatId]], None]] = None,
+        on_lost: Optional[Callable[[List[ChatId]], None]] = None,
+    ):
+        self.node_id = node_id
+        self._kv = kv
+        self._lease_ms = int(lease * 1000)
+        self._idle = idle
+        self._on_release = on_release
+        self._on_lost = on_lost
+        # Chats of this node by the time of their last update.
+        self._chats: Dict[ChatId, float] = {}
+        # Acquiring and releasing hold it, so the lease of a chat that
+        # was taken again is not deleted.
+        self._lock = threading.Lock()
+
+    def owner(self, chat_id: ChatId) -> str:
+        """ The node of the chat, the chat is leased if it has none. """
+        with self._lock:
+            if chat_id in self._chats:
+                self._chats[chat_id] = time.monotonic()
+                return self.node_id
+
+            owner = _text(_acquire(
+                self._kv,
+                [lease_key(chat_id)],
+                [self.node_id, self._lease_ms],
+            ))
+            if owner == self.node_id:
+                self._chats[chat_id] = time.monotonic()
+            return owner
+
+    def owns(self, chat_id: ChatId) -> bool:
+        with self._lock:
+            return chat_id in self._chats
+
+    def route(self, chat_id: ChatId, hops: int = 0) -> Optional[str]:
+        """ None if this node handles the update, else the node to
+            forward it to.
+        """
+        owner = self.owner(chat_id)
+        if owner == self.node_id or hops >= MAX_HOPS:
+            return None
+        return owner
+
+    def forward(
+        self,
+        node_id: str,
+        chat_id: ChatId,
+        update: dict,
+        hops: int = 0,
+    ) -> None:
+        """ Pushes the update to the inbox of the node. """
+        self._push(node_id, json.dumps({
+            "chat": chat_id,
+            "hops": hops + 1,
+            "update": update,
+        }))
+
+    def _push(self, node_id: str, envelope: Value) -> None:
+        # An inbox of a node that died expires with its leases.
+        pipe = self._kv.pipeline(transaction=False)
+        pipe.rpush(inbox_key(node_id), envelope)
+        pipe.expire(inbox_key(node_id), 2 * self._lease_ms // 1000 + 1)
+        pipe.execute()
+
+    def receive(self, count: int = INBOX_BATCH) -> List[dict]:
+        """ Up to count updates forwarded to this node, oldest first, as
+            dicts with the chat, the hops and the update.
+        """
+        envelopes = self._kv.lpop(inbox_key(self.node_id), count) or []
+        return [json.loads(envelope) for envelope in envelopes]
+
+    def heartbeat(self) -> List[ChatId]:
+        """ Renews the leases, hands back the idle chats.
+
+            Returns the chats this node no longer owns.
+        """
+        with self._lock:
+            chats = list(self._chats)
+        if not chats:
+            return []
+
+        _renew.load(self._kv)
+        pipe = self._kv.pipeline(transaction=False)
+        calls = [
+            _renew.queue(
+                pipe,
+                [lease_key(chat_id)],
+                [self.node_id, self._lease_ms],
+            )
+            for chat_id in chats
+        ]
+        renewed = execute_pipeline(self._kv, pipe, calls)
+        lost = [
+            chat_id
+            for chat_id, done in zip(chats, renewed)
+            if not int(done)
+        ]
+        if lost:
+            with self._lock:
+                for chat_id in lost:
+                    self._chats.pop(chat_id, None)
+            if self._on_lost is not None:
+                self._on_lost(lost)
+
+        return lost + self.release(idle=self._idle)
+
+    def release(
+        self,
+        chats: Optional[List[ChatId]] = None,
+        idle: Optional[float] = None,
+    ) -> List[ChatId]:
+        """ Hands back the chats, all of them by default, or only the
+            ones without updates for idle seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            chats = [
+                c for c in (self._chats if chats is None else chats)
+                if c in self._chats and
+                (idle is None or now - self._chats[c] >= idle)
+            ]
+            if not chats:
+                return []
+            for chat_id in chats:
+                del self._chats[chat_id]
+
+        # Outside the lock, on_release may wait for the handlers of the
+        # chats. A chat that gets an update meanwhile renews its lease
+        # and stays with the node.
+        if self._on_release is not None:
+            self._on_release(chats)
+        with self._lock:
+            chats = [c for c in chats if c not in self._chats]
+            if not chats:
+                return []
+            _release.load(self._kv)
+            pipe = self._kv.pipeline(transaction=False)
+            calls = [
+                _release.queue(pipe, [lease_key(chat_id)], [self.node_id])
+                for chat_id in chats
+            ]
+            execute_pipeline(self._kv, pipe, calls)
+            return chats
+
+    def handoff(self) -> int:
+        """ Releases every chat before the node stops.
+
+            Updates that reached the inbox meanwhile go to the nodes
+            that took their chats since. Returns the number of updates
+            dropped because nobody owns their chat.
+        """
+        self.release()
+        dropped = 0
+        while True:
+            envelopes = self._kv.lpop(inbox_key(self.node_id), INBOX_BATCH)
+            if not envelopes:
+                return dropped
+            for envelope in envelopes:
+                owner = self._kv.get(
+                    lease_key(json.loads(envelope)["chat"]),
+                )
+                if owner is None or _text(owner) == self.node_id:
+                    dropped += 1
+                else:
+                    self._push(_text(owner), envelope)
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+
+import math
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import combinations, permutations
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pokerapp.entity.cards import CardCode, Cards, card_codes
+from pokerapp.entity.equity import EquityResult, PlayerEquity
+from pokerapp.model.batchevaluator import score_batch
+
+DEFAULT_TRIALS = 20000
+DEFAULT_WORKERS = 2
+DEFAULT_TIME_BUDGET_SEC = 2.0
+# Runouts are enumerated instead of sampled up to this count: the turn
+# and the river of a heads-up flop.
+DEFAULT_EXACT_LIMIT = math.comb(48, 2)
+EXACT_CACHE_SIZE = 4096
+
+# Every worker gets several chunks, so a run cut by the time budget
+# still has the finished chunks to report.
+CHUNKS_PER_WORKER = 4
+# Trials of a chunk between two looks at the deadline.
+DEADLINE_BATCH = 500
+Z_95 = 1.96
+
+_seeds = random.SystemRandom()
+
+
+def _repeat(codes: Tuple[CardCode, ...], rows: int) -> np.ndarray:
+    return np.broadcast_to(np.array(codes, dtype=np.int64), (rows, len(codes)))
+
+
+def _count_wins(
+    holes: List[np.ndarray],
+    boards: np.ndarray,
+) -> Tuple[List[int], List[int]]:
+    scores = np.empty((len(holes), len(boards)), dtype=np.int64)
+    for i, hole in enumerate(holes):
+        scores[i] = score_batch(np.hstack([hole, boards]))
+
+    best = scores == scores.max(axis=0)
+    split = best.sum(axis=0) > 1
+    wins = (best & ~split).sum(axis=1)
+    ties = (best & split).sum(axis=1)
+    return wins.tolist(), ties.tolist()
+
+
+def simulate(
+    hands: Sequence[Tuple[CardCode, ...]],
+    board: Tuple[CardCode, ...],
+    deck: Tuple[CardCode, ...],
+    trials: int,
+    seed: int,
+    deadline: Optional[float] = None,
+) -> Tuple[List[int], List[int], int]:
+    """ Counts wins and ties of every hand over random runouts, and the
+        trials run.
+
+        Empty hands are unknown and get two cards from the deck each trial.
+        The trials stop at the deadline, a time.time() value, so chunks
+        of a request that ran out of time do not hold the workers. Runs
+        in the worker processes, so it takes and returns plain tuples.
+    """
+    rnd = np.random.default_rng(seed)
+    wins = [0] * len(hands)
+    ties = [0] * len(hands)
+    done = 0
+    while done < trials:
+        if deadline is not None and time.time() >= deadline:
+            break
+        batch = min(DEADLINE_BATCH, trials - done)
+        batch_wins, batch_ties = _simulate_batch(
+            hands, board, deck, batch, rnd,
+        )
+        for i in range(len(hands)):
+            wins[i] += batch_wins[i]
+            ties[i] += batch_ties[i]
+        done += batch
+    return wins, ties, done
+
+
+def _simulate_batch(
+    hands: Sequence[Tuple[CardCode, ...]],
+    board: Tuple[CardCode, ...],
+    deck: Tuple[CardCode, ...],
+    trials: int,
+    rnd: np.random.Generator,
+) -> Tuple[List[int], List[int]]:
+    deck_codes = np.array(deck, dtype=np.int64)
+    board_missing = 5 - len(board)
+    draw_count = board_missing + 2 * sum(1 for hand in hands if not hand)
+
+    order = np.argsort(rnd.random((trials, len(deck_codes))), axis=1)
+    draws = deck_codes[order[:, :draw_count]]
+    boards = np.hstack([_repeat(board, trials), draws[:, :board_missing]])
+
+    holes = []
+    start = board_missing
+    for hand in hands:
+        if hand:
+            holes.append(_repeat(hand, trials))
+        else:
+            holes.append(draws[:, start:start + 2])
+            start += 2
+    return _count_wins(holes, boards)
+
+
+def _count_exact(
+    hands: Sequence[Tuple[CardCode, ...]],
+    board: Tuple[CardCode, ...],
+    deck: Tuple[CardCode, ...],
+) -> Tuple[List[int], List[int], int]:
+    """ Counts wins and ties of every known hand over all runouts. """
+    runouts = np.array(
+        list(combinations(deck, 5 - len(board))),
+        dtype=np.int64,
+    )
+    boards = np.hstack([_repeat(board, len(runouts)), runouts])
+
+    wins, ties = _count_wins(
+        [_repeat(hand, len(runouts)) for hand in hands],
+        boards,
+    )
+    return wins, ties, len(runouts)
+
+
+def canonical_spot(
+    hands: Sequence[Tuple[CardCode, ...]],
+    board: Tuple[CardCode, ...],
+    dead: Tuple[CardCode, ...],
+) -> tuple:
+    """ The smallest relabeling of the suits of the spot.
+
+        Equity does not change when suits are permuted, so all spots
+        equal up to suits share the key. The order of hands is kept.
+    """
+    best = None
+    for perm in permutations(range(4)):
+        def relabel(codes):
+            return tuple(sorted(c & ~3 | perm[c & 3] for c in codes))
+
+        key = (
+            tuple(relabel(hand) for hand in hands),
+            relabel(board),
+            relabel(dead),
+        )
+        if best is None or key < best:
+            best = key
+    return best
+
+
+@lru_cache(maxsize=EXACT_CACHE_SIZE)
+def _exact_equity(spot: tuple) -> Tuple[List[int], List[int], int]:
+    hands, board, dead = spot
+    known = set(board) | set(dead)
+    for hand in hands:
+        known.update(hand)
+    deck = tuple(c for c in range(52) if c not in known)
+    return _count_exact(hands, board, deck)
+
+
+def exact_cache_info():
+    """ Hits, misses and size of the exact equity memo. """
+    return _exact_equity.cache_info()
+
+
+def _done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _percent(count: int, trials: int) -> float:
+    return 100.0 * count / trials
+
+
+def _margin(count: int, trials: int) -> float:
+    p = count / trials
+    return 100.0 * Z_95 * math.sqrt(p * (1 - p) / trials)
+
+
+class EquityCalculator:
+    """
+    Monte Carlo equity of hold'em hands, fanned out over a process pool
+    and cut at a hard time budget.
+    """
+
+    def __init__(
+        self,
+        trials: int = DEFAULT_TRIALS,
+        workers: int = DEFAULT_WORKERS,
+        time_budget: float = DEFAULT_TIME_BUDGET_SEC,
+        exact_limit: int = DEFAULT_EXACT_LIMIT,
+    ):
+        self._trials = trials
+        self._workers = workers
+        self._time_budget = time_budget
+        self._exact_limit = exact_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # The bot is multithreaded, forking it is not safe.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def warm_up(self) -> None:
+        """ Starts the workers, so the first request does not pay for it. """
+        if self._workers > 0:
+            executor = self._get_executor()
+            for _ in range(self._workers):
+                executor.submit(
+                    simulate, [(0, 1)], (), (2, 3, 4, 5, 6), 1, 0,
+                )
+
+    @property
+    def time_budget(self) -> float:
+        return self._time_budget
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def calculate(
+        self,
+        hands: List[Cards],
+        cards_table: Cards,
+        deck: Optional[Cards] = None,
+    ) -> Optional[EquityResult]:
+        """ Equity of the hands, an empty hand is an unknown opponent.
+
+            Runouts are drawn from the deck, by default every card not
+            in the hands or on the table. If all hands are known and there
+            are few runouts, they are all enumerated and memoized.
+            Returns None if no trial ended within the time budget.
+        """
+        return self.submit(hands, cards_table, deck).result()
+
+    def submit(
+        self,
+        hands: List[Cards],
+        cards_table: Cards,
+        deck: Optional[Cards] = None,
+    ) -> Future:
+        """ calculate() without waiting, the future gets its result once
+            the workers are done or the time budget is over.
+        """
+        hand_codes = [tuple(card_codes(hand)) for hand in hands]
+        board = tuple(card_codes(cards_table))
+        if deck is None:
+            known = set(board)
+            for hand in hand_codes:
+                known.update(hand)
+            deck_codes = tuple(c for c in range(52) if c not in known)
+        else:
+            deck_codes = tuple(card_codes(deck))
+
+        runouts = math.comb(len(deck_codes), 5 - len(board))
+        if all(hand_codes) and runouts <= self._exact_limit:
+            known = set(deck_codes) | set(board)
+            for hand in hand_codes:
+                known.update(hand)
+            dead = tuple(c for c in range(52) if c not in known)
+            exact = _exact_equity(canonical_spot(hand_codes, board, dead))
+            return _done(self._merge(len(hands), [exact], True))
+
+        deadline = time.time() + self._time_budget
+        args = [
+            (hand_codes, board, deck_codes, trials, _seeds.getrandbits(64),
+             deadline)
+            for trials in self._split_trials(self._trials)
+        ]
+
+        if self._workers <= 0:
+            results = [simulate(*a) for a in args]
+            return _done(self._merge(len(hands), results))
+        return self._run_in_pool(len(hands), args)
+
+    def _split_trials(self, trials: int) -> List[int]:
+        count = max(1, self._workers * CHUNKS_PER_WORKER)
+        size = math.ceil(trials / count)
+        return [
+            min(size, trials - start) for start in range(0, trials, size)
+        ]
+
+    def _run_in_pool(self, players_count: int, args) -> Future:
+        try:
+            executor = self._get_executor()
+            futures = [executor.submit(simulate, *a) for a in args]
+        except BrokenProcessPool:
+            self._executor = None
+            return _done(None)
+
+        # Every chunk ends by the deadline, the last one to end merges.
+        result = Future()
+        pending = [len(futures)]
+        lock = threading.Lock()
+
+        def chunk_done(_) -> None:
+            with lock:
+                pending[0] -= 1
+                if pending[0] > 0:
+                    return
+            if not result.set_running_or_notify_cancel():
+                return
+            result.set_result(self._merge(players_count, [
+                future.result()
+                for future in futures
+                if not future.cancelled() and future.exception() is None
+            ]))
+
+        def cancel_chunks(_) -> None:
+            if result.cancelled():
+                for future in futures:
+                    future.cancel()
+
+        result.add_done_callback(cancel_chunks)
+        for future in futures:
+            future.add_done_callback(chunk_done)
+        return result
+
+    @staticmethod
+    def _merge(
+        players_count: int,
+        results,
+        exact: bool = False,
+    ) -> Optional[EquityResult]:
+        trials = sum(t for _, _, t in results)
+        if trials == 0:
+            return None
+
+        wins = [0] * players_count
+        ties = [0] * players_count
+        for chunk_wins, chunk_ties, _ in results:
+            for i in range(players_count):
+                wins[i] += chunk_wins[i]
+                ties[i] += chunk_ties[i]
+
+        return EquityResult(
+            players=[
+                PlayerEquity(
+                    win=_percent(wins[i], trials),
+                    tie=_percent(ties[i], trials),
+                    margin=0.0 if exact else _margin(wins[i], trials),
+                )
+                for i in range(players_count)
+            ],
+            trials=trials,
+            exact=exact,
+        )
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+
+import datetime
+import logging
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pokerapp.entity.cards import CARD_BY_CODE, Cards, card_codes
+from pokerapp.entity.entities import ChatId, UserId
+from pokerapp.entity.equity import PlayerEquity
+from pokerapp.entity.game import Game
+from pokerapp.entity.gamestate import GameState
+from pokerapp.entity.player import Player
+from pokerapp.entity.playerbet import PlayerBet
+from pokerapp.entity.playerstate import PlayerState
+from pokerapp.entity.wallet import Wallet
+from pokerapp.kv.backend import KvBackend
+from pokerapp.model.handstrength import HandStrength
+from pokerapp.model.handwallet import (
+    HandWallet,
+    queue_touch,
+    reservation_members,
+)
+from pokerapp.model.kvschema import GAME_KEY_TTL_SEC, snapshot_key
+
+logger = logging.getLogger(__name__)
+
+# A snapshot is a version byte and the fields of the game in struct
+# layouts of fixed byte order, cards are bytes of card codes. Snapshots
+# of another version are dropped.
+SNAPSHOT_VERSION = 2
+SNAPSHOT_DELAY_SEC = 1.0
+
+# The wallets of a player: kept in kv and looked up by the user id, or
+# the stack of a running hand.
+_WALLET_KV = 0
+_WALLET_HAND = 1
+
+# Ids come as ints from Telegram and as strings elsewhere.
+_ID_NONE = 0
+_ID_INT = 1
+_ID_STR = 2
+
+_BYTE = struct.Struct("<B")
+_SHORT = struct.Struct("<H")
+_LONG = struct.Struct("<q")
+_DOUBLE = struct.Struct("<d")
+_GAME = struct.Struct("<BqqBiBd")
+_PLAYER = struct.Struct("<BBq")
+_BET = struct.Struct("<qB")
+_EQUITY = struct.Struct("<ddd")
+_HAND = struct.Struct("<qq")
+
+WalletFactory = Callable[[UserId], Wallet]
+
+
+class _Writer:
+    def __init__(self):
+        self.data = bytearray()
+
+    def pack(self, layout: struct.Struct, *values) -> None:
+        self.data += layout.pack(*values)
+
+    def text(self, value: str) -> None:
+        data = value.encode("utf-8")
+        self.pack(_SHORT, len(data))
+        self.data += data
+
+    def id(self, value) -> None:
+        if value is None:
+            self.pack(_BYTE, _ID_NONE)
+        elif isinstance(value, int):
+            self.pack(_BYTE, _ID_INT)
+            self.pack(_LONG, value)
+        else:
+            self.pack(_BYTE, _ID_STR)
+            self.text(value)
+
+    def cards(self, cards: Cards) -> None:
+        self.pack(_BYTE, len(cards))
+        self.data += bytes(card_codes(cards))
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self._data = memoryview(data)
+        self._offset = 0
+
+    def unpack(self, layout: struct.Struct) -> Tuple:
+        values = layout.unpack_from(self._data, self._offset)
+        self._offset += layout.size
+        return values
+
+    def raw(self, size: int) -> bytes:
+        data = self._data[self._offset:self._offset + size]
+        if len(data) != size:
+            raise ValueError("snapshot is cut short")
+        self._offset += size
+        return bytes(data)
+
+    def text(self) -> str:
+        size, = self.unpack(_SHORT)
+        return self.raw(size).decode("utf-8")
+
+    def id(self):
+        kind, = self.unpack(_BYTE)
+        if kind == _ID_NONE:
+            return None
+        if kind == _ID_INT:
+            return self.unpack(_LONG)[0]
+        if kind == _ID_STR:
+            return self.text()
+        raise ValueError("unknown id kind: " + str(kind))
+
+    def cards(self) -> Cards:
+        size, = self.unpack(_BYTE)
+        return [CARD_BY_CODE[code] for code in self.raw(size)]
+
+    def count(self) -> int:
+        return self.unpack(_SHORT)[0]
+
+    def end(self) -> None:
+        if self._offset != len(self._data):
+            raise ValueError("snapshot has trailing bytes")
+
+
+def _encode_wallet(out: _Writer, wallet: Wallet) -> None:
+    if not isinstance(wallet, HandWallet):
+        out.pack(_BYTE, _WALLET_KV)
+        return
+    out.pack(_BYTE, _WALLET_HAND)
+    out.text(wallet.game_id)
+    out.pack(_HAND, wallet.value(), wallet.authorized_money(wallet.game_id))
+    out.pack(_SHORT, len(wallet.entries))
+    for op, amount, stack in wallet.entries:
+        out.text(op)
+        out.pack(_HAND, amount, stack)
+
+
+def _decode_wallet(
+    data: _Reader,
+    user_id: UserId,
+    wallets: WalletFactory,
+) -> Wallet:
+    kind, = data.unpack(_BYTE)
+    if kind != _WALLET_HAND:
+        return wallets(user_id)
+    game_id = data.text()
+    stack, authorized = data.unpack(_HAND)
+    wallet = HandWallet(user_id, game_id, stack)
+    wallet.inc_authorized_money(game_id, authorized)
+    wallet.entries = [
+        (data.text(), *data.unpack(_HAND)) for _ in range(data.count())
+    ]
+    return wallet
+
+
+def encode_player(out: _Writer, player: Player) -> None:
+    out.id(player.user_id)
+    out.text(player.user_name)
+    out.text(player.mention_markdown)
+    out.pack(
+        _PLAYER,
+        player.state.value,
+        player.hand_strength is not None,
+        player.round_rate,
+    )
+    _encode_wallet(out, player.wallet)
+    out.cards(player.cards)
+    out.id(player.ready_message_id)
+
+
+def decode_player(
+    data: _Reader,
+    cards_table: Cards,
+    wallets: WalletFactory,
+) -> Player:
+    user_id = data.id()
+    user_name = data.text()
+    mention = data.text()
+    state, has_strength, round_rate = data.unpack(_PLAYER)
+    wallet = _decode_wallet(data, user_id, wallets)
+    cards = data.cards()
+    player = Player(
+        user_id=user_id,
+        user_name=user_name,
+        mention_markdown=mention,
+        wallet=wallet,
+        ready_message_id=data.id(),
+    )
+    player.state = PlayerState(state)
+    player.cards = cards
+    if has_strength:
+        player.hand_strength = HandStrength(
+            card_codes(player.cards + cards_table),
+        )
+    player.round_rate = round_rate
+    return player
+
+
+def encode_bet(out: _Writer, bet: PlayerBet) -> None:
+    out.id(bet.user_id)
+    out.pack(_BET, bet.amount, bet.game_state.value)
+
+
+def decode_bet(data: _Reader) -> PlayerBet:
+    user_id = data.id()
+    amount, state = data.unpack(_BET)
+    return PlayerBet(user_id, amount, GameState(state))
+
+
+def encode_game(game: Game) -> bytes:
+    out = _Writer()
+    out.pack(_BYTE, SNAPSHOT_VERSION)
+    out.text(game.id)
+    out.pack(
+        _GAME,
+        game.state.value,
+        game.pot,
+        game.max_round_rate,
+        game.board_strength is not None,
+        game.current_player_index,
+        game.has_deck,
+        game.last_turn_time.timestamp(),
+    )
+    out.cards(game.cards_table)
+    if game.has_deck:
+        out.cards(game.remain_cards)
+    out.id(game.trading_end_user_id)
+
+    out.pack(_SHORT, len(game.players))
+    for player in game.players:
+        encode_player(out, player)
+    out.pack(_SHORT, len(game.ready_users))
+    for user_id in game.ready_users:
+        out.id(user_id)
+    out.pack(_SHORT, len(game.players_bets))
+    for bet in game.players_bets:
+        encode_bet(out, bet)
+    out.pack(_SHORT, len(game.all_in_equity))
+    for user_id, equity in game.all_in_equity.items():
+        out.id(user_id)
+        out.pack(_EQUITY, equity.win, equity.tie, equity.margin)
+    return bytes(out.data)
+
+
+def decode_game(data: bytes, wallets: WalletFactory) -> Optional[Game]:
+    """ The game of encode_game(), None for another version.
+
+        Raises ValueError if the snapshot is corrupt.
+    """
+    try:
+        return _decode_game(_Reader(data), wallets)
+    except (struct.error, IndexError, KeyError, TypeError) as e:
+        raise ValueError("corrupt snapshot") from e
+
+
+def _decode_game(data: _Reader, wallets: WalletFactory) -> Optional[Game]:
+    version, = data.unpack(_BYTE)
+    if version != SNAPSHOT_VERSION:
+        return None
+
+    game = Game()
+    game.id = data.text()
+    (state, game.pot, game.max_round_rate, has_board_strength,
+     game.current_player_index, has_deck,
+     last_turn_time) = data.unpack(_GAME)
+    game.state = GameState(state)
+    game.cards_table = data.cards()
+    if has_deck:
+        game.remain_cards = data.cards()
+    game.trading_end_user_id = data.id()
+
+    game.players = [
+        decode_player(data, game.cards_table, wallets)
+        for _ in range(data.count())
+    ]
+    game.ready_users = {data.id() for _ in range(data.count())}
+    game.players_bets = [decode_bet(data) for _ in range(data.count())]
+    game.all_in_equity = {
+        data.id(): PlayerEquity(*data.unpack(_EQUITY))
+        for _ in range(data.count())
+    }
+    data.end()
+
+    if has_board_strength:
+        game.board_strength = HandStrength(card_codes(game.cards_table))
+    game.last_turn_time = datetime.datetime.fromtimestamp(last_turn_time)
+    return game
+
+
+class GameSnapshots:
+    """
+    The games of the chats in kv, so a restarted process picks up the
+    hands that were running. A snapshot is encoded when it is saved and
+    written up to delay seconds later, the snapshots saved meanwhile go
+    in the same pipeline and only the last one of a chat is written.
+    """
+
+    def __init__(
+        self,
+        kv: KvBackend,
+        delay: float = SNAPSHOT_DELAY_SEC,
+        ttl: int = GAME_KEY_TTL_SEC,
+    ):
+        self._kv = kv
+        self._delay = delay
+        self._ttl = ttl
+        # Snapshots by chat with the reservations of their hands. None
+        # deletes the snapshot of a chat without a running game.
+        self._pending: Dict[ChatId, Tuple[Optional[bytes], List[str]]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def save(self, chat_id: ChatId, game: Game) -> None:
+        data, members = None, []
+        if game.state not in (GameState.INITIAL, GameState.FINISHED):
+            data = encode_game(game)
+            members = reservation_members(game)
+
+        with self._lock:
+            self._pending[chat_id] = (data, members)
+            if self._delay > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(self._delay, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self) -> int:
+        """ Writes the pending snapshots, returns their count. """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._timer = None
+            if not pending:
+                return 0
+
+            now = time.time()
+            pipe = self._kv.pipeline(transaction=False)
+            for chat_id, (data, members) in pending.items():
+                if data is None:
+                    pipe.delete(snapshot_key(chat_id))
+                else:
+                    pipe.set(snapshot_key(chat_id), data, ex=self._ttl)
+                queue_touch(pipe, members, now)
+            pipe.execute()
+            return len(pending)
+
+    def discard(self, chats: List[ChatId]) -> None:
+        """ Drops the pending snapshots of the chats unwritten. """
+        with self._lock:
+            for chat_id in chats:
+                self._pending.pop(chat_id, None)
+
+    def load(self, chat_id: ChatId, wallets: WalletFactory) -> Optional[Game]:
+        """ The saved game of the chat, None if it has no running game. """
+        with self._lock:
+            pending = chat_id in self._pending
+            data, _ = self._pending.get(chat_id, (None, None))
+        if not pending:
+            data = self._kv.get(snapshot_key(chat_id))
+        if data is None:
+            return None
+        try:
+            return decode_game(data, wallets)
+        except ValueError:
+            # The chat starts over rather than fail on every update.
+            logger.exception("dropped the snapshot of chat %s", chat_id)
+            self._kv.delete(snapshot_key(chat_id))
+            return None
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+import enum
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import combinations_with_replacement
+from typing import Dict, List, Optional, Tuple
+
+from pokerapp.entity.cards import CardCode, Cards, card_codes
+from pokerapp.entity.entities import Score
+
+HAND_RANK = 15 ** 5
+BEST_HAND_CACHE_SIZE = 1 << 16
+
+RANKS_COUNT = 13
+ACE = RANKS_COUNT - 1
+WHEEL_MASK = (1 << ACE) | 0b1111
+
+
+class HandsOfPoker(enum.Enum):
+    ROYAL_FLUSH = 10
+    STRAIGHT_FLUSH = 9
+    FOUR_OF_A_KIND = 8
+    FULL_HOUSE = 7
+    FLUSH = 6
+    STRAIGHTS = 5
+    THREE_OF_A_KIND = 4
+    TWO_PAIR = 3
+    PAIR = 2
+    HIGH_CARD = 1
+
+
+# Ranks are indexes 0..12 (2..A), the card value is the rank index + 2.
+RANK_KEYS = [5 ** r for r in range(RANKS_COUNT)]
+
+
+def hand_point(kind: HandsOfPoker, ranks: List[int]) -> Score:
+    """ Same encoding as WinnerDetermination._calculate_hand_point,
+        ranks are rank indexes ordered from the least significant.
+    """
+    score = HAND_RANK * kind.value
+    i = 1
+    for r in ranks:
+        score += (r + 2) * i
+        i *= 15
+    return score
+
+
+def straight_top(mask: int) -> int:
+    """ Rank index of the highest straight in the rank mask or -1. """
+    for top in range(ACE, 3, -1):
+        seq = 0b11111 << (top - 4)
+        if mask & seq == seq:
+            return top
+    if mask & WHEEL_MASK == WHEEL_MASK:
+        return 3
+    return -1
+
+
+def _top_ranks(mask: int, count: int) -> List[int]:
+    """ The highest `count` ranks of the mask, ascending. """
+    ranks = []
+    for r in range(ACE, -1, -1):
+        if len(ranks) == count:
+            break
+        if mask & (1 << r):
+            ranks.append(r)
+    return ranks[::-1]
+
+
+def score_rank_counts(counts: List[int]) -> Score:
+    """ The best score of a hand without a flush given its rank counts. """
+    desc = [r for r in range(ACE, -1, -1) if counts[r]]
+    mask = 0
+    for r in desc:
+        mask |= 1 << r
+    quads = [r for r in desc if counts[r] == 4]
+    trips = [r for r in desc if counts[r] == 3]
+    pairs = [r for r in desc if counts[r] == 2]
+
+    def kickers(exclude: Tuple[int, ...], count: int) -> List[int]:
+        return [r for r in desc if r not in exclude][:count][::-1]
+
+    if quads:
+        return hand_point(
+            HandsOfPoker.FOUR_OF_A_KIND,
+            kickers((quads[0],), 1) + [quads[0]],
+        )
+
+    if trips and (len(trips) > 1 or pairs):
+        pair = max(trips[1:2] + pairs[:1])
+        return hand_point(HandsOfPoker.FULL_HOUSE, [pair, trips[0]])
+
+    top = straight_top(mask)
+    if top >= 0:
+        return hand_point(HandsOfPoker.STRAIGHTS, [top])
+
+    if trips:
+        return hand_point(
+            HandsOfPoker.THREE_OF_A_KIND,
+            kickers((trips[0],), 2) + [trips[0]],
+        )
+
+    if len(pairs) >= 2:
+        return hand_point(
+            HandsOfPoker.TWO_PAIR,
+            kickers((pairs[0], pairs[1]), 1) + [pairs[1], pairs[0]],
+        )
+
+    if pairs:
+        return hand_point(
+            HandsOfPoker.PAIR,
+            kickers((pairs[0],), 3) + [pairs[0]],
+        )
+
+    return hand_point(HandsOfPoker.HIGH_CARD, _top_ranks(mask, 5))
+
+
+def score_flush_mask(mask: int) -> Score:
+    """ The best score of five or more suited cards given their rank mask. """
+    top = straight_top(mask)
+    if top == ACE:
+        return hand_point(HandsOfPoker.ROYAL_FLUSH, [])
+    if top >= 0:
+        return hand_point(HandsOfPoker.STRAIGHT_FLUSH, [top])
+    return hand_point(HandsOfPoker.FLUSH, _top_ranks(mask, 5))
+
+
+def _build_rank_table() -> Dict[int, Score]:
+    table = {}
+    for size in (5, 6, 7):
+        for ranks in combinations_with_replacement(range(RANKS_COUNT), size):
+            counts = [0] * RANKS_COUNT
+            for r in ranks:
+                counts[r] += 1
+            if max(counts) > 4:
+                continue
+            key = sum(RANK_KEYS[r] for r in ranks)
+            table[key] = score_rank_counts(counts)
+    return table
+
+
+def _build_flush_table() -> List[Score]:
+    table = [0] * (1 << RANKS_COUNT)
+    for mask in range(1 << RANKS_COUNT):
+        if bin(mask).count("1") >= 5:
+            table[mask] = score_flush_mask(mask)
+    return table
+
+
+# Both tables are built once at import: the rank table maps the base-5
+# rank counts of 5..7 unsuited cards to a score, the flush table maps the
+# rank mask of a flush suit to a score.
+RANK_TABLE: Dict[int, Score] = _build_rank_table()
+FLUSH_TABLE: List[Score] = _build_flush_table()
+
+
+def score_to_values(score: Score) -> List[int]:
+    """ Card values (2..14) the best five cards of the score consist of. """
+    kind = HandsOfPoker(score // HAND_RANK)
+    rest = score % HAND_RANK
+    keys = []
+    while rest:
+        keys.append(rest % 15)
+        rest //= 15
+
+    if kind == HandsOfPoker.ROYAL_FLUSH:
+        return [10, 11, 12, 13, 14]
+    if kind in (HandsOfPoker.STRAIGHT_FLUSH, HandsOfPoker.STRAIGHTS):
+        top = keys[0]
+        if top == 5:
+            return [14, 2, 3, 4, 5]
+        return list(range(top - 4, top + 1))
+
+    multiplicity = {
+        HandsOfPoker.FOUR_OF_A_KIND: [1, 4],
+        HandsOfPoker.FULL_HOUSE: [2, 3],
+        HandsOfPoker.THREE_OF_A_KIND: [1, 1, 3],
+        HandsOfPoker.TWO_PAIR: [1, 2, 2],
+        HandsOfPoker.PAIR: [1, 1, 1, 2],
+    }.get(kind, [1] * 5)
+
+    values = []
+    for value, count in zip(keys, multiplicity):
+        values += [value] * count
+    return values
+
+
+def canonical_codes(codes: List[CardCode]) -> Tuple[CardCode, ...]:
+    """ The codes with suits renamed in the order they first appear.
+
+        Hands equal up to a permutation of suits get the same key, and
+        the cards keep their positions.
+    """
+    suits = [-1, -1, -1, -1]
+    next_suit = 0
+    key = []
+    for code in codes:
+        suit = code & 3
+        if suits[suit] < 0:
+            suits[suit] = next_suit
+            next_suit += 1
+        key.append(code & ~3 | suits[suit])
+    return tuple(key)
+
+
+@dataclass(frozen=True)
+class CacheInfo:
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+
+
+class BestHandCache:
+    """
+    Bounded LRU of (score, best five indexes) by canonical hand key.
+    """
+
+    def __init__(self, max_size: int = BEST_HAND_CACHE_SIZE):
+        self._max_size = max_size
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Tuple[Score, Tuple[int, ...]]]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value: Tuple[Score, Tuple[int, ...]]) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self._items),
+                max_size=self._max_size,
+            )
+
+
+class HandEvaluator:
+    """ Scores 5..7 card hands with two table lookups.
+
+        Scores are identical to WinnerDetermination._check_hand_get_score
+        applied to the best five-card combination.
+    """
+
+    def __init__(self, cache_size: int = BEST_HAND_CACHE_SIZE):
+        self.cache = BestHandCache(cache_size)
+
+    @staticmethod
+    def score_codes(codes: List[CardCode]) -> Score:
+        if len(codes) < 5:
+            return 0
+
+        key = 0
+        suit_masks = [0, 0, 0, 0]
+        suit_counts = [0, 0, 0, 0]
+        for code in codes:
+            rank = code >> 2
+            suit = code & 3
+            key += RANK_KEYS[rank]
+            suit_masks[suit] |= 1 << rank
+            suit_counts[suit] += 1
+
+        for suit in range(4):
+            if suit_counts[suit] >= 5:
+                return FLUSH_TABLE[suit_masks[suit]]
+
+        return RANK_TABLE[key]
+
+    def score(self, cards: Cards) -> Score:
+        return self.score_codes(card_codes(cards))
+
+    def best_hand(
+        self,
+        cards: Cards,
+        score: Optional[Score] = None,
+    ) -> Tuple[Cards, Score]:
+        """ The best five cards in the order of the first combination
+            of itertools.combinations with the best score.
+
+            The score is looked up unless it is already known.
+        """
+        codes = card_codes(cards)
+        if len(codes) < 5:
+            return [], 0
+
+        key = canonical_codes(codes)
+        cached = self.cache.get(key)
+        if cached is None:
+            if score is None:
+                score = self.score_codes(codes)
+            cached = (score, tuple(best_five_indexes(codes, score)))
+            self.cache.put(key, cached)
+
+        score, indexes = cached
+        return [cards[i] for i in indexes], score
+
+
+def _flush_suit(codes: List[CardCode]) -> int:
+    suit_counts = [0, 0, 0, 0]
+    for code in codes:
+        suit_counts[code & 3] += 1
+    for suit in range(4):
+        if suit_counts[suit] >= 5:
+            return suit
+    return -1
+
+
+def best_five_indexes(codes: List[CardCode], score: Score) -> List[int]:
+    """ Indexes of the cards making the score, taking the earliest cards. """
+    needed = [0] * RANKS_COUNT
+    for value in score_to_values(score):
+        needed[value - 2] += 1
+
+    suit = -1
+    if score // HAND_RANK in (
+        HandsOfPoker.ROYAL_FLUSH.value,
+        HandsOfPoker.STRAIGHT_FLUSH.value,
+        HandsOfPoker.FLUSH.value,
+    ):
+        suit = _flush_suit(codes)
+
+    indexes = []
+    for i, code in enumerate(codes):
+        if suit >= 0 and code & 3 != suit:
+            continue
+        if needed[code >> 2] > 0:
+            needed[code >> 2] -= 1
+            indexes.append(i)
+    return indexes
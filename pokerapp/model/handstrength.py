@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+from typing import Iterable, List
+
+from pokerapp.entity.cards import CardCode
+from pokerapp.entity.entities import Score
+from pokerapp.model.handevaluator import (
+    FLUSH_TABLE,
+    HAND_RANK,
+    RANK_KEYS,
+    RANK_TABLE,
+    RANKS_COUNT,
+    WHEEL_MASK,
+    HandsOfPoker,
+    score_rank_counts,
+)
+
+CATEGORY_NAMES = {
+    HandsOfPoker.ROYAL_FLUSH: "royal flush",
+    HandsOfPoker.STRAIGHT_FLUSH: "straight flush",
+    HandsOfPoker.FOUR_OF_A_KIND: "four of a kind",
+    HandsOfPoker.FULL_HOUSE: "full house",
+    HandsOfPoker.FLUSH: "flush",
+    HandsOfPoker.STRAIGHTS: "straight",
+    HandsOfPoker.THREE_OF_A_KIND: "three of a kind",
+    HandsOfPoker.TWO_PAIR: "two pair",
+    HandsOfPoker.PAIR: "pair",
+    HandsOfPoker.HIGH_CARD: "high card",
+}
+
+
+class HandStrength:
+    """
+    Rank counts and suit masks of a growing set of cards. Cards are added
+    street by street, the score of 5..7 cards is then one table lookup.
+    """
+
+    def __init__(self, codes: Iterable[CardCode] = ()):
+        self.size = 0
+        self._key = 0
+        self._rank_mask = 0
+        self._suit_masks = [0, 0, 0, 0]
+        self._suit_counts = [0, 0, 0, 0]
+        self.add(codes)
+
+    def add(self, codes: Iterable[CardCode]) -> None:
+        for code in codes:
+            rank = code >> 2
+            suit = code & 3
+            self._key += RANK_KEYS[rank]
+            self._rank_mask |= 1 << rank
+            self._suit_masks[suit] |= 1 << rank
+            self._suit_counts[suit] += 1
+            self.size += 1
+
+    def _rank_counts(self) -> List[int]:
+        counts = []
+        key = self._key
+        for _ in range(RANKS_COUNT):
+            key, count = divmod(key, 5)
+            counts.append(count)
+        return counts
+
+    def score(self) -> Score:
+        """ Score of the best five cards, made hands only below five. """
+        for suit in range(4):
+            if self._suit_counts[suit] >= 5:
+                return FLUSH_TABLE[self._suit_masks[suit]]
+
+        if self.size >= 5:
+            return RANK_TABLE[self._key]
+        if self.size == 0:
+            return 0
+        return score_rank_counts(self._rank_counts())
+
+    @property
+    def kind(self) -> HandsOfPoker:
+        return HandsOfPoker(self.score() // HAND_RANK)
+
+    def has_flush_draw(self) -> bool:
+        return self.size < 7 and 4 in self._suit_counts
+
+    def has_straight_draw(self) -> bool:
+        """ Four ranks of a straight, open-ended or inside. """
+        if self.size >= 7:
+            return False
+
+        mask = self._rank_mask
+        for top in range(RANKS_COUNT - 1, 3, -1):
+            window = mask & (0b11111 << (top - 4))
+            if bin(window).count("1") == 4:
+                return True
+        return bin(mask & WHEEL_MASK).count("1") == 4
+
+    def category(self) -> str:
+        """ The made hand and the draws, e.g. "pair, flush draw". """
+        kind = self.kind
+        parts = [CATEGORY_NAMES[kind]]
+        if kind.value < HandsOfPoker.STRAIGHTS.value and \
+                self.has_straight_draw():
+            parts.append("straight draw")
+        if kind.value < HandsOfPoker.FLUSH.value and self.has_flush_draw():
+            parts.append("flush draw")
+        return ", ".join(parts)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+
+import time
+from array import array
+from typing import Iterable, List, Tuple
+
+from pokerapp.entity.entities import Money, UserId
+from pokerapp.entity.game import Game
+from pokerapp.entity.userexception import UserException
+from pokerapp.entity.wallet import Wallet
+from pokerapp.kv.backend import KvBackend
+from pokerapp.kv.script import LuaScript, execute_pipeline
+from pokerapp.model.journal import (
+    JOURNAL_LUA,
+    KEY_JOURNAL,
+    journal_fields,
+    journal_python,
+)
+from pokerapp.model.kvschema import FIELD_MONEY, hand_field, user_key
+from pokerapp.model.leaderboard import RANK_LUA, rank_keys, rank_python
+from pokerapp.model.walletmanagermodel import WalletManagerModel
+
+# Reservations of running hands by "<user id>:<game id>", scored by the
+# last time the hand was saved, so a sweeper finds the ones of a dead
+# process.
+KEY_RESERVATIONS = "pokerbot:hands"
+DEFAULT_RESERVATION_MAX_AGE_SEC = 6 * 60 * 60
+SWEEP_INTERVAL_SEC = 10 * 60
+
+# Reserving and sweeping only move money inside the user hash, the
+# leaderboard counts reserved stacks and stays as it is. All three
+# scripts journal the move, the bets in between are journaled by
+# settle_hand() in the same MULTI/EXEC as the settlement.
+
+# KEYS: user hash, reservations, journal, user hashes of the others.
+# ARGV: hand field, time, member, user id, game id.
+# A player reserves at most what the richest other player brings, the
+# only money the hand can lose. Others reserved before count with their
+# reservation.
+RESERVE_SCRIPT = JOURNAL_LUA + """
+local money = tonumber(redis.call('HGET', KEYS[1], 'money') or '0')
+local stack = money
+if #KEYS > 3 then
+    local need = 0
+    for i = 4, #KEYS do
+        local other = tonumber(redis.call('HGET', KEYS[i], 'money') or '0')
+            + tonumber(redis.call('HGET', KEYS[i], ARGV[1]) or '0')
+        need = math.max(need, other)
+    end
+    stack = math.min(money, need)
+end
+redis.call('HSET', KEYS[1], 'money', money - stack)
+redis.call('HINCRBY', KEYS[1], ARGV[1], stack)
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+journal(KEYS[3], ARGV[4], 'reserve', stack, money - stack, ARGV[5])
+return stack
+"""
+
+# KEYS: user hash, reservations, journal, board, chats.
+# ARGV: hand field, stack, member, user id, game id.
+# A reservation the sweeper already returned is not paid twice.
+SETTLE_SCRIPT = RANK_LUA + JOURNAL_LUA + """
+local reserved = redis.call('HGET', KEYS[1], ARGV[1])
+if not reserved then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[3])
+local money = redis.call('HINCRBY', KEYS[1], 'money', ARGV[2])
+rank(KEYS[4], KEYS[5], ARGV[4], tonumber(ARGV[2]) - tonumber(reserved))
+journal(KEYS[3], ARGV[4], 'settle', ARGV[2], money, ARGV[5])
+return 1
+"""
+
+# KEYS: user hash, reservations, journal.
+# ARGV: hand field, member, user id, game id.
+SWEEP_SCRIPT = JOURNAL_LUA + """
+local money = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[2])
+if money > 0 then
+    local wallet = redis.call('HINCRBY', KEYS[1], 'money', money)
+    journal(KEYS[3], ARGV[3], 'sweep', money, wallet, ARGV[4])
+end
+return money
+"""
+
+
+def _reserve_python(kv: KvBackend, keys: List[str], args: List):
+    money = int(kv.hget(keys[0], FIELD_MONEY) or 0)
+    stack = money
+    if len(keys) > 3:
+        stack = min(money, max(
+            int(kv.hget(key, FIELD_MONEY) or 0) +
+            int(kv.hget(key, args[0]) or 0)
+            for key in keys[3:]
+        ))
+    kv.hset(keys[0], FIELD_MONEY, money - stack)
+    kv.hincrby(keys[0], args[0], stack)
+    kv.zadd(keys[1], {args[2]: float(args[1])})
+    journal_python(
+        kv, keys[2], args[3], "reserve", stack, money - stack, args[4],
+    )
+    return stack
+
+
+def _settle_python(kv: KvBackend, keys: List[str], args: List):
+    reserved = kv.hget(keys[0], args[0])
+    if reserved is None:
+        return 0
+    kv.hdel(keys[0], args[0])
+    kv.zrem(keys[1], args[2])
+    money = kv.hincrby(keys[0], FIELD_MONEY, int(args[1]))
+    rank_python(kv, keys[3], keys[4], args[3], int(args[1]) - int(reserved))
+    journal_python(kv, keys[2], args[3], "settle", args[1], money, args[4])
+    return 1
+
+
+def _sweep_python(kv: KvBackend, keys: List[str], args: List):
+    money = int(kv.hget(keys[0], args[0]) or 0)
+    kv.hdel(keys[0], args[0])
+    kv.zrem(keys[1], args[1])
+    if money > 0:
+        wallet = kv.hincrby(keys[0], FIELD_MONEY, money)
+        journal_python(kv, keys[2], args[2], "sweep", money, wallet, args[3])
+    return money
+
+
+_reserve = LuaScript(RESERVE_SCRIPT, _reserve_python)
+_settle = LuaScript(SETTLE_SCRIPT, _settle_python)
+_sweep = LuaScript(SWEEP_SCRIPT, _sweep_python)
+
+
+def _keys(user_id: UserId) -> List[str]:
+    return [user_key(user_id), KEY_RESERVATIONS, KEY_JOURNAL]
+
+
+def _member(user_id: UserId, game_id: str) -> str:
+    return str(user_id) + ":" + game_id
+
+
+class HandWallet(Wallet):
+    """
+    The stack a player brought to a hand. It is reserved in Redis when
+    the hand starts, bets only change it in memory and the result is
+    written back once when the hand is settled, together with the
+    journal entries of the bets.
+    """
+
+    __slots__ = (
+        "user_id",
+        "game_id",
+        "_stack",
+        "_authorized",
+        "_amounts",
+        "_stacks",
+    )
+
+    def __init__(self, user_id: UserId, game_id: str, stack: Money):
+        self.user_id = user_id
+        self.game_id = game_id
+        self._stack = stack
+        self._authorized = 0
+        # Signed amount and stack after it of every change in the hand.
+        self._amounts = array("q")
+        self._stacks = array("q")
+
+    @property
+    def entries(self) -> List[Tuple[str, Money, Money]]:
+        """ (op, amount, stack after it) of every change in the hand. """
+        return [
+            ("win" if amount > 0 else "bet", abs(amount), stack)
+            for amount, stack in zip(self._amounts, self._stacks)
+        ]
+
+    @entries.setter
+    def entries(self, entries: Iterable[Tuple[str, Money, Money]]) -> None:
+        self._amounts = array("q")
+        self._stacks = array("q")
+        for op, amount, stack in entries:
+            self._amounts.append(amount if op == "win" else -amount)
+            self._stacks.append(stack)
+
+    def inc(self, amount: Money = 0) -> None:
+        if self._stack + amount < 0:
+            raise UserException("not enough money")
+        self._stack += amount
+        if amount != 0:
+            self._amounts.append(amount)
+            self._stacks.append(self._stack)
+
+    def inc_authorized_money(self, game_id: str, amount: Money) -> None:
+        self._authorized += amount
+
+    def authorized_money(self, game_id: str) -> Money:
+        return self._authorized
+
+    def authorize(self, game_id: str, amount: Money) -> None:
+        self.inc(-amount)
+        self._authorized += amount
+
+    def authorize_all(self, game_id: str) -> Money:
+        money = self._stack
+        self.authorize(game_id, money)
+        return money
+
+    def value(self) -> Money:
+        return self._stack
+
+    def approve(self, game_id: str) -> None:
+        self._authorized = 0
+
+
+def reserve_hand(kv: KvBackend, game: Game) -> None:
+    """ Moves the stacks of the players into reservations of the hand.
+
+        A player reserves only what the other players can win from
+        them, the rest of the wallet stays free for the tables of other
+        chats. Each reservation is one atomic script, the whole table
+        is sent in one pipeline. Wallets of backends without scripts
+        stay as they are.
+    """
+    players = [
+        p for p in game.players
+        if isinstance(p.wallet, WalletManagerModel) and p.wallet.scripted
+    ]
+    if not players:
+        return
+
+    _reserve.load(kv)
+    now = time.time()
+    pipe = kv.pipeline(transaction=False)
+    calls = [
+        _reserve.queue(
+            pipe,
+            _keys(player.user_id) + [
+                user_key(p.user_id) for p in players if p is not player
+            ],
+            [
+                hand_field(game.id),
+                now,
+                _member(player.user_id, game.id),
+                player.user_id,
+                game.id,
+            ],
+        )
+        for player in players
+    ]
+    stacks = execute_pipeline(kv, pipe, calls)
+
+    for player, stack in zip(players, stacks):
+        player.wallet = HandWallet(player.user_id, game.id, int(stack))
+
+
+def settle_hand(kv: KvBackend, game: Game) -> None:
+    """ Writes the stacks of the hand back in one MULTI/EXEC.
+
+        The buffered bets of every stack are journaled in the same
+        transaction, so they cost no round trip of their own.
+    """
+    hand_wallets = []
+    for player in game.players:
+        if isinstance(player.wallet, HandWallet):
+            hand_wallets.append(player.wallet)
+        player.wallet.approve(game.id)
+
+    if not hand_wallets:
+        return
+
+    _settle.load(kv)
+    pipe = kv.pipeline(transaction=True)
+    calls = []
+    for wallet in hand_wallets:
+        for op, amount, stack in wallet.entries:
+            pipe.xadd(KEY_JOURNAL, journal_fields(
+                wallet.user_id, op, amount, stack, wallet.game_id,
+            ))
+        wallet.entries = ()
+        calls.append(_settle.queue(
+            pipe,
+            _keys(wallet.user_id) + rank_keys(wallet.user_id),
+            [
+                hand_field(wallet.game_id),
+                wallet.value(),
+                _member(wallet.user_id, wallet.game_id),
+                wallet.user_id,
+                wallet.game_id,
+            ],
+        ))
+    execute_pipeline(kv, pipe, calls)
+
+
+def reservation_members(game: Game) -> List[str]:
+    """ The reservations of the hand the game is playing. """
+    return [
+        _member(p.wallet.user_id, p.wallet.game_id)
+        for p in game.players
+        if isinstance(p.wallet, HandWallet)
+    ]
+
+
+def queue_touch(pipe, members: List[str], now: float) -> None:
+    """ Scores the reservations with now, so the sweeper keeps them.
+
+        Settled reservations are not added back.
+    """
+    if members:
+        pipe.zadd(KEY_RESERVATIONS, {m: now for m in members}, xx=True)
+
+
+def sweep_reservations(
+    kv: KvBackend,
+    max_age: float = DEFAULT_RESERVATION_MAX_AGE_SEC,
+) -> Money:
+    """ Returns reservations not saved for max_age to their wallets.
+
+        Every snapshot of a running hand renews its reservations, a hand
+        not saved for that long was left by a process that died and is
+        voided. Returns the money given back.
+    """
+    members = kv.zrangebyscore(KEY_RESERVATIONS, "-inf", time.time() - max_age)
+    returned = 0
+    for member in members:
+        user_id, game_id = member.decode("utf-8").split(":", 1)
+        returned += int(_sweep(
+            kv,
+            _keys(user_id),
+            [hand_field(game_id), member, user_id, game_id],
+        ))
+    return returned
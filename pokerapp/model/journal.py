@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from pokerapp.entity.entities import Money, UserId
+from pokerapp.kv.backend import KvBackend
+
+# Every change of money is an entry of the stream:
+#   pokerbot:journal             user, op, amount, money, game
+# Money is the wallet after the change, for the hand ops the stack in
+# the hand. Entries older than the retention are folded into:
+#   pokerbot:journal:checkpoint  <user id> -> last wallet entry as JSON
+#   pokerbot:journal:compacted   id of the last folded entry
+KEY_JOURNAL = "pokerbot:journal"
+KEY_JOURNAL_CHECKPOINT = "pokerbot:journal:checkpoint"
+KEY_JOURNAL_COMPACTED = "pokerbot:journal:compacted"
+
+JOURNAL_RETENTION_SEC = 7 * 24 * 60 * 60
+COMPACT_INTERVAL_SEC = 60 * 60
+COMPACT_BATCH = 1000
+
+# Ops of a running hand, they do not change the wallet.
+HAND_OPS = ("bet", "win")
+
+# Scripts that change money start with this function and call it in the
+# same script, so a change and its entry are written together.
+JOURNAL_LUA = """
+local function journal(stream, user, op, amount, money, game)
+    redis.call('XADD', stream, '*', 'user', user, 'op', op,
+        'amount', amount, 'money', money, 'game', game)
+end
+"""
+
+
+def journal_fields(
+    user_id: UserId,
+    op: str,
+    amount: Money,
+    money: Money,
+    game_id: str = "",
+) -> Dict[str, str]:
+    return {
+        "user": str(user_id),
+        "op": op,
+        "amount": str(amount),
+        "money": str(money),
+        "game": game_id,
+    }
+
+
+def journal_python(
+    kv: KvBackend,
+    stream: str,
+    user_id: UserId,
+    op: str,
+    amount: Money,
+    money: Money,
+    game_id: str = "",
+) -> None:
+    """ JOURNAL_LUA for backends without Lua. """
+    kv.xadd(stream, journal_fields(user_id, op, amount, money, game_id))
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    id: str
+    user_id: str
+    op: str
+    amount: Money
+    money: Money
+    game_id: str
+
+    @staticmethod
+    def from_stream(entry_id: bytes, fields: Dict[bytes, bytes]):
+        def field(name: str) -> str:
+            return fields.get(name.encode("utf-8"), b"").decode("utf-8")
+
+        return JournalEntry(
+            id=entry_id.decode("utf-8"),
+            user_id=field("user"),
+            op=field("op"),
+            amount=int(field("amount") or 0),
+            money=int(field("money") or 0),
+            game_id=field("game"),
+        )
+
+
+def _next_id(entry_id: str) -> str:
+    ms, seq = entry_id.split("-")
+    return "{}-{}".format(ms, int(seq) + 1)
+
+
+def compact_journal(
+    kv: KvBackend,
+    retention: float = JOURNAL_RETENTION_SEC,
+    batch: int = COMPACT_BATCH,
+) -> int:
+    """ Folds entries older than retention into the checkpoint.
+
+        Every batch is one read and one MULTI/EXEC that saves the last
+        wallet entry of every user in it and trims the batch off the
+        stream, so the journal stays as long as the retention. Returns
+        the number of folded entries.
+    """
+    upto = "{}".format(int((time.time() - retention) * 1000) - 1)
+    folded = 0
+    while True:
+        entries = kv.xrange(KEY_JOURNAL, "-", upto, count=batch)
+        if not entries:
+            return folded
+
+        checkpoint: Dict[str, str] = {}
+        for entry_id, fields in entries:
+            entry = JournalEntry.from_stream(entry_id, fields)
+            if entry.op not in HAND_OPS:
+                checkpoint[entry.user_id] = json.dumps({
+                    "id": entry.id,
+                    "op": entry.op,
+                    "money": entry.money,
+                })
+
+        last_id = entries[-1][0].decode("utf-8")
+        pipe = kv.pipeline(transaction=True)
+        if checkpoint:
+            pipe.hset(KEY_JOURNAL_CHECKPOINT, mapping=checkpoint)
+        pipe.set(KEY_JOURNAL_COMPACTED, last_id)
+        pipe.xtrim(KEY_JOURNAL, minid=_next_id(last_id), approximate=False)
+        pipe.execute()
+        folded += len(entries)
+
+
+def history(
+    kv: KvBackend,
+    user_id: UserId,
+    batch: int = COMPACT_BATCH,
+) -> Tuple[Optional[dict], List[JournalEntry]]:
+    """ The checkpoint of the user and the entries after it.
+
+        Reads the whole journal, it is meant for looking into disputes.
+    """
+    checkpoint = kv.hget(KEY_JOURNAL_CHECKPOINT, str(user_id))
+    entries = []
+    start = "-"
+    while True:
+        page = kv.xrange(KEY_JOURNAL, start, "+", count=batch)
+        for entry_id, fields in page:
+            entry = JournalEntry.from_stream(entry_id, fields)
+            if entry.user_id == str(user_id):
+                entries.append(entry)
+        if len(page) < batch:
+            break
+        start = _next_id(page[-1][0].decode("utf-8"))
+    return (json.loads(checkpoint) if checkpoint else None), entries
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+from typing import Optional
+
+from pokerapp.entity.entities import ChatId, UserId
+
+# Everything about a user is one small hash, which Redis keeps in the
+# compact listpack encoding:
+#   pokerbot:user:<id>           money, daily, chat_id, hand:<game id>
+#   pokerbot:user:<id>:messages  list of private message ids
+# Money authorized in a game is a hash by user id that expires when the
+# game is abandoned:
+#   pokerbot:game:<game id>      <user id> -> authorized money
+# Players ranked by money, everyone and the players of every chat:
+#   pokerbot:top                 sorted set of user ids
+#   pokerbot:top:<chat id>       sorted set of user ids
+#   pokerbot:user:<id>:chats     set of the chats the user played in
+# The game running in a chat, to pick it up after a restart:
+#   pokerbot:snapshot:<chat id>  marshalled game, see gamesnapshot.py
+# Nodes sharing the instance, the owner of a chat and the updates other
+# nodes forwarded to a node:
+#   pokerbot:lease:<chat id>     id of the node, expires unless renewed
+#   pokerbot:inbox:<node id>     list of forwarded updates as JSON
+USER_KEY_PREFIX = "pokerbot:user:"
+GAME_KEY_PREFIX = "pokerbot:game:"
+SNAPSHOT_KEY_PREFIX = "pokerbot:snapshot:"
+LEASE_KEY_PREFIX = "pokerbot:lease:"
+INBOX_KEY_PREFIX = "pokerbot:inbox:"
+LEADERBOARD_KEY = "pokerbot:top"
+
+FIELD_MONEY = "money"
+FIELD_DAILY = "daily"
+FIELD_CHAT_ID = "chat_id"
+FIELD_NAME = "name"
+FIELD_HAND_PREFIX = "hand:"
+
+GAME_KEY_TTL_SEC = 2 * 24 * 60 * 60
+
+
+def user_key(user_id: UserId) -> str:
+    return USER_KEY_PREFIX + str(user_id)
+
+
+def user_messages_key(user_id: UserId) -> str:
+    return user_key(user_id) + ":messages"
+
+
+def game_key(game_id: str) -> str:
+    return GAME_KEY_PREFIX + game_id
+
+
+def snapshot_key(chat_id: ChatId) -> str:
+    return SNAPSHOT_KEY_PREFIX + str(chat_id)
+
+
+def lease_key(chat_id: ChatId) -> str:
+    return LEASE_KEY_PREFIX + str(chat_id)
+
+
+def inbox_key(node_id: str) -> str:
+    return INBOX_KEY_PREFIX + node_id
+
+
+def hand_field(game_id: str) -> str:
+    return FIELD_HAND_PREFIX + game_id
+
+
+def user_chats_key(user_id: UserId) -> str:
+    return user_key(user_id) + ":chats"
+
+
+def leaderboard_key(chat_id: Optional[ChatId] = None) -> str:
+    if chat_id is None:
+        return LEADERBOARD_KEY
+    return LEADERBOARD_KEY + ":" + str(chat_id)
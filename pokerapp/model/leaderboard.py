@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from pokerapp.entity.entities import ChatId, Money, UserId
+from pokerapp.kv.backend import KvBackend
+from pokerapp.kv.batch import ReadBatch
+from pokerapp.kv.script import LuaScript
+from pokerapp.model.kvschema import (
+    FIELD_HAND_PREFIX,
+    FIELD_MONEY,
+    FIELD_NAME,
+    LEADERBOARD_KEY,
+    leaderboard_key,
+    user_chats_key,
+    user_key,
+)
+
+TOP_PAGE_SIZE = 10
+
+# The score of a player is the money in the wallet plus the stacks
+# reserved for running hands. Every script that changes it starts with
+# this function and calls it in the same script, so the boards never
+# miss a change. The board of a chat is the global board key with
+# ":<chat id>" appended.
+RANK_LUA = """
+local function rank(board, chats, user, delta)
+    if tonumber(delta) == 0 then
+        return
+    end
+    redis.call('ZINCRBY', board, delta, user)
+    for _, chat in ipairs(redis.call('SMEMBERS', chats)) do
+        redis.call('ZINCRBY', board .. ':' .. chat, delta, user)
+    end
+end
+"""
+
+# KEYS: user hash, board, chats of the user. ARGV: user id, chat, name.
+# A player joining a chat is added to its board with the global score.
+JOIN_SCRIPT = """
+redis.call('HSET', KEYS[1], 'name', ARGV[3])
+if redis.call('SADD', KEYS[3], ARGV[2]) == 0 then
+    return 0
+end
+local score = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if score then
+    redis.call('ZADD', KEYS[2] .. ':' .. ARGV[2], score, ARGV[1])
+end
+return 1
+"""
+
+
+def rank_python(
+    kv: KvBackend,
+    board: str,
+    chats: str,
+    user_id: UserId,
+    delta: Money,
+) -> None:
+    """ RANK_LUA for backends without Lua. """
+    if delta == 0:
+        return
+    kv.zincrby(board, delta, user_id)
+    for chat in kv.smembers(chats):
+        kv.zincrby(board + ":" + chat.decode("utf-8"), delta, user_id)
+
+
+def rank_keys(user_id: UserId) -> List[str]:
+    """ The keys rank() of a user needs, appended to KEYS of scripts. """
+    return [LEADERBOARD_KEY, user_chats_key(user_id)]
+
+
+def _join_python(kv: KvBackend, keys: List[str], args: List):
+    user_id, chat_id, name = args
+    kv.hset(keys[0], FIELD_NAME, name)
+    if kv.sadd(keys[2], chat_id) == 0:
+        return 0
+    score = kv.zscore(keys[1], user_id)
+    if score is not None:
+        kv.zadd(keys[1] + ":" + str(chat_id), {user_id: score})
+    return 1
+
+
+_join = LuaScript(JOIN_SCRIPT, _join_python)
+
+
+@dataclass(frozen=True)
+class LeaderboardEntry:
+    place: int
+    user_id: UserId
+    name: str
+    money: Money
+
+
+class Leaderboard:
+    """
+    Players ranked by money, globally and in every chat they played in.
+    A page costs O(log n + size) on the sorted set and one pipeline for
+    the names.
+    """
+
+    def __init__(self, kv: KvBackend):
+        self._kv = kv
+
+    def join(self, chat_id: ChatId, user_id: UserId, name: str) -> None:
+        # Stand-ins of a backend without scripts keep no boards.
+        if not hasattr(self._kv, "evalsha"):
+            return
+        _join(
+            self._kv,
+            [user_key(user_id)] + rank_keys(user_id),
+            [user_id, chat_id, name],
+        )
+
+    def size(self, chat_id: Optional[ChatId] = None) -> int:
+        return self._kv.zcard(leaderboard_key(chat_id))
+
+    def page(
+        self,
+        chat_id: Optional[ChatId] = None,
+        page: int = 0,
+        size: int = TOP_PAGE_SIZE,
+    ) -> List[LeaderboardEntry]:
+        """ Entries of the page, the richest players first. """
+        start = page * size
+        members = self._kv.zrevrange(
+            leaderboard_key(chat_id), start, start + size - 1,
+            withscores=True,
+        )
+
+        batch = ReadBatch(self._kv)
+        names = [
+            batch.hget(user_key(member.decode("utf-8")), FIELD_NAME)
+            for member, _ in members
+        ]
+
+        entries = []
+        for i, ((member, score), name) in enumerate(zip(members, names)):
+            user_id = member.decode("utf-8")
+            name = name.result()
+            entries.append(LeaderboardEntry(
+                place=start + i + 1,
+                user_id=user_id,
+                name=name.decode("utf-8") if name else user_id,
+                money=int(score),
+            ))
+        return entries
+
+
+def wealth(fields: dict) -> Money:
+    """ Money and reserved stacks in the HGETALL of a user hash. """
+    money = 0
+    for field, value in fields.items():
+        field = field.decode("utf-8") if isinstance(field, bytes) else field
+        if field == FIELD_MONEY or field.startswith(FIELD_HAND_PREFIX):
+            money += int(value)
+    return money
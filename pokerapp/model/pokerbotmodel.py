@@ -1,32 +1,42 @@
 #!/usr/bin/env python3
 
 import datetime
+import time
 import traceback
+from concurrent.futures import Future, TimeoutError
 from threading import Timer
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple
 
 from PIL import Image
 from telegram import Message, ReplyKeyboardMarkup, Update, Bot
 from telegram.ext import Handler, CallbackContext
+from telegram.utils.helpers import escape_markdown
 
 from pokerapp.config import Config
 from pokerapp.constants import IMAGE_SMALL
-from pokerapp.entity.cards import Cards
+from pokerapp.entity.cards import Cards, card_codes
 from pokerapp.entity.entities import (
     ChatId,
     UserId,
     Money,
 )
+from pokerapp.entity.equity import PlayerEquity
 from pokerapp.entity.game import Game
 from pokerapp.entity.gamestate import GameState
 from pokerapp.entity.player import Player
 from pokerapp.entity.playeraction import PlayerAction
-from pokerapp.entity.playerbet import PlayerBet
 from pokerapp.entity.playerstate import PlayerState
 from pokerapp.entity.userexception import UserException
+from pokerapp.kv.metrics import KvMetrics
+from pokerapp.model.equitycalculator import EquityCalculator
+from pokerapp.model.gamesnapshot import GameSnapshots
+from pokerapp.model.handstrength import HandStrength
+from pokerapp.model.handwallet import reserve_hand, settle_hand
+from pokerapp.model.leaderboard import Leaderboard, LeaderboardEntry
+from pokerapp.model.preflopequity import PreflopEquityTable
 from pokerapp.model.privatechatmodel import UserPrivateChatModel
 from pokerapp.model.roundratemodel import RoundRateModel
-from pokerapp.model.walletmanagermodel import WalletManagerModel
+from pokerapp.model.walletmanagermodel import WalletRegistry, wallet_values
 from pokerapp.model.winnerdetermination import WinnerDetermination
 from pokerapp.view.pokerbotview import PokerBotViewer
 
@@ -55,11 +65,27 @@ class PokerBotModel:
         bot: Bot,
         cfg: Config,
         kv,
+        equity_calculator: EquityCalculator = None,
+        kv_metrics: Optional[KvMetrics] = None,
+        snapshots: Optional[GameSnapshots] = None,
     ):
         self._view: PokerBotViewer = view
         self._bot: Bot = bot
         self._winner_determine: WinnerDetermination = WinnerDetermination()
+        self._equity: EquityCalculator = \
+            equity_calculator or EquityCalculator()
+        self._preflop_equity = PreflopEquityTable()
+        # All-in odds by game id, computed while the board is dealt, with
+        # the players in the order of the result and the deadline.
+        self._all_in_equity: Dict[
+            str,
+            Tuple[List[UserId], Future, float],
+        ] = {}
         self._kv = kv
+        self._kv_metrics = kv_metrics
+        self._snapshots = snapshots
+        self._wallets = WalletRegistry(kv)
+        self._leaderboard = Leaderboard(kv)
         self._cfg: Config = cfg
         self._round_rate: RoundRateModel = RoundRateModel()
 
@@ -78,6 +104,25 @@ class PokerBotModel:
             context.chat_data[KEY_CHAT_DATA_GAME] = Game()
         return context.chat_data[KEY_CHAT_DATA_GAME]
 
+    def restore_game(self, update: Update, context: CallbackContext) -> None:
+        """ Puts the saved game of the chat back after a restart.
+
+            Runs before the handlers of every update, a chat is read
+            from kv once, when it sends the first update.
+        """
+        chat = update.effective_chat
+        if self._snapshots is None or chat is None or \
+                context.chat_data is None or \
+                KEY_CHAT_DATA_GAME in context.chat_data:
+            return
+
+        game = self._snapshots.load(chat.id, self._wallets.get)
+        context.chat_data[KEY_CHAT_DATA_GAME] = game or Game()
+
+    def _save_game(self, chat_id: ChatId, game: Game) -> None:
+        if self._snapshots is not None:
+            self._snapshots.save(chat_id, game)
+
     @staticmethod
     def _current_turn_player(game: Game) -> Player:
         assert len(game.players) > 0
@@ -97,7 +142,7 @@ class PokerBotModel:
             )
             return
 
-        if len(game.players) > MAX_PLAYERS:
+        if len(game.players) >= MAX_PLAYERS:
             self._view.send_message_reply(
                 chat_id=chat_id,
                 text="The room is full",
@@ -121,20 +166,24 @@ class PokerBotModel:
             user_id=user.id,
             user_name=user.full_name,
             mention_markdown=user.mention_markdown(),
-            wallet=WalletManagerModel(user.id, self._kv),
+            wallet=self._wallets.get(user.id),
             ready_message_id=update.effective_message.message_id,
         )
 
-        if player.wallet.value() < PlayerAction.BIG_BLIND.value:
+        # Stacks reserved by hands in other chats can not be bet here.
+        if player.wallet.available() < PlayerAction.BIG_BLIND.value:
+            in_hands = player.wallet.value() >= PlayerAction.BIG_BLIND.value
             return self._view.send_message_reply(
                 chat_id=chat_id,
                 message_id=update.effective_message.message_id,
-                text="You don't have enough money",
+                text="Your money is on a table in another chat"
+                if in_hands else "You don't have enough money",
             )
 
         game.ready_users.add(user.id)
 
         game.players.append(player)
+        self._leaderboard.join(chat_id, user.id, user.full_name)
 
         members_count = self._bot.get_chat_member_count(chat_id)
         players_active = len(game.players)
@@ -224,6 +273,8 @@ class PokerBotModel:
 
         game.players.sort(key=lambda p: index(old_players_ids, p.user_id))
 
+        reserve_hand(self._kv, game)
+
         game.state = GameState.ROUND_PRE_FLOP
         self._divide_cards(game=game, chat_id=chat_id)
 
@@ -231,14 +282,14 @@ class PokerBotModel:
         self._round_rate.round_pre_flop_rate_before_first_turn(game)
         self._process_playing(chat_id=chat_id, game=game)
         self._round_rate.round_pre_flop_rate_after_first_turn(game)
+        self._save_game(chat_id, game)
 
         context.chat_data[KEY_OLD_PLAYERS] = list(
             map(lambda p: p.user_id, game.players),
         )
 
     def bonus(self, update: Update, context: CallbackContext) -> None:
-        wallet = WalletManagerModel(
-            update.effective_message.from_user.id, self._kv)
+        wallet = self._wallets.get(update.effective_message.from_user.id)
         money = wallet.value()
 
         chat_id = update.effective_message.chat_id
@@ -288,13 +339,15 @@ class PokerBotModel:
     def reset_game(self, update: Update, context: CallbackContext) -> None:
         game = self._game_from_context(context)
 
-        bets: List[PlayerBet] = game.players_bets
-        [player.wallet.inc(bet.amount)
-         for bet in bets
-         for player in game.players
-         if player.user_id == bet.user_id]
+        for player in game.players:
+            amount = game.players_bets.player_total(player.user_id)
+            if amount > 0:
+                player.wallet.inc(amount)
+        self._settle(game)
+        self.discard_game(game)
 
         game.reset()
+        self._save_game(update.effective_message.chat_id, game)
         self._view.send_message(
             chat_id=update.effective_message.chat_id,
             text="The game is reset. Press /ready to start again.",
@@ -329,6 +382,99 @@ class PokerBotModel:
             ready_message_id=update.effective_message.message_id,
         )
 
+    def odds(self, update: Update, context: CallbackContext) -> None:
+        game = self._game_from_context(context)
+        chat_id = update.effective_message.chat_id
+        message_id = update.effective_message.message_id
+
+        player = None
+        for p in game.players:
+            if p.user_id == update.effective_user.id:
+                player = p
+                break
+
+        if player is None or not player.cards or \
+                player.state == PlayerState.FOLD:
+            self._view.send_message_reply(
+                chat_id=chat_id,
+                message_id=message_id,
+                text="You are not in the game.",
+            )
+            return
+
+        # The odds tell about the cards, so they are sent only privately.
+        private_chat_id = UserPrivateChatModel(
+            user_id=player.user_id,
+            kv=self._kv,
+        ).get_chat_id()
+        if private_chat_id is None:
+            self._view.send_message_reply(
+                chat_id=chat_id,
+                message_id=message_id,
+                text="Send /start to me in a private chat to get your odds.",
+            )
+            return
+
+        opponents = len(game.players_by(
+            states=(PlayerState.ACTIVE, PlayerState.ALL_IN),
+        )) - 1
+        cards = list(player.cards)
+        cards_table = list(game.cards_table)
+
+        def send(equity: Optional[PlayerEquity]) -> None:
+            if equity is None:
+                self._view.send_message_reply(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    text="The odds are not ready, try again later.",
+                )
+                return
+
+            margin = f" (±{equity.margin:.1f}%)" if equity.margin else ""
+            self._view.send_message(
+                chat_id=private_chat_id.decode('utf-8'),
+                text=(
+                    f"Your cards: {' '.join(cards)}\n"
+                    f"Table: {' '.join(cards_table) or 'no cards'}\n"
+                    f"Odds against {opponents} "
+                    f"opponent{'s' if opponents != 1 else ''}:\n"
+                    f"win *{equity.win:.1f}%*{margin}, "
+                    f"tie {equity.tie:.1f}%"
+                ),
+            )
+
+        self._player_odds(cards, opponents, cards_table, send)
+
+    def _player_odds(
+        self,
+        cards: Cards,
+        opponents: int,
+        cards_table: Cards,
+        callback: Callable[[Optional[PlayerEquity]], None],
+    ) -> None:
+        """ Calls back with the odds of the cards. Simulated odds come
+            from a thread of the equity pool, the handler does not wait.
+        """
+        # Preflop odds against random hands are precomputed, table sizes
+        # the file has no odds of are simulated like the later streets.
+        if not cards_table:
+            try:
+                equity = self._preflop_equity.equity(cards, opponents + 1)
+            except ValueError:
+                pass
+            else:
+                callback(equity)
+                return
+
+        def done(future: Future) -> None:
+            result = future.result()
+            callback(result.players[0] if result is not None else None)
+
+        self._equity.submit(
+            hands=[cards] + [[]] * opponents,
+            cards_table=cards_table,
+        ).add_done_callback(done)
+
     def _check_access(self, chat_id: ChatId, user_id: UserId) -> bool:
         chat_admins = self._bot.get_chat_administrators(chat_id)
         for m in chat_admins:
@@ -336,6 +482,11 @@ class PokerBotModel:
                 return True
         return False
 
+    def _settle(self, game: Game) -> None:
+        settle_hand(self._kv, game)
+        if self._kv_metrics is not None:
+            self._kv_metrics.hand_finished()
+
     def _send_cards_private(self, player: Player, cards: Cards) -> None:
         user_chat_model = UserPrivateChatModel(
             user_id=player.user_id,
@@ -356,8 +507,10 @@ class PokerBotModel:
         ).message_id
 
         try:
-            rm_msg_id = user_chat_model.pop_message()
-            while rm_msg_id is not None:
+            rm_msg_ids = user_chat_model.replace_messages(
+                message_id=message_id,
+            )
+            for rm_msg_id in rm_msg_ids:
                 try:
                     rm_msg_id = rm_msg_id.decode('utf-8')
                     self._view.remove_message(
@@ -367,19 +520,18 @@ class PokerBotModel:
                 except Exception as ex:
                     print("remove_message", ex)
                     traceback.print_exc()
-                rm_msg_id = user_chat_model.pop_message()
-
-            user_chat_model.push_message(message_id=message_id)
         except Exception as ex:
             print("bulk_remove_message", ex)
             traceback.print_exc()
 
     def _divide_cards(self, game: Game, chat_id: ChatId) -> None:
+        game.board_strength = HandStrength()
         for player in game.players:
             cards = player.cards = [
                 game.remain_cards.pop(),
                 game.remain_cards.pop(),
             ]
+            player.hand_strength = HandStrength(card_codes(cards))
 
             try:
                 self._send_cards_private(player=player, cards=cards)
@@ -397,6 +549,10 @@ class PokerBotModel:
             )
 
     def _process_playing(self, chat_id: ChatId, game: Game) -> None:
+        self._next_turn(chat_id, game)
+        self._save_game(chat_id, game)
+
+    def _next_turn(self, chat_id: ChatId, game: Game) -> None:
         game.current_player_index += 1
         game.current_player_index %= len(game.players)
 
@@ -424,7 +580,7 @@ class PokerBotModel:
 
         # Skip inactive players.
         if current_player.state != PlayerState.ACTIVE:
-            self._process_playing(chat_id, game)
+            self._next_turn(chat_id, game)
             return
 
         # All fold except one.
@@ -449,8 +605,15 @@ class PokerBotModel:
         game: Game,
         chat_id: ChatId,
     ) -> None:
-        for _ in range(count):
-            game.cards_table.append(game.remain_cards.pop())
+        new_cards = [game.remain_cards.pop() for _ in range(count)]
+        game.cards_table += new_cards
+
+        codes = card_codes(new_cards)
+        if game.board_strength is not None:
+            game.board_strength.add(codes)
+        for player in game.players:
+            if player.hand_strength is not None:
+                player.hand_strength.add(codes)
 
         self._view.send_desk_cards_img(
             chat_id=chat_id,
@@ -480,22 +643,39 @@ class PokerBotModel:
             cards_table=game.cards_table,
         )
 
-        winners_hand_money = self._round_rate.finish_rate(
+        winners_hand_money, returned_bets = self._round_rate.finish_rate(
             game=game,
             player_scores=player_scores,
         )
 
+        self._collect_all_in_equity(game)
+
         only_one_player = len(active_players) == 1
-        self._view.send_message(chat_id=chat_id, text=(
-            self._create_final_result_text(active_players, game, only_one_player, winners_hand_money)))
+        self._view.send_message(
+            chat_id=chat_id,
+            text=self._create_final_result_text(
+                active_players,
+                game,
+                only_one_player,
+                winners_hand_money,
+                game.all_in_equity,
+                returned_bets,
+            ),
+        )
 
-        for player in game.players:
-            player.wallet.approve(game.id)
+        self._settle(game)
 
         game.reset()
 
     @staticmethod
-    def _create_final_result_text(active_players, game, only_one_player, winners_hand_money):
+    def _create_final_result_text(
+        active_players,
+        game,
+        only_one_player,
+        winners_hand_money,
+        all_in_equity=None,
+        returned_bets=(),
+    ):
         text = "Game is finished with result:\n\n"
         for (player, best_hand, money) in winners_hand_money:
             win_hand = " ".join(best_hand)
@@ -504,7 +684,10 @@ class PokerBotModel:
                     f"GOT: *{money} $*\n"
             )
             if not only_one_player:
-                active_hands = '\n'.join(map(lambda p: f"{p.mention_markdown}: {' '.join(p.cards)}", active_players))
+                active_hands = '\n'.join(
+                    f"{p.mention_markdown}: {' '.join(p.cards)}"
+                    for p in active_players
+                )
 
                 text += (
                     f"Final table:\n"
@@ -514,9 +697,74 @@ class PokerBotModel:
                     f"All revealed hands:\n"
                     f"{active_hands}\n"
                 )
+        for (player, money) in returned_bets:
+            text += (
+                f"{player.mention_markdown}:\n"
+                f"RETURNED BET: *{money} $*\n"
+            )
+        if all_in_equity:
+            odds = '\n'.join(
+                f"{p.mention_markdown}: "
+                f"{all_in_equity[p.user_id].win:.1f}% win, "
+                f"{all_in_equity[p.user_id].tie:.1f}% tie"
+                for p in active_players
+                if p.user_id in all_in_equity
+            )
+            text += f"\nAll-in odds:\n{odds}\n"
         text += "\n/ready to continue"
         return text
 
+    def _calculate_all_in_equity(self, game: Game) -> None:
+        """ Starts the odds of the showdown when nobody can act before
+            the river, _finish() collects them.
+        """
+        if game.all_in_equity or game.id in self._all_in_equity or \
+                len(game.cards_table) == 5:
+            return
+
+        if game.players_by(states=(PlayerState.ACTIVE,)):
+            return
+
+        players = game.players_by(states=(PlayerState.ALL_IN,))
+        if len(players) < 2:
+            return
+
+        self._all_in_equity[game.id] = (
+            [p.user_id for p in players],
+            self._equity.submit(
+                hands=[p.cards for p in players],
+                cards_table=game.cards_table,
+                deck=game.remain_cards,
+            ),
+            time.monotonic() + self._equity.time_budget,
+        )
+
+    def _collect_all_in_equity(self, game: Game) -> None:
+        pending = self._all_in_equity.pop(game.id, None)
+        if pending is None:
+            return
+        user_ids, future, deadline = pending
+
+        # The rest of the board was dealt meanwhile, the wait is at most
+        # what is left of the time budget, late odds are left out.
+        try:
+            result = future.result(
+                timeout=max(0.0, deadline - time.monotonic()),
+            )
+        except TimeoutError:
+            future.cancel()
+            return
+        if result is None:
+            return
+
+        game.all_in_equity = dict(zip(user_ids, result.players))
+
+    def discard_game(self, game: Game) -> None:
+        """ Cancels the all-in odds of a game that will not finish. """
+        pending = self._all_in_equity.pop(game.id, None)
+        if pending is not None:
+            pending[1].cancel()
+
     def _goto_next_round(self, game: Game, chat_id: ChatId) -> bool:
         # The state of the last player becomes ALL_IN at end of the round .
         active_players = game.players_by(
@@ -528,6 +776,8 @@ class PokerBotModel:
                 self._finish(game, chat_id)
                 return
 
+        self._calculate_all_in_equity(game)
+
         def add_cards(cards_count):
             return self.add_cards_to_table(
                 count=cards_count,
@@ -699,7 +949,7 @@ class PokerBotModel:
     def top_up(self, update, context):
         chat_id = update.effective_message.chat_id
 
-        wallet = WalletManagerModel(update.effective_message.from_user.id, self._kv)
+        wallet = self._wallets.get(update.effective_message.from_user.id)
         if wallet.value() > 0:
             self._view.send_message_reply(
                 chat_id=chat_id,
@@ -725,6 +975,46 @@ class PokerBotModel:
             text=f"Your wallet is topped up with {top_up_amount} $"
         )
 
+    def top(self, update: Update, context: CallbackContext) -> None:
+        """ /top [all] [page]: the richest players of the chat or of
+            everyone, everyone in private chats.
+        """
+        chat_id = update.effective_message.chat_id
+        args = context.args or []
+        everyone = "all" in args or update.effective_chat.type == 'private'
+        pages = [int(arg) for arg in args if arg.isdigit()]
+        page = max(pages[0] - 1, 0) if pages else 0
+
+        board = None if everyone else chat_id
+        entries = self._leaderboard.page(chat_id=board, page=page)
+        self._view.send_message_reply(
+            chat_id=chat_id,
+            message_id=update.effective_message.message_id,
+            text=self._top_text(entries, page, everyone),
+        )
+
+    @staticmethod
+    def _top_text(
+        entries: List[LeaderboardEntry],
+        page: int,
+        everyone: bool,
+    ) -> str:
+        if not entries:
+            return "Nobody is here yet." if page == 0 else "No more players."
+
+        title = "Richest players"
+        if not everyone:
+            title += " of the chat"
+        if page > 0:
+            title += f", page {page + 1}"
+        lines = [f"*{title}*:"]
+        for entry in entries:
+            lines.append(
+                f"{entry.place}. {escape_markdown(entry.name)} "
+                f"*{entry.money}$*"
+            )
+        return "\n".join(lines)
+
     def show_table(self, update, context):
         from pokerapp.entity.poker_table_info import PokerTableInfo
         from pokerapp.entity.poker_table_info import PokerTablePlayerInfo
@@ -737,12 +1027,13 @@ class PokerBotModel:
         image_anonymous = AssetHelper.get_image_avatar_anonymous()
         image_anonymous = AssetHelper.resize(image_anonymous, IMAGE_SMALL, IMAGE_SMALL)
 
+        money = wallet_values(self._kv, [p.wallet for p in game.players])
         poker_table_player_infos = []
         for chair_id, player in enumerate(game.players):
             poker_table_player_info = PokerTablePlayerInfo(
                 avatar=image_anonymous,  # TODO: add unique avatar for each player
                 name=player.user_name,
-                money=player.wallet.value(),
+                money=money[chair_id],
                 chair_id=chair_id,  # TODO: assume atm that the players are ordered; we need to persist the order
                 is_current_turn=player == current_player,
             )
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from pokerapp.constants import MAX_PLAYERS, MIN_PLAYERS
+from pokerapp.entity.cards import RANKS, CardCode, Cards, card_codes
+from pokerapp.entity.equity import PlayerEquity
+
+PREFLOP_EQUITY_FILE = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "../../assets/preflop_equity.bin",
+))
+
+# File layout: a little-endian header followed by two uint16 arrays
+# [HAND_CLASSES, players] of win and tie percentages in basis points,
+# one column per table size from min_players to max_players.
+HEADER = struct.Struct("<4sHHH")
+MAGIC = b"PFEQ"
+VERSION = 1
+
+HAND_CLASSES = len(RANKS) * len(RANKS)
+# Single character ranks of the usual hand class notation: AKs, T9o, 22.
+CLASS_RANKS = "23456789TJQKA"
+
+
+def hand_class(codes: List[CardCode]) -> int:
+    """ One of the 169 starting hand classes as an index of a 13x13 grid.
+
+        Pairs are on the diagonal, suited hands have the higher rank as
+        the row and offsuit hands have the lower rank as the row.
+    """
+    high, low = sorted((codes[0] >> 2, codes[1] >> 2), reverse=True)
+    if (codes[0] & 3) == (codes[1] & 3):
+        return high * len(RANKS) + low
+    return low * len(RANKS) + high
+
+
+def hand_class_name(index: int) -> str:
+    row, col = divmod(index, len(RANKS))
+    if row == col:
+        return CLASS_RANKS[row] * 2
+    high, low = max(row, col), min(row, col)
+    return CLASS_RANKS[high] + CLASS_RANKS[low] + ("s" if row > col else "o")
+
+
+def hand_class_codes(index: int) -> List[CardCode]:
+    """ A representative pair of card codes of the hand class. """
+    row, col = divmod(index, len(RANKS))
+    if row > col:
+        return [row << 2, col << 2]
+    return [max(row, col) << 2, (min(row, col) << 2) | 1]
+
+
+class PreflopEquityTable:
+    """
+    Precomputed preflop odds of every starting hand class against random
+    hands, memory-mapped from the asset file on first use.
+    """
+
+    def __init__(self, path: str = PREFLOP_EQUITY_FILE):
+        self._path = path
+        self._lock = threading.Lock()
+        self._win: Optional[np.ndarray] = None
+        self._tie: Optional[np.ndarray] = None
+        self._min_players = MIN_PLAYERS
+        self._max_players = MAX_PLAYERS
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._win is not None:
+                return
+
+            with open(self._path, "rb") as f:
+                magic, version, min_players, max_players = HEADER.unpack(
+                    f.read(HEADER.size),
+                )
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(
+                    "unsupported preflop equity file " + self._path,
+                )
+
+            shape = (HAND_CLASSES, max_players - min_players + 1)
+            data = np.memmap(
+                self._path,
+                dtype="<u2",
+                mode="r",
+                offset=HEADER.size,
+                shape=(2,) + shape,
+            )
+            self._min_players = min_players
+            self._max_players = max_players
+            self._tie = data[1]
+            self._win = data[0]
+
+    def _column(self, players: int) -> int:
+        if self._win is None:
+            self._load()
+        if not self._min_players <= players <= self._max_players:
+            raise ValueError(
+                "no preflop odds for {} players, the table has {} to {}"
+                .format(players, self._min_players, self._max_players),
+            )
+        return players - self._min_players
+
+    def equity(self, cards: Cards, players: int) -> PlayerEquity:
+        """ Odds of the hand at a table of `players` players.
+
+            Raises ValueError for a table size the file has no odds of.
+        """
+        col = self._column(players)
+        row = hand_class(card_codes(cards))
+        return PlayerEquity(
+            win=self._win[row, col] / 100,
+            tie=self._tie[row, col] / 100,
+        )
+
+    def ranking(self, players: int = MIN_PLAYERS) -> List[int]:
+        """ Hand classes from the best to the worst by equity. """
+        col = self._column(players)
+        equity = 2 * self._win[:, col].astype(np.int64) + self._tie[:, col]
+        return np.argsort(-equity, kind="stable").tolist()
+
+
+def write_table(path: str, win: np.ndarray, tie: np.ndarray) -> None:
+    """ Writes [HAND_CLASSES, players] percentages to the asset file. """
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, MIN_PLAYERS, MAX_PLAYERS))
+        for percents in (win, tie):
+            f.write(
+                np.rint(percents * 100).astype("<u2").tobytes(order="C"),
+            )
@@ -1,37 +1,44 @@
 from types import NoneType
-from typing import Union
-
-import redis
+from typing import List, Union
 
 from pokerapp.entity.entities import (
     ChatId,
     MessageId,
     UserId,
 )
+from pokerapp.kv.backend import KvBackend
+from pokerapp.model.kvschema import FIELD_CHAT_ID, user_key, user_messages_key
 
 
 class UserPrivateChatModel:
-    def __init__(self, user_id: UserId, kv: redis.Redis):
+    def __init__(self, user_id: UserId, kv: KvBackend):
         self.user_id = user_id
         self._kv = kv
 
-    @property
-    def _key(self) -> str:
-        return "pokerbot:chats:" + str(self.user_id)
-
     def get_chat_id(self) -> Union[ChatId, NoneType]:
-        return self._kv.get(self._key)
+        return self._kv.hget(user_key(self.user_id), FIELD_CHAT_ID)
 
     def set_chat_id(self, chat_id: ChatId) -> None:
-        return self._kv.set(self._key, chat_id)
+        return self._kv.hset(user_key(self.user_id), FIELD_CHAT_ID, chat_id)
 
     def delete(self) -> None:
-        self._kv.delete(self._key + ":messages")
+        self._kv.delete(user_messages_key(self.user_id))
 
-        return self._kv.delete(self._key)
+        return self._kv.hdel(user_key(self.user_id), FIELD_CHAT_ID)
 
     def pop_message(self) -> Union[MessageId, NoneType]:
-        return self._kv.rpop(self._key+":messages")
+        return self._kv.rpop(user_messages_key(self.user_id))
 
     def push_message(self, message_id: MessageId) -> None:
-        return self._kv.rpush(self._key+":messages", message_id)
+        return self._kv.rpush(user_messages_key(self.user_id), message_id)
+
+    def replace_messages(self, message_id: MessageId) -> List[MessageId]:
+        """ Keeps only message_id, returns the messages it replaced.
+            One round trip instead of a pop per message.
+        """
+        key = user_messages_key(self.user_id)
+        pipe = self._kv.pipeline(transaction=True)
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        pipe.rpush(key, message_id)
+        return pipe.execute()[0]
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+
+import math
+import re
+from concurrent.futures import Executor
+from itertools import combinations
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from pokerapp.entity.cards import (
+    CODE_MASKS,
+    FULL_DECK_MASK,
+    SUITS,
+    CardCode,
+    Cards,
+    card_codes,
+    codes_mask,
+    mask_codes,
+)
+from pokerapp.entity.equity import EquityResult, PlayerEquity
+from pokerapp.model.batchevaluator import score_boards
+from pokerapp.model.handevaluator import FLUSH_TABLE, RANK_TABLE
+from pokerapp.model.preflopequity import (
+    CLASS_RANKS,
+    PreflopEquityTable,
+    hand_class,
+)
+
+# Every two-card combo, ranges are weights over this fixed order.
+COMBOS = np.array(list(combinations(range(52), 2)), dtype=np.int64)
+COMBOS_COUNT = len(COMBOS)
+_COMBO_INDEX = {tuple(c): i for i, c in enumerate(COMBOS.tolist())}
+_COMBO_CLASSES = np.array([hand_class(c) for c in COMBOS.tolist()])
+
+# Runouts are enumerated up to a flop without dead cards, sampled beyond.
+RANGE_EXACT_LIMIT = math.comb(49, 2)
+DEFAULT_RANGE_TRIALS = 2000
+# A chunk times 52 cards must fit the 16 bit card group keys.
+RUNOUT_CHUNK = 128
+
+# Scores are replaced by their rank among all hand scores, which fits in
+# the 16 bit sort keys.
+_SCORES = np.unique(np.concatenate([
+    [0], list(RANK_TABLE.values()), FLUSH_TABLE,
+]))
+
+_CODE_MASKS = np.array(CODE_MASKS, dtype=np.int64)
+
+# Suit letters in the order of SUITS: h d c s.
+SUIT_LETTERS = "hdcs"
+
+_TOP = re.compile(r"top\s*(\d+(?:\.\d+)?)\s*%$")
+_CLASS = r"([2-9TJQKA])([2-9TJQKA])([so]?)"
+_CLASS_PLUS = re.compile(_CLASS + r"(\+?)$")
+_CLASS_SPAN = re.compile(_CLASS + "-" + _CLASS + "$")
+_SUIT = "([hdcs" + "".join(SUITS) + "])"
+_COMBO = re.compile("([2-9TJQKA])" + _SUIT + "([2-9TJQKA])" + _SUIT + "$")
+
+
+class HandRange:
+    """
+    Weights of the two-card combos of a range, zero outside of it.
+    """
+
+    def __init__(self, weights: Optional[np.ndarray] = None):
+        if weights is None:
+            weights = np.zeros(COMBOS_COUNT)
+        self.weights = weights
+
+    @classmethod
+    def from_cards(cls, cards: Cards) -> "HandRange":
+        hand_range = cls()
+        hand_range.add_combo(card_codes(cards))
+        return hand_range
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.weights))
+
+    def add_class(self, index: int, weight: float = 1.0) -> None:
+        self.weights[_COMBO_CLASSES == index] = weight
+
+    def add_combo(self, codes: List[CardCode], weight: float = 1.0) -> None:
+        self.weights[_COMBO_INDEX[tuple(sorted(codes))]] = weight
+
+
+def _rank(char: str) -> int:
+    return CLASS_RANKS.index(char)
+
+
+def _class_indexes(high: int, low: int, suited: str) -> List[int]:
+    """ Hand classes of the notation, AK without a suffix is both. """
+    size = len(CLASS_RANKS)
+    high, low = max(high, low), min(high, low)
+    if high == low:
+        return [high * size + low]
+    if suited == "s":
+        return [high * size + low]
+    if suited == "o":
+        return [low * size + high]
+    return [high * size + low, low * size + high]
+
+
+def _expand_plus(high: int, low: int, suited: str, plus: bool) -> List[int]:
+    if not plus:
+        return _class_indexes(high, low, suited)
+    if high == low:
+        tops = range(low, len(CLASS_RANKS))
+        return [i for r in tops for i in _class_indexes(r, r, suited)]
+    return [
+        i for r in range(low, high) for i in _class_indexes(high, r, suited)
+    ]
+
+
+def _expand_span(first: tuple, last: tuple) -> List[int]:
+    (h1, l1, s1), (h2, l2, s2) = first, last
+    if s1 != s2:
+        raise ValueError("mixed suitedness in range span")
+    if h1 == l1 and h2 == l2:
+        pairs = range(min(l1, l2), max(l1, l2) + 1)
+        return [i for r in pairs for i in _class_indexes(r, r, s1)]
+    if h1 == h2:
+        lows = range(min(l1, l2), max(l1, l2) + 1)
+        return [i for r in lows for i in _class_indexes(h1, r, s1)]
+    if h1 - l1 == h2 - l2:
+        gap = h1 - l1
+        highs = range(min(h1, h2), max(h1, h2) + 1)
+        return [i for h in highs for i in _class_indexes(h, h - gap, s1)]
+    raise ValueError("range span must keep the high rank or the gap")
+
+
+def parse_range(
+    text: str,
+    table: Optional[PreflopEquityTable] = None,
+) -> HandRange:
+    """ A range from comma separated hands with optional weights.
+
+        Tokens are hand classes (AKs, T9o, AK, 22), class ranges
+        (QQ+, ATs+, 76s-54s, A5s-A2s), exact combos (AhKh, A♥K♥) and
+        "top 20%" of the preflop ranking. A ":0.5" suffix sets the
+        weight of a token, later tokens override earlier ones.
+    """
+    hand_range = HandRange()
+    for token in text.split(","):
+        token = token.strip()
+        if not token:
+            continue
+
+        weight = 1.0
+        if ":" in token:
+            token, weight_text = token.rsplit(":", 1)
+            try:
+                weight = float(weight_text)
+            except ValueError:
+                raise ValueError("invalid range weight: " + weight_text)
+            token = token.strip()
+
+        top = _TOP.match(token)
+        plus = _CLASS_PLUS.match(token)
+        span = _CLASS_SPAN.match(token)
+        combo = _COMBO.match(token)
+        if top:
+            if table is None:
+                table = PreflopEquityTable()
+            classes = _top_classes(float(top.group(1)), table)
+        elif plus:
+            h, l_, s, p = plus.groups()
+            classes = _expand_plus(_rank(h), _rank(l_), s, p == "+")
+        elif span:
+            h1, l1, s1, h2, l2, s2 = span.groups()
+            classes = _expand_span(
+                (_rank(h1), _rank(l1), s1),
+                (_rank(h2), _rank(l2), s2),
+            )
+        elif combo:
+            r1, s1, r2, s2 = combo.groups()
+            codes = [
+                _rank(r) << 2 | _suit(s) for r, s in ((r1, s1), (r2, s2))
+            ]
+            if codes[0] == codes[1]:
+                raise ValueError("invalid range token: " + token)
+            hand_range.add_combo(codes, weight)
+            continue
+        else:
+            raise ValueError("invalid range token: " + token)
+
+        for index in classes:
+            hand_range.add_class(index, weight)
+    return hand_range
+
+
+def _suit(char: str) -> int:
+    if char in SUITS:
+        return SUITS.index(char)
+    return SUIT_LETTERS.index(char)
+
+
+def _top_classes(percent: float, table: PreflopEquityTable) -> List[int]:
+    target = COMBOS_COUNT * percent / 100
+    counts = np.bincount(_COMBO_CLASSES, minlength=len(CLASS_RANKS) ** 2)
+    classes = []
+    total = 0
+    for index in table.ranking():
+        if total >= target:
+            break
+        classes.append(index)
+        total += counts[index]
+    return classes
+
+
+def _run_bounds(change: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Start and end positions of the run at every place, given where
+        the runs change.
+    """
+    bounds = np.flatnonzero(change)
+    runs = np.cumsum(change[:-1]) - 1
+    return bounds[runs], bounds[runs + 1]
+
+
+def _weights_around(
+    groups: np.ndarray,
+    ranks: np.ndarray,
+    weights: np.ndarray,
+    hero: np.ndarray,
+) -> Tuple[float, float, float]:
+    """ Hero weighted sums of the weight of the smaller and of the equal
+        ranks of every group and of the whole group, over the places of
+        groups and ranks sorted together.
+    """
+    group_change = np.ones(len(groups) + 1, dtype=bool)
+    group_change[1:-1] = groups[1:] != groups[:-1]
+    run_change = group_change.copy()
+    run_change[1:-1] |= ranks[1:] != ranks[:-1]
+
+    prefix = np.concatenate([[0.0], np.cumsum(weights)])
+    run_start, run_end = _run_bounds(run_change)
+    group_start, group_end = _run_bounds(group_change)
+    return (
+        float(hero @ (prefix[run_start] - prefix[group_start])),
+        float(hero @ (prefix[run_end] - prefix[run_start])),
+        float(hero @ (prefix[group_end] - prefix[group_start])),
+    )
+
+
+def _deck_masks(codes: np.ndarray) -> np.ndarray:
+    """ codes_mask() of every row of the codes. """
+    return np.bitwise_or.reduce(_CODE_MASKS[codes], axis=-1)
+
+
+def count_runouts(
+    universe: np.ndarray,
+    hero: np.ndarray,
+    villain: np.ndarray,
+    boards: np.ndarray,
+) -> Tuple[float, float, float]:
+    """ Weighted hero wins, ties and matchups over the boards.
+
+        Every combo of the universe is scored once per board. The villain
+        weight beating, tying or losing to a hero combo is read from
+        sorted prefix sums, and the combos sharing a card with the hero
+        combo are taken out again per card. Runs in the worker
+        processes, so it takes and returns plain values.
+    """
+    rows, size = len(boards), len(universe)
+    valid = (_deck_masks(boards)[:, None] & _deck_masks(universe)) == 0
+
+    scores = np.where(valid, score_boards(boards, universe), 0)
+    ranks = np.searchsorted(_SCORES, scores).astype(np.int16)
+
+    # Combos of every runout by rank, numpy radix sorts 16 bit keys.
+    order = np.argsort(ranks, axis=1, kind="stable")
+    ranks = np.take_along_axis(ranks, order, axis=1).ravel()
+    hero_w = np.where(valid, hero[None, :], 0.0)
+    villain_w = np.where(valid, villain[None, :], 0.0)
+    hero_w = np.take_along_axis(hero_w, order, axis=1).ravel()
+    villain_w = np.take_along_axis(villain_w, order, axis=1).ravel()
+
+    lower, equal, total = _weights_around(
+        np.repeat(np.arange(rows), size), ranks, villain_w, hero_w,
+    )
+
+    # Every combo under both of its cards, a stable sort by (runout,
+    # card) keeps the ranks in order within the card groups.
+    row_ids = np.arange(rows)[:, None, None]
+    card_groups = (row_ids * 52 + universe[order]).astype(np.int16).ravel()
+    by_card = np.argsort(card_groups, kind="stable")
+    card_lower, card_equal, card_total = _weights_around(
+        card_groups[by_card],
+        np.repeat(ranks, 2)[by_card],
+        np.repeat(villain_w, 2)[by_card],
+        np.repeat(hero_w, 2)[by_card],
+    )
+
+    # The same combo was taken out under both of its cards.
+    same = float(hero_w @ villain_w)
+    return (
+        lower - card_lower,
+        equal - card_equal + same,
+        total - card_total + same,
+    )
+
+
+def range_equity(
+    hero: HandRange,
+    villain: HandRange,
+    cards_table: Cards = (),
+    dead: Cards = (),
+    trials: int = DEFAULT_RANGE_TRIALS,
+    exact_limit: int = RANGE_EXACT_LIMIT,
+    executor: Optional[Executor] = None,
+    seed: Optional[int] = None,
+) -> Optional[EquityResult]:
+    """ Equity of the hero range against the villain range.
+
+        Matchups are weighted by the product of the combo weights, combos
+        sharing a card with each other or the board never meet. Runouts
+        are enumerated if there are at most exact_limit of them and
+        sampled otherwise. Chunks of runouts go to the executor if one
+        is given. Returns None if the ranges never meet.
+    """
+    board = card_codes(cards_table)
+    known = codes_mask(board + card_codes(dead))
+    deck = mask_codes(FULL_DECK_MASK & ~known)
+
+    missing = 5 - len(board)
+    exact = math.comb(len(deck), missing) <= exact_limit
+    if exact:
+        runouts = list(combinations(deck, missing))
+        runouts = np.array(runouts, dtype=np.int64).reshape(
+            len(runouts), missing,
+        )
+    else:
+        rnd = np.random.default_rng(seed)
+        order = np.argsort(rnd.random((trials, len(deck))), axis=1)
+        runouts = np.array(deck, dtype=np.int64)[order[:, :missing]]
+    boards = np.hstack([
+        np.broadcast_to(np.array(board, dtype=np.int64),
+                        (len(runouts), len(board))),
+        runouts,
+    ])
+
+    columns = ((hero.weights > 0) | (villain.weights > 0)) & \
+        (_deck_masks(COMBOS) & known == 0)
+    args = [
+        (COMBOS[columns], hero.weights[columns], villain.weights[columns],
+         boards[start:start + RUNOUT_CHUNK])
+        for start in range(0, len(boards), RUNOUT_CHUNK)
+    ]
+    if executor is None:
+        counts = [count_runouts(*a) for a in args]
+    else:
+        counts = list(executor.map(count_runouts, *zip(*args)))
+
+    wins = sum(c[0] for c in counts)
+    ties = sum(c[1] for c in counts)
+    matchups = sum(c[2] for c in counts)
+    if matchups <= 0:
+        return None
+
+    return EquityResult(
+        players=[
+            PlayerEquity(
+                win=100.0 * wins / matchups,
+                tie=100.0 * ties / matchups,
+            ),
+            PlayerEquity(
+                win=100.0 * (matchups - wins - ties) / matchups,
+                tie=100.0 * ties / matchups,
+            ),
+        ],
+        trials=len(boards),
+        exact=exact,
+    )
@@ -1,11 +1,12 @@
 from typing import List, Tuple, Dict
 
 from pokerapp.entity.cards import Cards
-from pokerapp.entity.entities import Money, Score
+from pokerapp.entity.entities import Money, Score, UserId
 from pokerapp.entity.game import Game
 from pokerapp.entity.player import Player
 from pokerapp.entity.playeraction import PlayerAction
 from pokerapp.entity.playerbet import PlayerBet
+from pokerapp.model.sidepots import build_side_pots, pay_side_pots
 
 
 class RoundRateModel:
@@ -30,7 +31,9 @@ class RoundRateModel:
         )
         player.round_rate += amount
 
-        game.players_bets = game.players_bets + [PlayerBet(player.user_id, amount, game.state)]
+        game.players_bets.append(
+            PlayerBet(player.user_id, amount, game.state),
+        )
 
         game.max_round_rate = player.round_rate
         game.trading_end_user_id = player.user_id
@@ -43,7 +46,9 @@ class RoundRateModel:
             amount=amount,
         )
 
-        game.players_bets = game.players_bets + [PlayerBet(player.user_id, amount, game.state)]
+        game.players_bets.append(
+            PlayerBet(player.user_id, amount, game.state),
+        )
 
         player.round_rate += amount
 
@@ -56,64 +61,68 @@ class RoundRateModel:
             game.max_round_rate = player.round_rate
             game.trading_end_user_id = player.user_id
 
-        game.players_bets = game.players_bets + [PlayerBet(player.user_id, amount, game.state)]
+        game.players_bets.append(
+            PlayerBet(player.user_id, amount, game.state),
+        )
 
         return amount
 
-    def _sum_authorized_money(
-            self,
-            game: Game,
-            players: List[Tuple[Player, Cards]],
-    ) -> int:
-        sum_authorized_money = 0
-        for player in players:
-            sum_authorized_money += player[0].wallet.authorized_money(
-                game_id=game.id,
-            )
-        return sum_authorized_money
-
     def finish_rate(
             self,
             game: Game,
             player_scores: Dict[Score, List[Tuple[Player, Cards]]],
-    ) -> List[Tuple[Player, Cards, Money]]:
-        sorted_player_scores_items = sorted(
-            player_scores.items(),
-            reverse=True,
-            key=lambda x: x[0],
+    ) -> Tuple[
+        List[Tuple[Player, Cards, Money]],
+        List[Tuple[Player, Money]],
+    ]:
+        """ Pays the main pot and the side pots to the best hands.
+
+            The pots are layered from the money every player authorized
+            in the game, folded players pay in but can not win. Returns
+            the winners with their winnings and, apart, the players who
+            get back the part of their bet nobody called.
+        """
+        hands: Dict[UserId, Tuple[Score, Cards]] = {}
+        for score, players in player_scores.items():
+            for player, best_hand in players:
+                hands[player.user_id] = (score, best_hand)
+
+        contributions = [
+            p.wallet.authorized_money(game_id=game.id) for p in game.players
+        ]
+        scores = [
+            hands[p.user_id][0] if p.user_id in hands else None
+            for p in game.players
+        ]
+        payouts = pay_side_pots(
+            build_side_pots(contributions, scores),
+            len(game.players),
         )
-        player_scores_values = list(
-            map(lambda x: x[1], sorted_player_scores_items))
-
-        res = []
-        for win_players in player_scores_values:
-            players_authorized = self._sum_authorized_money(
-                game=game,
-                players=win_players,
-            )
-            if players_authorized <= 0:
-                continue
-
-            game_pot = game.pot
-            for win_player, best_hand in win_players:
-                if game.pot <= 0:
-                    break
-
-                authorized = win_player.wallet.authorized_money(
-                    game_id=game.id,
-                )
 
-                win_money_real = game_pot * (authorized / players_authorized)
-                win_money_real = round(win_money_real)
-
-                win_money_can_get = authorized * len(game.players)
-                win_money = min(win_money_real, win_money_can_get)
-
-                win_player.wallet.inc(win_money)
-                game.pot -= win_money
-                res.append((win_player, best_hand, win_money))
+        # Only the biggest bet can be uncalled, it is not won.
+        refunds = [0] * len(game.players)
+        top = max(range(len(game.players)), key=lambda s: contributions[s])
+        if scores[top] is not None:
+            refunds[top] = contributions[top] - max(
+                (m for s, m in enumerate(contributions) if s != top),
+                default=0,
+            )
 
-        return res
+        seats = [seat for seat, money in enumerate(payouts) if money > 0]
+        seats.sort(key=lambda seat: scores[seat], reverse=True)
+
+        winners, returned = [], []
+        for seat in seats:
+            player = game.players[seat]
+            player.wallet.inc(payouts[seat])
+            game.pot -= payouts[seat]
+            if refunds[seat] > 0:
+                returned.append((player, refunds[seat]))
+            win_money = payouts[seat] - refunds[seat]
+            if win_money > 0:
+                winners.append((player, hands[player.user_id][1], win_money))
+
+        return winners, returned
 
     def to_pot(self, game) -> None:
         for p in game.players:
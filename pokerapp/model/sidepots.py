@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from pokerapp.entity.entities import Money, Score
+
+
+@dataclass
+class SidePot:
+    """ A layer of the pot, winners are indexes into the players. """
+
+    amount: Money
+    winners: List[int]
+
+
+def build_side_pots(
+    contributions: List[Money],
+    scores: List[Optional[Score]],
+) -> List[SidePot]:
+    """ The main pot and the side pots, from the smallest layer up.
+
+        Every distinct contribution level makes a layer paid by all
+        players who put in at least that much. A layer goes to the best
+        score among those players, a score of None is a folded hand. A
+        layer nobody can win is added to the layer below it.
+    """
+    seats = sorted(
+        (seat for seat, money in enumerate(contributions) if money > 0),
+        key=lambda seat: contributions[seat],
+    )
+
+    # The amount of every layer and the seats whose money ends there.
+    layers = []
+    level = 0
+    for i, seat in enumerate(seats):
+        money = contributions[seat]
+        if money > level:
+            layers.append(((money - level) * (len(seats) - i), []))
+            level = money
+        layers[-1][1].append(seat)
+
+    # From the top layer down every layer adds its players, so the best
+    # scores of all layers take one pass.
+    pots: List[SidePot] = []
+    best: Optional[Score] = None
+    winners: List[int] = []
+    for amount, layer_seats in reversed(layers):
+        for seat in layer_seats:
+            score = scores[seat]
+            if score is None:
+                continue
+            if best is None or score > best:
+                best = score
+                winners = [seat]
+            elif score == best:
+                winners = winners + [seat]
+        pots.append(SidePot(amount=amount, winners=winners))
+    pots.reverse()
+
+    for i in range(len(pots) - 1, 0, -1):
+        if not pots[i].winners:
+            pots[i - 1].amount += pots[i].amount
+            pots[i].amount = 0
+
+    return [pot for pot in pots if pot.amount > 0 and pot.winners]
+
+
+def pay_side_pots(pots: List[SidePot], players_count: int) -> List[Money]:
+    """ Money won by every seat, odd chips go to the first seats. """
+    payouts = [0] * players_count
+    for pot in pots:
+        share, odd = divmod(pot.amount, len(pot.winners))
+        for i, seat in enumerate(sorted(pot.winners)):
+            payouts[seat] += share + (1 if i < odd else 0)
+    return payouts
@@ -1,93 +1,412 @@
 import datetime
-
-import redis
+import threading
+from collections import OrderedDict
+from typing import Dict, List
 
 from pokerapp.entity.entities import UserId, Money
 from pokerapp.entity.userexception import UserException
 from pokerapp.entity.wallet import Wallet
+from pokerapp.kv.backend import KvBackend
+from pokerapp.kv.batch import PendingRead, ReadBatch
+from pokerapp.kv.script import LuaScript
+from pokerapp.model.journal import JOURNAL_LUA, KEY_JOURNAL, journal_python
+from pokerapp.model.leaderboard import RANK_LUA, rank_keys, rank_python
+from pokerapp.model.kvschema import (
+    FIELD_DAILY,
+    FIELD_HAND_PREFIX,
+    FIELD_MONEY,
+    GAME_KEY_TTL_SEC,
+    game_key,
+    user_key,
+)
 
 DEFAULT_MONEY = 1000
+WALLET_REGISTRY_SIZE = 10000
+
+# Scripts that change money end their KEYS with the keys of rank() and
+# the journal, see leaderboard.RANK_LUA and journal.JOURNAL_LUA.
+MONEY_LUA = RANK_LUA + JOURNAL_LUA
+
+# KEYS: user hash, board, chats, journal. ARGV: money, user id.
+CREATE_SCRIPT = MONEY_LUA + """
+if redis.call('HSETNX', KEYS[1], 'money', ARGV[1]) == 0 then
+    return 0
+end
+rank(KEYS[2], KEYS[3], ARGV[2], ARGV[1])
+journal(KEYS[4], ARGV[2], 'create', ARGV[1], ARGV[1], '')
+return 1
+"""
+
+# KEYS: user hash, board, chats, journal. ARGV: amount, user id.
+# Returns the new money or nil if the wallet would go below zero.
+INC_SCRIPT = MONEY_LUA + """
+local amount = tonumber(ARGV[1])
+local wallet = tonumber(redis.call('HGET', KEYS[1], 'money') or '0')
+if wallet + amount < 0 then
+    return nil
+end
+rank(KEYS[2], KEYS[3], ARGV[2], amount)
+local money = redis.call('HINCRBY', KEYS[1], 'money', amount)
+journal(KEYS[4], ARGV[2], 'inc', amount, money, '')
+return money
+"""
+
+# KEYS: user hash, board, chats, journal. ARGV: amount, user id, date.
+# Returns the new money or nil if the bonus of the date was paid.
+DAILY_SCRIPT = MONEY_LUA + """
+if redis.call('HGET', KEYS[1], 'daily') == ARGV[3] then
+    return nil
+end
+redis.call('HSET', KEYS[1], 'daily', ARGV[3])
+rank(KEYS[2], KEYS[3], ARGV[2], ARGV[1])
+local money = redis.call('HINCRBY', KEYS[1], 'money', ARGV[1])
+journal(KEYS[4], ARGV[2], 'daily', ARGV[1], money, '')
+return money
+"""
+
+# KEYS[1] is the game hash. ARGV: user id, amount, ttl.
+INC_AUTHORIZED_SCRIPT = """
+local money = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return money
+"""
+
+# KEYS: user hash, game hash, board, chats, journal.
+# ARGV: amount, user id, ttl, game id.
+AUTHORIZE_SCRIPT = MONEY_LUA + """
+local amount = tonumber(ARGV[1])
+local wallet = tonumber(redis.call('HGET', KEYS[1], 'money') or '0')
+if wallet - amount < 0 then
+    return nil
+end
+redis.call('HINCRBY', KEYS[2], ARGV[2], amount)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+rank(KEYS[3], KEYS[4], ARGV[2], -amount)
+local money = redis.call('HINCRBY', KEYS[1], 'money', -amount)
+journal(KEYS[5], ARGV[2], 'authorize', amount, money, ARGV[4])
+return money
+"""
+
+# KEYS: user hash, game hash, board, chats, journal.
+# ARGV: user id, ttl, game id.
+AUTHORIZE_ALL_SCRIPT = MONEY_LUA + """
+local money = tonumber(redis.call('HGET', KEYS[1], 'money') or '0')
+redis.call('HINCRBY', KEYS[2], ARGV[1], money)
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('HSET', KEYS[1], 'money', 0)
+rank(KEYS[3], KEYS[4], ARGV[1], -money)
+journal(KEYS[5], ARGV[1], 'authorize', money, 0, ARGV[3])
+return money
+"""
+
+# KEYS: user hash, game hash, board, chats, journal. ARGV: user id, game id.
+APPROVE_SCRIPT = MONEY_LUA + """
+local amount = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+if amount == 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+local money = redis.call('HGET', KEYS[1], 'money') or '0'
+journal(KEYS[5], ARGV[1], 'approve', amount, money, ARGV[2])
+return amount
+"""
+
+
+def _money(kv: KvBackend, key: str) -> int:
+    return int(kv.hget(key, FIELD_MONEY) or 0)
+
+
+def _owned(fields: Dict[bytes, bytes]) -> Money:
+    """ Money of a user hash with the stacks reserved by its hands. """
+    money = FIELD_MONEY.encode("utf-8")
+    hand = FIELD_HAND_PREFIX.encode("utf-8")
+    return sum(
+        int(value) for field, value in (fields or {}).items()
+        if field == money or field.startswith(hand)
+    )
+
+
+def _create_python(kv: KvBackend, keys: List[str], args: List):
+    money, user_id = int(args[0]), args[1]
+    if kv.hsetnx(keys[0], FIELD_MONEY, money) == 0:
+        return 0
+    rank_python(kv, keys[1], keys[2], user_id, money)
+    journal_python(kv, keys[3], user_id, "create", money, money)
+    return 1
+
+
+def _inc_python(kv: KvBackend, keys: List[str], args: List):
+    amount, user_id = int(args[0]), args[1]
+    if _money(kv, keys[0]) + amount < 0:
+        return None
+    rank_python(kv, keys[1], keys[2], user_id, amount)
+    money = kv.hincrby(keys[0], FIELD_MONEY, amount)
+    journal_python(kv, keys[3], user_id, "inc", amount, money)
+    return money
+
+
+def _daily_python(kv: KvBackend, keys: List[str], args: List):
+    amount, user_id = int(args[0]), args[1]
+    if kv.hget(keys[0], FIELD_DAILY) == str(args[2]).encode("utf-8"):
+        return None
+    kv.hset(keys[0], FIELD_DAILY, args[2])
+    rank_python(kv, keys[1], keys[2], user_id, amount)
+    money = kv.hincrby(keys[0], FIELD_MONEY, amount)
+    journal_python(kv, keys[3], user_id, "daily", amount, money)
+    return money
+
+
+def _inc_authorized_python(kv: KvBackend, keys: List[str], args: List):
+    money = kv.hincrby(keys[0], args[0], int(args[1]))
+    kv.expire(keys[0], int(args[2]))
+    return money
+
+
+def _authorize_python(kv: KvBackend, keys: List[str], args: List):
+    amount, user_id, ttl, game_id = int(args[0]), args[1], args[2], args[3]
+    if _money(kv, keys[0]) - amount < 0:
+        return None
+    _inc_authorized_python(kv, keys[1:], [user_id, amount, ttl])
+    rank_python(kv, keys[2], keys[3], user_id, -amount)
+    money = kv.hincrby(keys[0], FIELD_MONEY, -amount)
+    journal_python(kv, keys[4], user_id, "authorize", amount, money, game_id)
+    return money
+
+
+def _authorize_all_python(kv: KvBackend, keys: List[str], args: List):
+    user_id, ttl, game_id = args
+    money = _money(kv, keys[0])
+    _inc_authorized_python(kv, keys[1:], [user_id, money, ttl])
+    kv.hset(keys[0], FIELD_MONEY, 0)
+    rank_python(kv, keys[2], keys[3], user_id, -money)
+    journal_python(kv, keys[4], user_id, "authorize", money, 0, game_id)
+    return money
+
+
+def _approve_python(kv: KvBackend, keys: List[str], args: List):
+    user_id, game_id = args
+    amount = int(kv.hget(keys[1], user_id) or 0)
+    if amount == 0:
+        return 0
+    kv.hdel(keys[1], user_id)
+    money = _money(kv, keys[0])
+    journal_python(kv, keys[4], user_id, "approve", amount, money, game_id)
+    return amount
+
+
+_create = LuaScript(CREATE_SCRIPT, _create_python)
+_inc = LuaScript(INC_SCRIPT, _inc_python)
+_daily = LuaScript(DAILY_SCRIPT, _daily_python)
+_inc_authorized = LuaScript(INC_AUTHORIZED_SCRIPT, _inc_authorized_python)
+_authorize = LuaScript(AUTHORIZE_SCRIPT, _authorize_python)
+_authorize_all = LuaScript(AUTHORIZE_ALL_SCRIPT, _authorize_all_python)
+_approve = LuaScript(APPROVE_SCRIPT, _approve_python)
 
 
 class WalletManagerModel(Wallet):
-    def __init__(self, user_id: UserId, kv: redis.Redis):
+    def __init__(
+        self,
+        user_id: UserId,
+        kv: KvBackend,
+        known_to_exist: bool = False,
+    ):
         self.user_id = user_id
         self._kv = kv
+        # Stand-ins of a backend without scripts get the plain commands
+        # and keep no leaderboard or journal.
+        self.scripted = hasattr(kv, "evalsha")
 
-        key = self._prefix(self.user_id)
-        if self._kv.get(key) is None:
-            self._kv.set(key, DEFAULT_MONEY)
+        if known_to_exist:
+            return
+        if self.scripted:
+            _create(
+                self._kv,
+                self._keys(),
+                [DEFAULT_MONEY, self.user_id],
+            )
+        else:
+            self._kv.hsetnx(self._key, FIELD_MONEY, DEFAULT_MONEY)
 
     @staticmethod
     def _prefix(id: int, suffix: str = ""):
-        return "pokerbot:" + str(id) + suffix
+        return user_key(id) + suffix
+
+    @property
+    def _key(self) -> str:
+        return self._prefix(self.user_id)
+
+    def _keys(self, *keys: str) -> List[str]:
+        """ The user hash, keys, the leaderboard and the journal. """
+        return [self._key, *keys] + rank_keys(self.user_id) + [KEY_JOURNAL]
 
     def _current_date(self) -> str:
         return datetime.datetime.utcnow().strftime("%d/%m/%y")
 
-    def _key_daily(self) -> str:
-        return self._prefix(self.user_id, ":daily")
-
     def has_daily_bonus(self) -> bool:
         current_date = self._current_date()
-        last_date = self._kv.get(self._key_daily())
+        last_date = self._kv.hget(self._key, FIELD_DAILY)
 
         return last_date is not None and \
             last_date.decode("utf-8") == current_date
 
+    def _already_received(self) -> UserException:
+        return UserException(
+            "You have already received the bonus today\n"
+            f"Your money: {self.value()}$"
+        )
+
     def add_daily(self, amount: Money) -> Money:
-        if self.has_daily_bonus():
-            raise UserException(
-                "You have already received the bonus today\n"
-                f"Your money: {self.value()}$"
+        if self.scripted:
+            # The script checks the date, two chats asking at once are
+            # not paid twice.
+            money = _daily(
+                self._kv,
+                self._keys(),
+                [amount, self.user_id, self._current_date()],
             )
+            if money is None:
+                raise self._already_received()
+            return money
+
+        if self.has_daily_bonus():
+            raise self._already_received()
 
-        key = self._prefix(self.user_id)
-        self._kv.set(self._key_daily(), self._current_date())
+        self._kv.hset(self._key, FIELD_DAILY, self._current_date())
 
-        return self._kv.incrby(key, amount)
+        return self._kv.hincrby(self._key, FIELD_MONEY, amount)
 
     def inc(self, amount: Money = 0) -> None:
         """ Increase count of money in the wallet.
             Decrease authorized money.
         """
-        wallet = int(self._kv.get(self._prefix(self.user_id)))
+        if self.scripted:
+            if _inc(self._kv, self._keys(), [amount, self.user_id]) is None:
+                raise UserException("not enough money")
+            return
+
+        wallet = int(self._kv.hget(self._key, FIELD_MONEY))
 
         if wallet + amount < 0:
             raise UserException("not enough money")
 
-        self._kv.incrby(self._prefix(self.user_id), amount)
+        self._kv.hincrby(self._key, FIELD_MONEY, amount)
 
     def inc_authorized_money(
             self,
             game_id: str,
             amount: Money
     ) -> None:
-        key_authorized_money = self._prefix(self.user_id, ":" + game_id)
-        self._kv.incrby(key_authorized_money, amount)
+        key = game_key(game_id)
+        if self.scripted:
+            _inc_authorized(
+                self._kv,
+                [key],
+                [self.user_id, amount, GAME_KEY_TTL_SEC],
+            )
+            return
+
+        self._kv.hincrby(key, self.user_id, amount)
+        self._kv.expire(key, GAME_KEY_TTL_SEC)
 
     def authorized_money(self, game_id: str) -> Money:
-        key_authorized_money = self._prefix(self.user_id, ":" + game_id)
-        return int(self._kv.get(key_authorized_money) or 0)
+        return int(self._kv.hget(game_key(game_id), self.user_id) or 0)
 
     def authorize(self, game_id: str, amount: Money) -> None:
         """ Decrease count of money. """
-        self.inc_authorized_money(game_id, amount)
+        if self.scripted:
+            keys = self._keys(game_key(game_id))
+            args = [amount, self.user_id, GAME_KEY_TTL_SEC, game_id]
+            if _authorize(self._kv, keys, args) is None:
+                raise UserException("not enough money")
+            return
 
-        return self.inc(-amount)
+        self.inc(-amount)
+        self.inc_authorized_money(game_id, amount)
 
     def authorize_all(self, game_id: str) -> Money:
         """ Decrease all money of player. """
-        money = int(self._kv.get(self._prefix(self.user_id)))
+        if self.scripted:
+            keys = self._keys(game_key(game_id))
+            args = [self.user_id, GAME_KEY_TTL_SEC, game_id]
+            return int(_authorize_all(self._kv, keys, args))
+
+        money = self.value()
         self.inc_authorized_money(game_id, money)
 
-        self._kv.set(self._prefix(self.user_id), 0)
+        self._kv.hset(self._key, FIELD_MONEY, 0)
         return money
 
     def value(self) -> Money:
-        """ Get count of money in the wallet. """
-        return int(self._kv.get(self._prefix(self.user_id)))
+        """ Get count of money of the user, with the stacks reserved by
+            running hands.
+        """
+        if self.scripted:
+            return _owned(self._kv.hgetall(self._key))
+        return self.available()
+
+    def available(self) -> Money:
+        """ Money in the wallet that no hand has reserved. """
+        return int(self._kv.hget(self._key, FIELD_MONEY) or 0)
+
+    def queue_value(self, batch: ReadBatch) -> PendingRead:
+        """ value() read together with the other reads of the batch. """
+        if self.scripted:
+            return batch.hgetall(self._key)
+        return batch.hget(self._key, FIELD_MONEY)
 
     def approve(self, game_id: str) -> None:
-        key_authorized_money = self._prefix(self.user_id, ":" + game_id)
-        self._kv.delete(key_authorized_money)
+        if self.scripted:
+            _approve(
+                self._kv,
+                self._keys(game_key(game_id)),
+                [self.user_id, game_id],
+            )
+            return
+
+        self._kv.hdel(game_key(game_id), self.user_id)
+
+
+def wallet_values(kv: KvBackend, wallets: List[Wallet]) -> List[Money]:
+    """ Money of the wallets, the ones kept in kv read in one pipeline. """
+    batch = ReadBatch(kv)
+    reads = [
+        w.queue_value(batch) if isinstance(w, WalletManagerModel) else None
+        for w in wallets
+    ]
+    return [
+        w.value() if read is None else _read_value(w, read.result())
+        for w, read in zip(wallets, reads)
+    ]
+
+
+def _read_value(wallet: WalletManagerModel, result) -> Money:
+    if wallet.scripted:
+        return _owned(result)
+    return int(result or 0)
+
+
+class WalletRegistry:
+    """
+    Wallets by user id. The wallet of a user is created with a single
+    HSETNX the first time this process sees the user and reused after.
+    """
+
+    def __init__(self, kv: KvBackend, max_size: int = WALLET_REGISTRY_SIZE):
+        self._kv = kv
+        self._max_size = max_size
+        self._wallets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: UserId) -> WalletManagerModel:
+        with self._lock:
+            wallet = self._wallets.get(user_id)
+            if wallet is not None:
+                self._wallets.move_to_end(user_id)
+                return wallet
+
+        wallet = WalletManagerModel(user_id, self._kv)
+        with self._lock:
+            self._wallets[user_id] = wallet
+            while len(self._wallets) > self._max_size:
+                self._wallets.popitem(last=False)
+        return wallet
@@ -1,30 +1,31 @@
 #!/usr/bin/env python3
 
-import enum
 from itertools import combinations
 from typing import Dict, List, Tuple
 
-from pokerapp.entity.cards import Card, Cards
+import numpy as np
+
+from pokerapp.entity.cards import Card, Cards, card_codes
 from pokerapp.entity.entities import Score
 from pokerapp.entity.player import Player
-
-HAND_RANK = 15 ** 5
+from pokerapp.model import batchevaluator
+from pokerapp.model.handevaluator import (
+    BEST_HAND_CACHE_SIZE,
+    HAND_RANK,
+    CacheInfo,
+    HandEvaluator,
+    HandsOfPoker,
+)
 
 
-class HandsOfPoker(enum.Enum):
-    ROYAL_FLUSH = 10
-    STRAIGHT_FLUSH = 9
-    FOUR_OF_A_KIND = 8
-    FULL_HOUSE = 7
-    FLUSH = 6
-    STRAIGHTS = 5
-    THREE_OF_A_KIND = 4
-    TWO_PAIR = 3
-    PAIR = 2
-    HIGH_CARD = 1
+class WinnerDetermination:
+    def __init__(self, cache_size: int = BEST_HAND_CACHE_SIZE):
+        self._evaluator = HandEvaluator(cache_size)
 
+    def cache_info(self) -> CacheInfo:
+        """ Hits and misses of the best hand cache of determinate_scores. """
+        return self._evaluator.cache.info()
 
-class WinnerDetermination:
     @staticmethod
     def _make_combinations(cards: Card) -> Card:
         hands = list(combinations(cards, 5))
@@ -139,6 +140,8 @@ class WinnerDetermination:
                 hand_values, HandsOfPoker.HIGH_CARD
             )
 
+    # _check_hand_get_score and _best_hand_score are the reference
+    # implementation of the lookup evaluator used by determinate_scores.
     def _best_hand_score(self, hands: List[Cards]) -> Tuple[Cards, Score]:
         best_point = 0
         best_hand = []
@@ -157,11 +160,18 @@ class WinnerDetermination:
         res = {}
 
         for player in players:
-            player_hands = self._make_combinations(player.cards + cards_table)
-            best_hand, score = self._best_hand_score(player_hands)
+            cards = player.cards + cards_table
 
-            sorted_best_hand = sorted(list(best_hand), key=lambda x: x.value)
-            if self.is_ace_to_five_straight(sorted_best_hand):
+            # Tracked street by street, the score is ready at showdown.
+            strength = player.hand_strength
+            known_score = None
+            if strength is not None and strength.size == len(cards) >= 5:
+                known_score = strength.score()
+
+            best_hand, score = self._evaluator.best_hand(cards, known_score)
+
+            if self.is_ace_to_five_straight(best_hand):
+                sorted_best_hand = sorted(best_hand, key=lambda x: x.code)
                 best_hand = sorted_best_hand[4:] + sorted_best_hand[0:4]
 
             if score not in res:
@@ -170,7 +180,12 @@ class WinnerDetermination:
 
         return res
 
+    @staticmethod
+    def score_batch(hands: np.ndarray) -> np.ndarray:
+        """ Scores of an [N, 5..7] array of integer card codes. """
+        return batchevaluator.score_batch(hands)
+
     @staticmethod
     def is_ace_to_five_straight(cards: Cards) -> bool:
-        sorted_cards = sorted(list(cards), key=lambda x: x.value)
-        return list(map(lambda c: c.value, sorted_cards)) == [2, 3, 4, 5, 14]
+        ranks = sorted(code >> 2 for code in card_codes(cards))
+        return ranks == [0, 1, 2, 3, 12]
@@ -1,21 +1,49 @@
 #!/usr/bin/env python3
 
+import functools
 import logging
+import queue
+import signal
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+from uuid import uuid4
 
-import redis
-from telegram.ext import Updater
+from telegram import Update
+from telegram.ext import (
+    CallbackContext,
+    DispatcherHandlerStop,
+    JobQueue,
+    TypeHandler,
+    Updater,
+)
 from telegram.utils.request import Request
 
+from pokerapp.chatdispatcher import ChatDispatcher
 from pokerapp.config import Config
+from pokerapp.entity.entities import ChatId
+from pokerapp.kv.factory import create_kv
+from pokerapp.kv.metrics import InstrumentedKv, log_report
 from pokerapp.messagedelaybot import MessageDelayBot
-from pokerapp.model.pokerbotmodel import PokerBotModel
+from pokerapp.model.pokerbotmodel import KEY_CHAT_DATA_GAME, PokerBotModel
 from pokerapp.controller.pokerbotcontroller import PokerBotController
+from pokerapp.model.chatrouter import INBOX_POLL_SEC, ChatRouter
+from pokerapp.model.equitycalculator import EquityCalculator
+from pokerapp.model.gamesnapshot import GameSnapshots
+from pokerapp.model.handwallet import SWEEP_INTERVAL_SEC, sweep_reservations
+from pokerapp.model.journal import COMPACT_INTERVAL_SEC, compact_journal
 from pokerapp.view.pokerbotview import PokerBotViewer
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
+logger = logging.getLogger(__name__)
+
+INGEST_POLLING = "polling"
+INGEST_WEBHOOK = "webhook"
+# Handles only the updates other nodes forward.
+INGEST_INBOX = "inbox"
 
 
 class PokerBot:
@@ -24,32 +52,197 @@ class PokerBot:
         token: str,
         cfg: Config,
     ):
-        req = Request(con_pool_size=8)
+        self._cfg = cfg
+        # A connection for every worker, the dispatcher, the updater,
+        # the job queue and the main thread.
+        req = Request(con_pool_size=cfg.DISPATCH_WORKERS + 4)
         bot = MessageDelayBot(token=token, request=req)
         bot.run_tasks_manager()
 
+        # Chats are handled side by side, the updates of one chat one
+        # after another.
+        dispatcher = ChatDispatcher(
+            bot,
+            queue.Queue(),
+            job_queue=JobQueue(),
+            dispatch_workers=cfg.DISPATCH_WORKERS,
+        )
         self._updater = Updater(
-            bot=bot,
+            dispatcher=dispatcher,
+            workers=None,
             use_context=True,
         )
 
-        kv = redis.Redis(
-            host=cfg.REDIS_HOST,
-            port=cfg.REDIS_PORT,
-            db=cfg.REDIS_DB,
-            password=cfg.REDIS_PASS if cfg.REDIS_PASS != "" else None
+        kv = InstrumentedKv(create_kv(cfg))
+
+        equity_calculator = EquityCalculator(
+            trials=cfg.EQUITY_TRIALS,
+            workers=cfg.EQUITY_WORKERS,
+            time_budget=cfg.EQUITY_TIME_BUDGET,
+            exact_limit=cfg.EQUITY_EXACT_LIMIT,
+        )
+        equity_calculator.warm_up()
+
+        # Hands of a process that died keep their stacks reserved.
+        self._updater.job_queue.run_repeating(
+            lambda context: sweep_reservations(kv, cfg.RESERVATION_MAX_AGE),
+            interval=SWEEP_INTERVAL_SEC,
+            first=0,
         )
 
+        self._updater.job_queue.run_repeating(
+            lambda context: compact_journal(kv, cfg.JOURNAL_RETENTION),
+            interval=COMPACT_INTERVAL_SEC,
+        )
+
+        if cfg.KV_METRICS_INTERVAL > 0:
+            self._updater.job_queue.run_repeating(
+                lambda context: log_report(kv.metrics),
+                interval=cfg.KV_METRICS_INTERVAL,
+            )
+
+        self._snapshots = GameSnapshots(kv, delay=cfg.SNAPSHOT_DELAY)
+        self._router = None
+        if cfg.SHARDED:
+            self._shard(kv)
+
         self._view = PokerBotViewer(bot=bot)
         self._model = PokerBotModel(
             view=self._view,
             bot=bot,
             kv=kv,
             cfg=cfg,
+            equity_calculator=equity_calculator,
+            kv_metrics=kv.metrics,
+            snapshots=self._snapshots,
         )
         self._controller = PokerBotController(self._model, self._updater)
 
+    def _shard(self, kv) -> None:
+        """ Shares the chats with the other nodes of the kv instance. """
+        self._router = ChatRouter(
+            kv,
+            self._cfg.NODE_ID or uuid4().hex,
+            lease=self._cfg.CHAT_LEASE,
+            on_release=self._release_chats,
+            on_lost=self._lose_chats,
+        )
+        # Hops of the forwarded updates by update id.
+        self._hops: Dict[int, int] = {}
+        logger.info("node %s", self._router.node_id)
+
+        # Group -2 runs before the restore of the game in group -1.
+        self._updater.dispatcher.add_handler(
+            TypeHandler(Update, self._route),
+            group=-2,
+        )
+        self._updater.job_queue.run_repeating(
+            lambda context: self._router.heartbeat(),
+            interval=self._cfg.CHAT_LEASE / 3,
+        )
+        self._updater.job_queue.run_repeating(
+            self._read_inbox,
+            interval=INBOX_POLL_SEC,
+        )
+
+    def _route(self, update: Update, context: CallbackContext) -> None:
+        chat = update.effective_chat
+        if chat is None:
+            return
+
+        hops = self._hops.pop(update.update_id, 0)
+        owner = self._router.route(chat.id, hops)
+        if owner is None:
+            return
+        self._router.forward(owner, chat.id, update.to_dict(), hops)
+        raise DispatcherHandlerStop()
+
+    def _read_inbox(self, context: CallbackContext) -> None:
+        # Forwarded updates join the queue of the dispatcher, so the
+        # updates of a chat are still handled one after another.
+        for envelope in self._router.receive():
+            update = Update.de_json(envelope["update"], context.bot)
+            self._hops[update.update_id] = envelope["hops"]
+            self._updater.update_queue.put(update)
+
+    def _forget_chat(self, chat_id: ChatId) -> None:
+        chat_data = self._updater.dispatcher.chat_data.pop(chat_id, {})
+        game = chat_data.get(KEY_CHAT_DATA_GAME)
+        if game is not None:
+            self._model.discard_game(game)
+
+    def _release_chats(self, chats: List[ChatId]) -> None:
+        """ Writes the games of the chats and forgets them, the node
+            that takes a chat next restores its game.
+        """
+        def drop(chat_id: ChatId) -> None:
+            self._snapshots.flush()
+            self._forget_chat(chat_id)
+
+        # The leases are kept until the games are written.
+        for future in self._in_chats(chats, drop):
+            future.result()
+
+    def _lose_chats(self, chats: List[ChatId]) -> None:
+        """ Forgets the chats without writing their games, another node
+            may own them and run their games already.
+        """
+        def drop(chat_id: ChatId) -> None:
+            self._snapshots.discard([chat_id])
+            self._forget_chat(chat_id)
+
+        self._snapshots.discard(chats)
+        self._in_chats(chats, drop)
+
+    def _in_chats(
+        self,
+        chats: List[ChatId],
+        callback: Callable[[ChatId], None],
+    ) -> List[Future]:
+        # Calls back after the updates of the chat being handled.
+        return [
+            self._updater.dispatcher.run_in_chat(
+                chat_id,
+                functools.partial(callback, chat_id),
+            )
+            for chat_id in chats
+        ]
+
     def run(self) -> None:
-        self._updater.start_polling()
+        if self._cfg.INGEST == INGEST_INBOX:
+            self._run_inbox()
+        else:
+            if self._cfg.INGEST == INGEST_WEBHOOK:
+                self._updater.start_webhook(
+                    listen=self._cfg.WEBHOOK_LISTEN,
+                    port=self._cfg.WEBHOOK_PORT,
+                    url_path=self._cfg.TOKEN,
+                    webhook_url=self._cfg.WEBHOOK_URL + self._cfg.TOKEN,
+                )
+            else:
+                self._updater.start_polling()
+            # Blocks until SIGINT or SIGTERM and stops the updater.
+            self._updater.idle()
+
+        if self._router is not None:
+            dropped = self._router.handoff()
+            if dropped:
+                logger.warning("dropped %d forwarded updates", dropped)
+        self._snapshots.flush()
+
+    def _run_inbox(self) -> None:
+        """ Handles the forwarded updates until SIGINT or SIGTERM. """
+        stopped = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+            signal.signal(signum, lambda signum, frame: stopped.set())
 
+        dispatcher = self._updater.dispatcher
+        thread = threading.Thread(target=dispatcher.start, daemon=True)
+        thread.start()
+        self._updater.job_queue.start()
+        while not stopped.wait(timeout=1):
+            pass
 
+        self._updater.job_queue.stop()
+        dispatcher.stop()
+        thread.join()
@@ -192,14 +192,17 @@ class PokerBotViewer:
             cards_table = "no cards"
         else:
             cards_table = " ".join(game.cards_table)
+            # Only the table is described, the prompt is public.
+            if game.board_strength is not None:
+                cards_table += f" ({game.board_strength.category()})"
         text = (
             f"Turn of {player.mention_markdown}\n"
             f"{cards_table}\n"
             f"Money: *{money}$* "
             f"({'{:.1f}'.format(money / PlayerAction.BIG_BLIND.value).rstrip('0').rstrip('.')} BB)\n"
-            f"Pot size: *{sum(bet.amount for bet in game.players_bets)}$*\n"
+            f"Pot size: *{game.players_bets.total()}$*\n"
             f"Your $ in pot: "
-            f"*{sum(bet.amount for bet in game.players_bets if bet.user_id == player.user_id)}$*\n"
+            f"*{game.players_bets.player_total(player.user_id)}$*\n"
             f"Tap /cards to show cards"
         )
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import argparse
+import multiprocessing
+from typing import Tuple
+
+import numpy as np
+
+from pokerapp.constants import MAX_PLAYERS, MIN_PLAYERS
+from pokerapp.model.batchevaluator import score_batch
+from pokerapp.model.preflopequity import (
+    HAND_CLASSES,
+    PREFLOP_EQUITY_FILE,
+    hand_class_codes,
+    hand_class_name,
+    write_table,
+)
+
+
+def class_odds(
+    index: int,
+    trials: int,
+    seed: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Win and tie percentages of the hand class for every table size. """
+    rnd = np.random.default_rng([seed, index])
+    hole = hand_class_codes(index)
+    deck = np.array([c for c in range(52) if c not in hole], dtype=np.int64)
+
+    win = np.zeros(MAX_PLAYERS - MIN_PLAYERS + 1)
+    tie = np.zeros(MAX_PLAYERS - MIN_PLAYERS + 1)
+    for players in range(MIN_PLAYERS, MAX_PLAYERS + 1):
+        draw_count = 5 + 2 * (players - 1)
+        order = np.argsort(rnd.random((trials, len(deck))), axis=1)
+        draws = deck[order[:, :draw_count]]
+        board = draws[:, :5]
+
+        scores = np.empty((players, trials), dtype=np.int64)
+        scores[0] = score_batch(np.hstack([
+            np.broadcast_to(np.array(hole, dtype=np.int64), (trials, 2)),
+            board,
+        ]))
+        for i in range(1, players):
+            start = 5 + 2 * (i - 1)
+            scores[i] = score_batch(
+                np.hstack([draws[:, start:start + 2], board]),
+            )
+
+        best = scores.max(axis=0)
+        ahead = scores[0] == best
+        split = (scores == best).sum(axis=0) > 1
+        win[players - MIN_PLAYERS] = 100.0 * (ahead & ~split).mean()
+        tie[players - MIN_PLAYERS] = 100.0 * (ahead & split).mean()
+
+    return win, tie
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate the preflop equity table asset.",
+    )
+    parser.add_argument("--trials", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=2020)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=PREFLOP_EQUITY_FILE)
+    args = parser.parse_args()
+
+    with multiprocessing.Pool(args.workers) as pool:
+        results = pool.starmap(class_odds, [
+            (index, args.trials, args.seed) for index in range(HAND_CLASSES)
+        ])
+
+    win = np.array([w for w, _ in results])
+    tie = np.array([t for _, t in results])
+    write_table(args.output, win, tie)
+
+    for index in np.argsort(-win[:, 0])[:5]:
+        print(f"{hand_class_name(index):<4} {win[index, 0]:.2f}%")
+    print(f"written {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+import argparse
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pokerapp.config import Config
+from pokerapp.kv.backend import KvBackend
+from pokerapp.kv.factory import create_kv
+from pokerapp.kv.script import LuaScript, execute_pipeline
+from pokerapp.model.journal import KEY_JOURNAL
+from pokerapp.model.kvschema import (
+    FIELD_CHAT_ID,
+    FIELD_DAILY,
+    FIELD_MONEY,
+    GAME_KEY_PREFIX,
+    GAME_KEY_TTL_SEC,
+    INBOX_KEY_PREFIX,
+    LEADERBOARD_KEY,
+    LEASE_KEY_PREFIX,
+    SNAPSHOT_KEY_PREFIX,
+    USER_KEY_PREFIX,
+    game_key,
+    hand_field,
+    user_key,
+    user_messages_key,
+)
+
+DEFAULT_BATCH = 500
+DEFAULT_SLEEP_SEC = 0.01
+
+# Keys of the old layout, one string key per value:
+#   pokerbot:<id>                  money
+#   pokerbot:<id>:daily            date of the last daily bonus
+#   pokerbot:<id>:hand:<game id>   stack reserved for a hand
+#   pokerbot:<id>:<game id>        money authorized in a game
+#   pokerbot:chats:<id>            private chat id
+#   pokerbot:chats:<id>:messages   list of private message ids
+_OLD_CHAT = re.compile(r"^pokerbot:chats:([^:]+)(:messages)?$")
+_OLD_USER = re.compile(r"^pokerbot:([^:]+)(?::(hand:)?(.+))?$")
+
+# Prefixes of keys the new layout added, they are never migrated.
+_NEW_PREFIXES = (
+    USER_KEY_PREFIX,
+    GAME_KEY_PREFIX,
+    SNAPSHOT_KEY_PREFIX,
+    LEASE_KEY_PREFIX,
+    INBOX_KEY_PREFIX,
+)
+
+# KEYS: old string key, new hash. ARGV: field, ttl or 0.
+# Moves the string into the hash field and deletes it. A field the bot
+# wrote since the deploy is newer and is kept.
+MOVE_TO_FIELD_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return 0
+end
+local moved = redis.call('HSETNX', KEYS[2], ARGV[1], value)
+redis.call('DEL', KEYS[1])
+if moved == 1 and tonumber(ARGV[2]) > 0 then
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return moved
+"""
+
+# KEYS: old key, new key.
+# A new key the bot wrote since the deploy is kept, the old one dropped.
+RENAME_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if redis.call('RENAMENX', KEYS[1], KEYS[2]) == 0 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+return 1
+"""
+
+
+def _move_to_field_python(kv: KvBackend, keys: List[str], args: List):
+    value = kv.get(keys[0])
+    if value is None:
+        return 0
+    moved = kv.hsetnx(keys[1], args[0], value)
+    kv.delete(keys[0])
+    if moved and int(args[1]) > 0:
+        kv.expire(keys[1], int(args[1]))
+    return int(moved)
+
+
+def _rename_python(kv: KvBackend, keys: List[str], args: List):
+    if not kv.exists(keys[0]):
+        return 0
+    if kv.exists(keys[1]):
+        kv.delete(keys[0])
+        return 0
+    kv.rename(keys[0], keys[1])
+    return 1
+
+
+_move_to_field = LuaScript(MOVE_TO_FIELD_SCRIPT, _move_to_field_python)
+_rename = LuaScript(RENAME_SCRIPT, _rename_python)
+
+
+def new_location(key: str) -> Optional[Tuple[str, str, Optional[str], int]]:
+    """ The move of an old key: (kind, new key, field, ttl).
+
+        Kind is "field" or "rename", None for keys of the new layout and
+        keys that are not ours.
+    """
+    if key.startswith(_NEW_PREFIXES) or \
+            key in ("pokerbot:hands", LEADERBOARD_KEY, KEY_JOURNAL) or \
+            key.startswith((LEADERBOARD_KEY + ":", KEY_JOURNAL + ":")):
+        return None
+
+    match = _OLD_CHAT.match(key)
+    if match is not None:
+        user_id, messages = match.groups()
+        if messages:
+            return ("rename", user_messages_key(user_id), None, 0)
+        return ("field", user_key(user_id), FIELD_CHAT_ID, 0)
+
+    match = _OLD_USER.match(key)
+    if match is None:
+        return None
+
+    user_id, hand, rest = match.groups()
+    if rest is None:
+        return ("field", user_key(user_id), FIELD_MONEY, 0)
+    if hand:
+        return ("field", user_key(user_id), hand_field(rest), 0)
+    if rest == "daily":
+        return ("field", user_key(user_id), FIELD_DAILY, 0)
+    return ("field", game_key(rest), user_id, GAME_KEY_TTL_SEC)
+
+
+def migrate_batch(
+    kv: KvBackend,
+    keys: List[str],
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """ Moves the keys with one pipelined round trip, a script per key. """
+    moves = []
+    for key in keys:
+        location = new_location(key)
+        if location is not None:
+            moves.append((key, location))
+
+    stats = {
+        "seen": len(keys),
+        "planned": len(moves),
+        "moved": 0,
+        "skipped": len(keys) - len(moves),
+    }
+    if dry_run or not moves:
+        return stats
+
+    _move_to_field.load(kv)
+    _rename.load(kv)
+    pipe = kv.pipeline(transaction=False)
+    calls = []
+    for key, (kind, new_key, field, ttl) in moves:
+        if kind == "rename":
+            calls.append(_rename.queue(pipe, [key, new_key], []))
+        else:
+            calls.append(_move_to_field.queue(
+                pipe, [key, new_key], [field, ttl],
+            ))
+
+    stats["moved"] = sum(
+        int(done) for done in execute_pipeline(kv, pipe, calls)
+    )
+    return stats
+
+
+def migrate(
+    kv: KvBackend,
+    batch: int = DEFAULT_BATCH,
+    sleep: float = DEFAULT_SLEEP_SEC,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """ Converts the keyspace with SCAN, a batch at a time.
+
+        Redis serves other clients between the batches, so the bot may
+        keep running, but keys it writes in the old layout meanwhile are
+        only moved if SCAN reaches them after the write.
+    """
+    totals = {"seen": 0, "moved": 0, "skipped": 0, "planned": 0}
+    cursor = 0
+    while True:
+        cursor, keys = kv.scan(cursor, match="pokerbot:*", count=batch)
+        if keys:
+            names = [
+                k.decode("utf-8") if isinstance(k, bytes) else k
+                for k in keys
+            ]
+            stats = migrate_batch(kv, names, dry_run)
+            for name, value in stats.items():
+                totals[name] += value
+        if cursor == 0:
+            return totals
+        if sleep > 0:
+            time.sleep(sleep)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Move user data to the hash layout of kvschema.",
+    )
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH,
+                        help="SCAN count and keys per pipeline")
+    parser.add_argument("--sleep", type=float, default=DEFAULT_SLEEP_SEC,
+                        help="pause between batches in seconds")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="count the keys to move without moving them")
+    args = parser.parse_args()
+
+    kv = create_kv(Config())
+
+    totals = migrate(kv, args.batch, args.sleep, args.dry_run)
+    print(
+        "seen {seen}, planned {planned}, moved {moved}, "
+        "skipped {skipped}".format(**totals)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+from typing import List
+
+from pokerapp.config import Config
+from pokerapp.kv.backend import KvBackend
+from pokerapp.kv.factory import create_kv
+from pokerapp.model.kvschema import (
+    USER_KEY_PREFIX,
+    leaderboard_key,
+    user_chats_key,
+)
+from pokerapp.model.leaderboard import wealth
+
+DEFAULT_BATCH = 500
+DEFAULT_SLEEP_SEC = 0.01
+
+
+def rebuild_batch(kv: KvBackend, user_ids: List[str]) -> None:
+    """ Two pipelined round trips: read the users, write their scores. """
+    pipe = kv.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.hgetall(USER_KEY_PREFIX + user_id)
+        pipe.smembers(user_chats_key(user_id))
+    replies = pipe.execute()
+
+    pipe = kv.pipeline(transaction=False)
+    for i, user_id in enumerate(user_ids):
+        fields, chats = replies[2 * i], replies[2 * i + 1]
+        score = {user_id: wealth(fields)}
+        pipe.zadd(leaderboard_key(), score)
+        for chat in chats:
+            pipe.zadd(leaderboard_key(chat.decode("utf-8")), score)
+    pipe.execute()
+
+
+def rebuild(
+    kv: KvBackend,
+    batch: int = DEFAULT_BATCH,
+    sleep: float = DEFAULT_SLEEP_SEC,
+) -> int:
+    """ Scores every user hash found with SCAN, returns their count.
+
+        Run it while no bot is running: a score written here overwrites
+        changes made since the user was read.
+    """
+    users = 0
+    cursor = 0
+    while True:
+        cursor, keys = kv.scan(
+            cursor, match=USER_KEY_PREFIX + "*", count=batch,
+        )
+        user_ids = []
+        for key in keys:
+            user_id = key.decode("utf-8")[len(USER_KEY_PREFIX):]
+            # Lists and sets of the user are named <user key>:<suffix>.
+            if ":" not in user_id:
+                user_ids.append(user_id)
+        if user_ids:
+            rebuild_batch(kv, user_ids)
+            users += len(user_ids)
+        if cursor == 0:
+            return users
+        if sleep > 0:
+            time.sleep(sleep)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Score all users on the leaderboards.",
+    )
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH,
+                        help="SCAN count and users per pipeline")
+    parser.add_argument("--sleep", type=float, default=DEFAULT_SLEEP_SEC,
+                        help="pause between batches in seconds")
+    args = parser.parse_args()
+
+    users = rebuild(create_kv(Config()), args.batch, args.sleep)
+    print("scored {} users".format(users))
+
+
+if __name__ == "__main__":
+    main()
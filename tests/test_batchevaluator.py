@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import unittest
+
+import numpy as np
+
+from pokerapp.model.batchevaluator import score_boards
+from pokerapp.model.handevaluator import HandEvaluator
+from pokerapp.model.winnerdetermination import WinnerDetermination
+
+RANDOM_HANDS = 20000
+
+
+class TestBatchEvaluator(unittest.TestCase):
+    @staticmethod
+    def _random_hands(count: int, size: int) -> np.ndarray:
+        rnd = np.random.default_rng(size)
+        return np.argsort(rnd.random((count, 52)), axis=1)[:, :size]
+
+    def test_score_batch_matches_scalar(self):
+        for size in (5, 6, 7):
+            hands = self._random_hands(RANDOM_HANDS, size)
+            got = WinnerDetermination.score_batch(hands)
+            want = [HandEvaluator.score_codes(list(h)) for h in hands]
+            self.assertListEqual(want, got.tolist(), f"size {size}")
+
+    def test_score_boards_matches_scalar(self):
+        hands = self._random_hands(200, 7)
+        boards, holes = hands[:20, :5], hands[:, 5:]
+        got = score_boards(boards, holes)
+        for board, row in zip(boards, got):
+            for hole, score in zip(holes, row):
+                codes = list(board) + list(hole)
+                if len(set(codes)) == 7:
+                    self.assertEqual(
+                        HandEvaluator.score_codes(codes), score,
+                    )
+
+    def test_score_batch_rejects_short_hands(self):
+        with self.assertRaises(ValueError):
+            WinnerDetermination.score_batch(np.zeros((3, 4), dtype=int))
+
+
+if __name__ == '__main__':
+    unittest.main()
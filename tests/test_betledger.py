@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from pokerapp.entity.betledger import BetLedger
+from pokerapp.entity.game import Game
+from pokerapp.entity.gamestate import GameState
+from pokerapp.entity.playerbet import PlayerBet
+
+
+class TestBetLedger(unittest.TestCase):
+    def test_running_totals(self):
+        ledger = BetLedger()
+        ledger.append(PlayerBet("1", 5, GameState.ROUND_PRE_FLOP))
+        ledger.append(PlayerBet("2", 10, GameState.ROUND_PRE_FLOP))
+        ledger.append(PlayerBet("1", 20, GameState.ROUND_FLOP))
+
+        self.assertEqual(35, ledger.total())
+        self.assertEqual(25, ledger.player_total("1"))
+        self.assertEqual(0, ledger.player_total("3"))
+        self.assertEqual(15, ledger.state_total(GameState.ROUND_PRE_FLOP))
+        self.assertEqual(20, ledger.state_total(GameState.ROUND_FLOP))
+        self.assertDictEqual({"1": 25, "2": 10}, ledger.player_totals())
+        self.assertEqual(3, len(ledger))
+
+    def test_bets_come_back_in_order(self):
+        bets = [
+            ("1", 5, GameState.ROUND_PRE_FLOP),
+            ("2", 10, GameState.ROUND_PRE_FLOP),
+            ("1", 20, GameState.ROUND_RIVER),
+        ]
+        ledger = BetLedger(PlayerBet(*bet) for bet in bets)
+
+        self.assertEqual(
+            bets,
+            [(b.user_id, b.amount, b.game_state) for b in ledger],
+        )
+
+    def test_game_wraps_assigned_bets(self):
+        game = Game()
+        game.players_bets = [PlayerBet("1", 7, GameState.ROUND_TURN)]
+
+        self.assertIsInstance(game.players_bets, BetLedger)
+        self.assertEqual(7, game.players_bets.player_total("1"))
+
+        game.reset()
+        self.assertEqual(0, game.players_bets.total())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import datetime
+import queue
+import threading
+import time
+import unittest
+
+from telegram import Bot, Chat, Message, Update
+from telegram.ext import TypeHandler
+
+from pokerapp.chatdispatcher import MAILBOX_BATCH, ChatDispatcher
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    return Update(update_id, message=Message(
+        message_id=update_id,
+        date=datetime.datetime.now(),
+        chat=Chat(id=chat_id, type=Chat.GROUP),
+    ))
+
+
+class TestChatDispatcher(unittest.TestCase):
+    def setUp(self):
+        self._dispatcher = ChatDispatcher(
+            Bot("123:test"),
+            queue.Queue(),
+            dispatch_workers=4,
+        )
+        self._lock = threading.Lock()
+        self._handled = {}
+        self._running = {}
+        self._overlaps = 0
+        self._max_running = 0
+
+    def _handle(self, update: Update, context) -> None:
+        chat_id = update.effective_chat.id
+        with self._lock:
+            if self._running.get(chat_id):
+                self._overlaps += 1
+            self._running[chat_id] = True
+            self._max_running = max(
+                self._max_running,
+                sum(self._running.values()),
+            )
+        time.sleep(0.01)
+        with self._lock:
+            self._running[chat_id] = False
+            self._handled.setdefault(chat_id, []).append(update.update_id)
+
+    def test_chats_run_side_by_side_in_order(self):
+        self._dispatcher.add_handler(TypeHandler(Update, self._handle))
+        chats = (-1, -2, -3, -4)
+        count = MAILBOX_BATCH + 4
+        for i in range(count):
+            for chat_id in chats:
+                self._dispatcher.process_update(
+                    _update(i * len(chats) - chat_id, chat_id),
+                )
+        self._dispatcher.stop()
+
+        self.assertEqual(0, self._overlaps)
+        self.assertGreater(self._max_running, 1)
+        for chat_id in chats:
+            self.assertEqual(
+                [i * len(chats) - chat_id for i in range(count)],
+                self._handled[chat_id],
+            )
+
+    def test_failed_update_does_not_stop_the_chat(self):
+        def fail_first(update: Update, context) -> None:
+            if update.update_id == 0:
+                raise ValueError("boom")
+            self._handle(update, context)
+
+        self._dispatcher.add_handler(TypeHandler(Update, fail_first))
+        self._dispatcher.add_error_handler(lambda update, context: None)
+        for i in range(3):
+            self._dispatcher.process_update(_update(i, -1))
+        self._dispatcher.stop()
+
+        self.assertEqual([1, 2], self._handled[-1])
+
+    def test_chat_task_runs_after_the_updates_before_it(self):
+        self._dispatcher.add_handler(TypeHandler(Update, self._handle))
+        for i in range(3):
+            self._dispatcher.process_update(_update(i, -1))
+        seen = self._dispatcher.run_in_chat(
+            -1,
+            lambda: list(self._handled[-1]),
+        )
+        self._dispatcher.process_update(_update(3, -1))
+
+        self.assertEqual([0, 1, 2], seen.result(timeout=5))
+        self._dispatcher.stop()
+        self.assertEqual([0, 1, 2, 3], self._handled[-1])
+
+    def test_chat_task_runs_at_once_after_stop(self):
+        self._dispatcher.stop()
+        self.assertEqual(
+            7,
+            self._dispatcher.run_in_chat(-1, lambda: 7).result(timeout=0),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import unittest
+from uuid import uuid4
+
+import redis
+
+from pokerapp.config import Config
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.model.chatrouter import MAX_HOPS, ChatRouter
+from pokerapp.model.kvschema import lease_key
+
+
+def _redis() -> redis.Redis:
+    cfg: Config = Config()
+    return redis.Redis(
+        host=cfg.REDIS_HOST,
+        port=cfg.REDIS_PORT,
+        db=cfg.REDIS_DB,
+        password=cfg.REDIS_PASS if cfg.REDIS_PASS != "" else None
+    )
+
+
+def _claim_chats(node_id, chats, results) -> None:
+    router = ChatRouter(_redis(), node_id)
+    results.put((node_id, [router.route(c) for c in chats]))
+
+
+class TestChatRouter(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestChatRouter, self).__init__(*args, **kwargs)
+        self._kv = _redis()
+
+    def _nodes(self, **kwargs):
+        self.released = []
+        self.lost = []
+        return [
+            ChatRouter(
+                self._kv,
+                str(uuid4()),
+                on_release=self.released.extend,
+                on_lost=self.lost.extend,
+                **kwargs,
+            )
+            for _ in range(2)
+        ]
+
+    def test_updates_go_to_the_owner(self):
+        first, second = self._nodes()
+        chat_id = str(uuid4())
+
+        self.assertIsNone(first.route(chat_id))
+        self.assertIsNone(first.route(chat_id))
+        self.assertEqual(first.node_id, second.route(chat_id))
+        self.assertFalse(second.owns(chat_id))
+        self.assertIsNone(second.route(chat_id, hops=MAX_HOPS))
+
+        second.forward(first.node_id, chat_id, {"update_id": 7})
+        self.assertEqual(
+            [{"chat": chat_id, "hops": 1, "update": {"update_id": 7}}],
+            first.receive(),
+        )
+        self.assertEqual([], first.receive())
+
+    def test_heartbeat_renews_and_drops_lost_chats(self):
+        first, _ = self._nodes()
+        kept, lost = str(uuid4()), str(uuid4())
+        first.route(kept)
+        first.route(lost)
+        self._kv.set(lease_key(lost), "another node")
+
+        self.assertEqual([lost], first.heartbeat())
+        self.assertEqual([lost], self.lost)
+        self.assertEqual([], self.released)
+        self.assertTrue(first.owns(kept))
+        self.assertGreater(self._kv.pttl(lease_key(kept)), 0)
+
+    def test_idle_chats_are_handed_back(self):
+        first, second = self._nodes(idle=0)
+        chat_id = str(uuid4())
+        first.route(chat_id)
+
+        self.assertEqual([chat_id], first.heartbeat())
+        self.assertEqual([chat_id], self.released)
+        self.assertIsNone(second.route(chat_id))
+
+    def test_chat_taken_again_while_released_keeps_its_lease(self):
+        chat_id = str(uuid4())
+        router = ChatRouter(
+            self._kv,
+            str(uuid4()),
+            on_release=lambda chats: router.route(chat_id),
+        )
+        router.route(chat_id)
+
+        self.assertEqual([], router.release())
+        self.assertTrue(router.owns(chat_id))
+        self.assertEqual(
+            router.node_id,
+            self._kv.get(lease_key(chat_id)).decode(),
+        )
+
+    def test_handoff_forwards_the_inbox(self):
+        first, second = self._nodes()
+        taken, orphan = str(uuid4()), str(uuid4())
+        first.route(taken)
+        first.route(orphan)
+        second.forward(first.node_id, taken, {"update_id": 1})
+        second.forward(first.node_id, orphan, {"update_id": 2})
+
+        first.release([taken])
+        self.assertIsNone(second.route(taken))
+        self.assertEqual(1, first.handoff())
+
+        self.assertEqual(
+            [{"chat": taken, "hops": 1, "update": {"update_id": 1}}],
+            second.receive(),
+        )
+        self.assertEqual([taken, orphan], self.released)
+        self.assertEqual(0, self._kv.exists(lease_key(orphan)))
+
+    def test_every_chat_has_one_owner_across_processes(self):
+        chats = [str(uuid4()) for _ in range(20)]
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=_claim_chats,
+                args=(str(i), chats, results),
+            )
+            for i in range(4)
+        ]
+        for process in processes:
+            process.start()
+        answers = dict(results.get(timeout=10) for _ in processes)
+        for process in processes:
+            process.join()
+
+        for i, chat_id in enumerate(chats):
+            owners = {
+                node_id if routes[i] is None else routes[i]
+                for node_id, routes in answers.items()
+            }
+            self.assertEqual(1, len(owners))
+            self.assertEqual(
+                owners.pop(),
+                self._kv.get(lease_key(chat_id)).decode("utf-8"),
+            )
+
+
+class TestChatRouterMemory(TestChatRouter):
+    def __init__(self, *args, **kwargs):
+        super(TestChatRouterMemory, self).__init__(*args, **kwargs)
+        self._kv = MemoryKv()
+
+    def test_every_chat_has_one_owner_across_processes(self):
+        self.skipTest("the memory backend lives in one process")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import time
+import unittest
+
+from pokerapp.entity.cards import Card, Cards, card_codes
+from pokerapp.model.equitycalculator import (
+    EquityCalculator,
+    exact_cache_info,
+    simulate,
+)
+
+
+def cards(text: str) -> Cards:
+    return [Card(c) for c in text.split()]
+
+
+class TestEquityCalculator(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestEquityCalculator, self).__init__(*args, **kwargs)
+        self._calculator = EquityCalculator(trials=20000, workers=0)
+
+    def test_pair_against_lower_pair(self):
+        result = self._calculator.calculate(
+            hands=[cards("A♠ A♥"), cards("K♠ K♥")],
+            cards_table=[],
+        )
+
+        self.assertEqual(20000, result.trials)
+        self.assertAlmostEqual(82, result.players[0].equity, delta=2)
+        self.assertAlmostEqual(18, result.players[1].equity, delta=2)
+        self.assertLess(result.players[0].margin, 1)
+
+    def test_board_plays(self):
+        result = self._calculator.calculate(
+            hands=[cards("2♠ 3♥"), cards("2♦ 3♣")],
+            cards_table=cards("A♠ K♠ Q♠ J♠ 10♠"),
+        )
+
+        for equity in result.players:
+            self.assertEqual(0, equity.win)
+            self.assertEqual(100, equity.tie)
+
+    def test_unknown_opponent_and_deck(self):
+        result = self._calculator.calculate(
+            hands=[cards("7♠ 2♥"), []],
+            cards_table=cards("7♦ 7♣ 2♠"),
+            deck=cards("3♦ 4♦ 9♦ 10♦ K♥ Q♥"),
+        )
+
+        self.assertEqual(100, result.players[0].win)
+        self.assertEqual(0, result.players[1].win)
+
+    def test_short_runout_is_exact_and_memoized(self):
+        result = self._calculator.calculate(
+            hands=[cards("A♠ A♥"), cards("K♠ K♥")],
+            cards_table=cards("2♦ 7♣ 9♥"),
+        )
+        hits = exact_cache_info().hits
+
+        # The same spot with hearts and clubs swapped.
+        same_spot = self._calculator.calculate(
+            hands=[cards("A♠ A♣"), cards("K♠ K♣")],
+            cards_table=cards("2♦ 7♥ 9♣"),
+        )
+
+        self.assertTrue(result.exact)
+        self.assertEqual(990, result.trials)
+        self.assertEqual(0, result.players[0].margin)
+        self.assertEqual(result, same_spot)
+        self.assertEqual(hits + 1, exact_cache_info().hits)
+
+    def test_deadline_stops_the_trials(self):
+        hands = [tuple(card_codes(cards("A♠ A♥"))), ()]
+        deck = tuple(c for c in range(52) if c not in hands[0])
+
+        wins, ties, trials = simulate(hands, (), deck, 1000, 1, time.time())
+        self.assertEqual(0, trials)
+        self.assertEqual([0, 0], wins)
+
+        calculator = EquityCalculator(trials=1000, workers=0, time_budget=0)
+        self.assertIsNone(calculator.calculate([cards("A♠ A♥"), []], []))
+
+    def test_pool_merges_the_chunks(self):
+        calculator = EquityCalculator(trials=2000, workers=1, time_budget=60)
+        try:
+            future = calculator.submit([cards("A♠ A♥"), []], [])
+            result = future.result(timeout=120)
+        finally:
+            calculator.shutdown()
+
+        self.assertEqual(2000, result.trials)
+        self.assertAlmostEqual(85, result.players[0].equity, delta=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest.mock import MagicMock
+
+from telegram import Bot, Update
+from telegram.ext import CallbackContext
+
+from pokerapp.config import Config
+from pokerapp.entity.equity import PlayerEquity
+from pokerapp.entity.game import Game
+from pokerapp.entity.gamestate import GameState
+from pokerapp.entity.player import Player
+from pokerapp.entity.playerbet import PlayerBet
+from pokerapp.entity.playerstate import PlayerState
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.model.gamesnapshot import (
+    GameSnapshots,
+    decode_game,
+    encode_game,
+)
+from pokerapp.model.handstrength import HandStrength
+from pokerapp.model.handwallet import (
+    KEY_RESERVATIONS,
+    HandWallet,
+    reserve_hand,
+    settle_hand,
+    sweep_reservations,
+)
+from pokerapp.model.kvschema import snapshot_key
+from pokerapp.model.pokerbotmodel import KEY_CHAT_DATA_GAME, PokerBotModel
+from pokerapp.model.walletmanagermodel import WalletManagerModel
+from pokerapp.view.pokerbotview import PokerBotViewer
+
+
+def _running_game(kv: MemoryKv) -> Game:
+    game = Game()
+    game.state = GameState.ROUND_FLOP
+    game.pot = 30
+    game.max_round_rate = 20
+    game.current_player_index = 1
+    game.trading_end_user_id = 2
+    game.ready_users = {1, 2}
+    game.board_strength = HandStrength()
+
+    hand = HandWallet(1, game.id, 1000)
+    hand.authorize(game.id, 20)
+    for user_id, wallet in ((1, hand), (2, WalletManagerModel(2, kv))):
+        player = Player(
+            user_id=user_id,
+            user_name="user" + str(user_id),
+            mention_markdown="@user" + str(user_id),
+            wallet=wallet,
+            ready_message_id="7",
+        )
+        player.cards = [game.remain_cards.pop() for _ in range(2)]
+        player.hand_strength = HandStrength()
+        game.players.append(player)
+    game.players[1].state = PlayerState.ALL_IN
+    game.cards_table = [game.remain_cards.pop() for _ in range(3)]
+    game.players_bets = [PlayerBet(1, 20, GameState.ROUND_PRE_FLOP)]
+    game.all_in_equity = {1: PlayerEquity(win=60.5, tie=1.0)}
+    return game
+
+
+class TestGameSnapshot(unittest.TestCase):
+    def test_encode_decode(self):
+        kv = MemoryKv()
+        game = _running_game(kv)
+
+        data = encode_game(game)
+        self.assertLess(len(data), 512)
+        restored = decode_game(data, lambda user_id: "wallet")
+
+        for name in ("id", "pot", "max_round_rate", "state",
+                     "cards_table", "current_player_index", "remain_cards",
+                     "trading_end_user_id", "ready_users", "all_in_equity"):
+            self.assertEqual(getattr(game, name), getattr(restored, name))
+        self.assertEqual(game.last_turn_time, restored.last_turn_time)
+        self.assertEqual(
+            [(b.user_id, b.amount, b.game_state) for b in game.players_bets],
+            [(b.user_id, b.amount, b.game_state)
+             for b in restored.players_bets],
+        )
+
+        hand, kept = restored.players
+        self.assertEqual(game.players[0].cards, hand.cards)
+        self.assertEqual(PlayerState.ALL_IN, kept.state)
+        self.assertEqual("wallet", kept.wallet)
+        self.assertIsInstance(hand.wallet, HandWallet)
+        self.assertEqual(980, hand.wallet.value())
+        self.assertEqual(20, hand.wallet.authorized_money(game.id))
+        self.assertEqual([("bet", 20, 980)], hand.wallet.entries)
+
+        self.assertEqual(
+            HandStrength(
+                [c.code for c in hand.cards + restored.cards_table],
+            ).score(),
+            hand.hand_strength.score(),
+        )
+        self.assertIsNotNone(restored.board_strength)
+
+    def test_corrupt_snapshot_is_dropped(self):
+        kv = MemoryKv()
+        data = encode_game(_running_game(kv))
+        for corrupt in (data[:len(data) // 2], data + b"\0", b"\2\xff"):
+            with self.assertRaises(ValueError):
+                decode_game(corrupt, lambda user_id: None)
+
+        kv.set(snapshot_key("-1"), data[:-1])
+        snapshots = GameSnapshots(kv, delay=0)
+        with self.assertLogs("pokerapp.model.gamesnapshot", "ERROR"):
+            self.assertIsNone(snapshots.load("-1", lambda u: None))
+        self.assertEqual(0, kv.exists(snapshot_key("-1")))
+
+    def test_other_version_is_ignored(self):
+        data = b"\1" + encode_game(Game())[1:]
+        self.assertIsNone(decode_game(data, lambda user_id: None))
+
+    def test_idle_game_keeps_its_deck_unshuffled(self):
+        restored = decode_game(encode_game(Game()), lambda user_id: None)
+
+        self.assertFalse(restored.has_deck)
+        self.assertEqual(52, len(restored.remain_cards))
+
+    def test_saves_are_debounced_into_one_pipeline(self):
+        kv = MemoryKv()
+        snapshots = GameSnapshots(kv, delay=60)
+        first, second = _running_game(kv), _running_game(kv)
+
+        snapshots.save("-1", first)
+        first.pot = 90
+        snapshots.save("-1", first)
+        snapshots.save("-2", second)
+        self.assertIsNone(kv.get(snapshot_key("-1")))
+        self.assertEqual(90, snapshots.load("-1", lambda u: None).pot)
+
+        self.assertEqual(2, snapshots.flush())
+        self.assertEqual(0, snapshots.flush())
+        self.assertGreater(kv.ttl(snapshot_key("-1")), 0)
+        self.assertEqual(90, decode_game(
+            kv.get(snapshot_key("-1")), lambda u: None,
+        ).pot)
+
+        first.reset()
+        snapshots.save("-1", first)
+        snapshots.flush()
+        self.assertEqual(0, kv.exists(snapshot_key("-1")))
+        self.assertIsNone(snapshots.load("-1", lambda u: None))
+
+    def test_discarded_snapshot_keeps_the_written_one(self):
+        kv = MemoryKv()
+        snapshots = GameSnapshots(kv, delay=60)
+        game = _running_game(kv)
+        snapshots.save("-1", game)
+        snapshots.flush()
+
+        game.pot = 90
+        snapshots.save("-1", game)
+        snapshots.discard(["-1"])
+
+        self.assertEqual(0, snapshots.flush())
+        self.assertEqual(30, snapshots.load("-1", lambda u: None).pot)
+
+    def test_saved_hands_are_not_swept(self):
+        kv = MemoryKv()
+        game = Game()
+        game.state = GameState.ROUND_FLOP
+        for user_id in ("sweep1", "sweep2"):
+            game.players.append(Player(
+                user_id=user_id,
+                user_name=user_id,
+                mention_markdown="@" + user_id,
+                wallet=WalletManagerModel(user_id, kv),
+                ready_message_id="7",
+            ))
+        reserve_hand(kv, game)
+        members = [m.decode() for m in kv.zrangebyscore(
+            KEY_RESERVATIONS, "-inf", "+inf",
+        )]
+        kv.zadd(KEY_RESERVATIONS, {m: 0 for m in members})
+
+        GameSnapshots(kv, delay=0).save(-1, game)
+        self.assertEqual(0, sweep_reservations(kv, max_age=3600))
+
+        game.players[0].wallet.authorize(game.id, 100)
+        game.players[1].wallet.inc(100)
+        settle_hand(kv, game)
+        self.assertEqual(900, WalletManagerModel("sweep1", kv).value())
+        self.assertEqual(1100, WalletManagerModel("sweep2", kv).value())
+
+        # A settled hand saved late is not reserved again.
+        GameSnapshots(kv, delay=0).save(-1, game)
+        self.assertEqual(0, kv.zcard(KEY_RESERVATIONS))
+
+    def test_game_is_restored_on_the_first_update(self):
+        kv = MemoryKv()
+        GameSnapshots(kv, delay=0).save(-100, _running_game(kv))
+
+        model = PokerBotModel(
+            MagicMock(spec=PokerBotViewer),
+            MagicMock(spec=Bot),
+            MagicMock(spec=Config),
+            kv,
+            snapshots=GameSnapshots(kv, delay=0),
+        )
+        update = MagicMock(spec=Update)
+        update.effective_chat.id = -100
+        context = MagicMock(spec=CallbackContext)
+        context.chat_data = {}
+
+        model.restore_game(update, context)
+        game = context.chat_data[KEY_CHAT_DATA_GAME]
+        self.assertEqual(GameState.ROUND_FLOP, game.state)
+        self.assertIsInstance(game.players[1].wallet, WalletManagerModel)
+
+        kv.delete(snapshot_key(-100))
+        model.restore_game(update, context)
+        self.assertIs(game, context.chat_data[KEY_CHAT_DATA_GAME])
+
+        update.effective_chat.id = -200
+        context.chat_data = {}
+        model.restore_game(update, context)
+        self.assertEqual(
+            GameState.INITIAL,
+            context.chat_data[KEY_CHAT_DATA_GAME].state,
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import random
+import unittest
+
+from pokerapp.entity.cards import (
+    DECK,
+    Card,
+    card_codes,
+    cards_mask,
+    get_cards,
+    mask_cards,
+    shuffled_codes,
+)
+from pokerapp.entity.game import Game
+from pokerapp.model.handevaluator import HandEvaluator
+from pokerapp.model.winnerdetermination import WinnerDetermination
+
+RANDOM_HANDS = 2000
+
+
+class TestHandEvaluator(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestHandEvaluator, self).__init__(*args, **kwargs)
+        self.evaluator = HandEvaluator()
+        self.determinator = WinnerDetermination()
+
+    def _assert_same_as_reference(self, cards):
+        want_hand, want_score = self.determinator._best_hand_score(
+            self.determinator._make_combinations(cards),
+        )
+        got_hand, got_score = self.evaluator.best_hand(cards)
+
+        self.assertEqual(want_score, got_score, cards)
+        self.assertListEqual(want_hand, got_hand, cards)
+
+    def test_random_hands_match_reference(self):
+        rnd = random.Random(7)
+        deck = get_cards()
+        for i in range(RANDOM_HANDS):
+            rnd.shuffle(deck)
+            self._assert_same_as_reference(deck[:5 + i % 3])
+
+    def test_special_hands_match_reference(self):
+        hands = [
+            "A♠ K♠ Q♠ J♠ 10♠ 9♠ 2♦",
+            "A♠ 2♠ 3♠ 4♠ 5♠ 6♦ 7♦",
+            "A♥ 2♦ 3♣ 4♠ 5♠ 9♦ K♣",
+            "A♥ A♦ A♣ A♠ K♠ K♦ K♣",
+            "9♥ 9♦ 9♣ 7♠ 7♥ 7♦ 2♣",
+            "Q♥ Q♦ J♣ J♠ 4♥ 4♦ 2♣",
+            "K♥ 9♥ 7♥ 5♥ 3♥ 2♥ A♦",
+            "2♥ 3♦ 4♣ 5♠ 6♥ 7♦ 8♣",
+        ]
+        for hand in hands:
+            self._assert_same_as_reference([Card(c) for c in hand.split()])
+
+    def test_card_codes_round_trip(self):
+        deck = get_cards()
+        codes = card_codes(deck)
+
+        self.assertListEqual(deck, [Card.from_code(c) for c in codes])
+        self.assertEqual(sorted(range(52)), sorted(codes))
+        self.assertEqual((1 << 52) - 1, cards_mask(deck))
+        self.assertCountEqual(deck[:7], mask_cards(cards_mask(deck[:7])))
+        self.assertEqual(Card("A♠").code, Card("A♤").code)
+
+    def test_decks_share_the_interned_cards(self):
+        deck = get_cards()
+
+        self.assertEqual(sorted(range(52)), sorted(shuffled_codes()))
+        self.assertEqual(set(map(id, DECK)), set(map(id, deck)))
+        self.assertNotEqual(deck, get_cards())
+
+    def test_game_shuffles_when_it_deals(self):
+        game = Game()
+        self.assertFalse(game.has_deck)
+
+        card = game.remain_cards.pop()
+        self.assertTrue(game.has_deck)
+        self.assertEqual(51, len(game.remain_cards))
+        self.assertNotIn(card, game.remain_cards)
+
+        game.reset()
+        self.assertFalse(game.has_deck)
+
+    def test_less_than_five_cards(self):
+        self.assertEqual(([], 0), self.evaluator.best_hand(
+            [Card("A♠"), Card("K♠")],
+        ))
+
+    def test_suit_isomorphic_hands_share_cache_entry(self):
+        evaluator = HandEvaluator(cache_size=2)
+        hand = [Card(c) for c in "K♥ 9♥ 7♥ 5♥ 3♥ 2♥ A♦".split()]
+        swapped = [Card(c) for c in "K♠ 9♠ 7♠ 5♠ 3♠ 2♠ A♣".split()]
+
+        best, score = evaluator.best_hand(hand)
+        swapped_best, swapped_score = evaluator.best_hand(swapped)
+
+        self.assertEqual(score, swapped_score)
+        self.assertListEqual(
+            [swapped[hand.index(c)] for c in best],
+            swapped_best,
+        )
+        info = evaluator.cache.info()
+        self.assertEqual((1, 1, 1), (info.hits, info.misses, info.size))
+
+    def test_cache_is_bounded(self):
+        evaluator = HandEvaluator(cache_size=2)
+        deck = get_cards()
+        for start in range(0, 35, 7):
+            evaluator.best_hand(deck[start:start + 7])
+
+        self.assertEqual(2, evaluator.cache.info().size)
+
+
+if __name__ == '__main__':
+    unittest.main()
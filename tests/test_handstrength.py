@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import random
+import unittest
+
+from pokerapp.entity.cards import Card, Cards, card_codes, get_cards
+from pokerapp.model.handevaluator import HandEvaluator
+from pokerapp.model.handstrength import HandStrength
+
+RANDOM_DEALS = 2000
+
+
+def cards(text: str) -> Cards:
+    return [Card(c) for c in text.split()]
+
+
+class TestHandStrength(unittest.TestCase):
+    def test_streets_match_full_evaluation(self):
+        rnd = random.Random(3)
+        deck = get_cards()
+        for _ in range(RANDOM_DEALS):
+            rnd.shuffle(deck)
+            strength = HandStrength(card_codes(deck[:2]))
+            for size in (5, 6, 7):
+                strength.add(card_codes(deck[strength.size:size]))
+                self.assertEqual(
+                    HandEvaluator.score_codes(card_codes(deck[:size])),
+                    strength.score(),
+                )
+
+    def test_categories(self):
+        def category(text: str) -> str:
+            return HandStrength(card_codes(cards(text))).category()
+
+        self.assertEqual("pair", category("A♠ A♥"))
+        self.assertEqual("high card", category("A♠ K♥"))
+        self.assertEqual("pair, flush draw", category("A♠ K♠ K♦ 7♠ 2♠"))
+        self.assertEqual(
+            "high card, straight draw, flush draw",
+            category("9♠ 8♠ 7♠ 6♦ 2♠ K♣"),
+        )
+        self.assertEqual("straight", category("A♠ 2♥ 3♦ 4♣ 5♠"))
+        self.assertEqual("three of a kind", category("Q♠ Q♥ Q♦ 4♣ 8♠ 9♠ 2♠"))
+        self.assertEqual("flush", category("Q♠ 3♠ 4♠ 8♠ 9♠"))
+
+
+if __name__ == '__main__':
+    unittest.main()
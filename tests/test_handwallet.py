@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+import unittest
+from uuid import uuid4
+
+import redis
+
+from pokerapp.config import Config
+from pokerapp.entity.game import Game
+from pokerapp.entity.player import Player
+from pokerapp.entity.userexception import UserException
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.model.handwallet import (
+    HandWallet,
+    reserve_hand,
+    settle_hand,
+    sweep_reservations,
+)
+from pokerapp.model.journal import history
+from pokerapp.model.walletmanagermodel import (
+    DEFAULT_MONEY,
+    WalletManagerModel,
+    wallet_values,
+)
+
+
+class TestHandWallet(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestHandWallet, self).__init__(*args, **kwargs)
+        cfg: Config = Config()
+        self._kv = redis.Redis(
+            host=cfg.REDIS_HOST,
+            port=cfg.REDIS_PORT,
+            db=cfg.REDIS_DB,
+            password=cfg.REDIS_PASS if cfg.REDIS_PASS != "" else None
+        )
+
+    def _game(self, players_count: int) -> Game:
+        game = Game()
+        for _ in range(players_count):
+            user_id = str(uuid4())
+            game.players.append(Player(
+                user_id=user_id,
+                user_name=user_id,
+                mention_markdown="@test",
+                wallet=WalletManagerModel(user_id, self._kv),
+                ready_message_id="",
+            ))
+        return game
+
+    def _stored(self, player: Player) -> int:
+        return WalletManagerModel(player.user_id, self._kv).available()
+
+    def test_bets_stay_in_memory_until_settled(self):
+        game = self._game(2)
+        winner, loser = game.players
+
+        reserve_hand(self._kv, game)
+
+        self.assertIsInstance(winner.wallet, HandWallet)
+        self.assertEqual(0, self._stored(winner))
+
+        winner.wallet.authorize(game.id, 100)
+        self.assertEqual(DEFAULT_MONEY, loser.wallet.authorize_all(game.id))
+        self.assertRaises(UserException, loser.wallet.authorize, game.id, 1)
+        winner.wallet.inc(100 + DEFAULT_MONEY)
+
+        self.assertEqual(0, self._stored(winner))
+
+        settle_hand(self._kv, game)
+
+        self.assertEqual(2 * DEFAULT_MONEY, self._stored(winner))
+        self.assertEqual(0, self._stored(loser))
+
+    def test_hand_reserves_what_the_others_can_win(self):
+        game = self._game(2)
+        rich, poor = game.players
+        rich.wallet.inc(500)
+        wallet = WalletManagerModel(rich.user_id, self._kv)
+
+        reserve_hand(self._kv, game)
+
+        self.assertEqual(DEFAULT_MONEY, rich.wallet.value())
+        self.assertEqual(DEFAULT_MONEY, poor.wallet.value())
+        self.assertEqual(500, wallet.available())
+        _, entries = history(self._kv, rich.user_id)
+        self.assertEqual(
+            ("reserve", DEFAULT_MONEY, 500),
+            (entries[-1].op, entries[-1].amount, entries[-1].money),
+        )
+        # The reserved stack is still money of the user, so an empty
+        # wallet can not be topped up during the hand.
+        self.assertEqual(DEFAULT_MONEY + 500, wallet.value())
+        self.assertEqual(
+            [DEFAULT_MONEY + 500, DEFAULT_MONEY],
+            wallet_values(self._kv, [
+                WalletManagerModel(p.user_id, self._kv) for p in game.players
+            ]),
+        )
+
+        rich.wallet.inc(DEFAULT_MONEY)
+        poor.wallet.authorize_all(game.id)
+        settle_hand(self._kv, game)
+
+        self.assertEqual(2 * DEFAULT_MONEY + 500, wallet.value())
+        self.assertEqual(2 * DEFAULT_MONEY + 500, wallet.available())
+
+    def test_hands_survive_a_script_flush(self):
+        game = self._game(2)
+        first, second = game.players
+        reserve_hand(self._kv, game)
+        first.wallet.authorize(game.id, 100)
+        second.wallet.inc(100)
+        settle_hand(self._kv, game)
+
+        # A restarted server or a replica taking over has no scripts.
+        self._kv.script_flush()
+
+        game = self._game(0)
+        for player in (first, second):
+            player.wallet = WalletManagerModel(player.user_id, self._kv)
+            game.players.append(player)
+        reserve_hand(self._kv, game)
+        self.assertEqual(DEFAULT_MONEY - 100, first.wallet.value())
+        first.wallet.authorize(game.id, 100)
+        second.wallet.inc(100)
+        settle_hand(self._kv, game)
+
+        self.assertEqual(DEFAULT_MONEY - 200, self._stored(first))
+        self.assertEqual(DEFAULT_MONEY + 200, self._stored(second))
+
+    def test_sweeper_returns_reservations_once(self):
+        game = self._game(1)
+        player = game.players[0]
+
+        reserve_hand(self._kv, game)
+        player.wallet.authorize(game.id, 100)
+
+        self.assertEqual(0, sweep_reservations(self._kv, max_age=3600))
+        self.assertGreaterEqual(sweep_reservations(self._kv, max_age=-1),
+                                DEFAULT_MONEY)
+        self.assertEqual(DEFAULT_MONEY, self._stored(player))
+
+        # The voided hand is not paid again.
+        settle_hand(self._kv, game)
+        self.assertEqual(DEFAULT_MONEY, self._stored(player))
+
+
+class TestHandWalletMemory(TestHandWallet):
+    def __init__(self, *args, **kwargs):
+        super(TestHandWalletMemory, self).__init__(*args, **kwargs)
+        self._kv = MemoryKv()
+
+    def test_hands_survive_a_script_flush(self):
+        self.skipTest("the memory backend has no script cache")
+
+
+if __name__ == '__main__':
+    unittest.main()
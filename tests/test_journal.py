@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import time
+import unittest
+from uuid import uuid4
+
+import redis
+
+from pokerapp.config import Config
+from pokerapp.entity.game import Game
+from pokerapp.entity.player import Player
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.model.handwallet import reserve_hand, settle_hand
+from pokerapp.model.journal import (
+    KEY_JOURNAL,
+    KEY_JOURNAL_COMPACTED,
+    compact_journal,
+    history,
+)
+from pokerapp.model.walletmanagermodel import (
+    DEFAULT_MONEY,
+    WalletManagerModel,
+)
+
+
+class TestJournal(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestJournal, self).__init__(*args, **kwargs)
+        cfg: Config = Config()
+        self._kv = redis.Redis(
+            host=cfg.REDIS_HOST,
+            port=cfg.REDIS_PORT,
+            db=cfg.REDIS_DB,
+            password=cfg.REDIS_PASS if cfg.REDIS_PASS != "" else None
+        )
+
+    def _ops(self, user_id: str):
+        _, entries = history(self._kv, user_id)
+        return [(e.op, e.amount, e.money) for e in entries]
+
+    def test_wallet_changes_are_journaled(self):
+        game_id = str(uuid4())
+        wallet = WalletManagerModel(str(uuid4()), self._kv)
+        wallet.inc(100)
+        wallet.add_daily(10)
+        wallet.authorize(game_id, 300)
+        wallet.approve(game_id)
+        wallet.approve(game_id)
+
+        self.assertEqual([
+            ("create", DEFAULT_MONEY, DEFAULT_MONEY),
+            ("inc", 100, DEFAULT_MONEY + 100),
+            ("daily", 10, DEFAULT_MONEY + 110),
+            ("authorize", 300, DEFAULT_MONEY - 190),
+            ("approve", 300, DEFAULT_MONEY - 190),
+        ], self._ops(wallet.user_id))
+
+        _, entries = history(self._kv, wallet.user_id)
+        self.assertEqual(game_id, entries[-1].game_id)
+
+    def test_hand_bets_are_written_with_the_settlement(self):
+        game = Game()
+        wallets = [
+            WalletManagerModel(str(uuid4()), self._kv) for _ in range(2)
+        ]
+        for wallet in wallets:
+            game.players.append(Player(
+                user_id=wallet.user_id,
+                user_name=wallet.user_id,
+                mention_markdown="@test",
+                wallet=wallet,
+                ready_message_id="",
+            ))
+
+        reserve_hand(self._kv, game)
+        winner, loser = game.players
+        loser.wallet.authorize(game.id, 200)
+        winner.wallet.authorize(game.id, 200)
+        self.assertEqual(
+            [("create", DEFAULT_MONEY, DEFAULT_MONEY),
+             ("reserve", DEFAULT_MONEY, 0)],
+            self._ops(loser.user_id),
+        )
+
+        winner.wallet.inc(400)
+        settle_hand(self._kv, game)
+
+        self.assertEqual([
+            ("create", DEFAULT_MONEY, DEFAULT_MONEY),
+            ("reserve", DEFAULT_MONEY, 0),
+            ("bet", 200, DEFAULT_MONEY - 200),
+            ("win", 400, DEFAULT_MONEY + 200),
+            ("settle", DEFAULT_MONEY + 200, DEFAULT_MONEY + 200),
+        ], self._ops(winner.user_id))
+        self.assertEqual(
+            ("settle", DEFAULT_MONEY - 200, DEFAULT_MONEY - 200),
+            self._ops(loser.user_id)[-1],
+        )
+
+    def test_checkpoint_after_a_reserve_is_the_wallet(self):
+        game = Game()
+        wallets = [
+            WalletManagerModel(str(uuid4()), self._kv) for _ in range(2)
+        ]
+        wallets[0].inc(500)
+        for wallet in wallets:
+            game.players.append(Player(
+                user_id=wallet.user_id,
+                user_name=wallet.user_id,
+                mention_markdown="@test",
+                wallet=wallet,
+                ready_message_id="",
+            ))
+
+        reserve_hand(self._kv, game)
+        time.sleep(0.01)
+        compact_journal(self._kv, retention=0)
+
+        checkpoint, _ = history(self._kv, wallets[0].user_id)
+        self.assertEqual("reserve", checkpoint["op"])
+        self.assertEqual(500, checkpoint["money"])
+        self.assertEqual(500, wallets[0].available())
+
+    def test_compaction_keeps_the_last_balance(self):
+        wallet = WalletManagerModel(str(uuid4()), self._kv)
+        wallet.inc(50)
+        wallet.inc(-20)
+        time.sleep(0.01)
+
+        self.assertGreaterEqual(
+            compact_journal(self._kv, retention=0, batch=2), 3,
+        )
+
+        checkpoint, entries = history(self._kv, wallet.user_id)
+        self.assertEqual([], entries)
+        self.assertEqual("inc", checkpoint["op"])
+        self.assertEqual(DEFAULT_MONEY + 30, checkpoint["money"])
+        self.assertIsNotNone(self._kv.get(KEY_JOURNAL_COMPACTED))
+
+        wallet.inc(5)
+        self.assertEqual(0, compact_journal(self._kv))
+        self.assertEqual(
+            [("inc", 5, DEFAULT_MONEY + 35)],
+            self._ops(wallet.user_id),
+        )
+
+
+class TestJournalMemory(TestJournal):
+    def __init__(self, *args, **kwargs):
+        super(TestJournalMemory, self).__init__(*args, **kwargs)
+        self._kv = MemoryKv()
+
+    def test_stream_log_is_replayed(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        kv = MemoryKv(stream_log=path)
+        wallet = WalletManagerModel("1", kv)
+        wallet.inc(25)
+        kv.close()
+
+        kv = MemoryKv(stream_log=path)
+        self.assertEqual(2, kv.xlen(KEY_JOURNAL))
+        _, entries = history(kv, "1")
+        self.assertEqual(["create", "inc"], [e.op for e in entries])
+
+        time.sleep(0.01)
+        compact_journal(kv, retention=0)
+        kv.close()
+        self.assertEqual(0, MemoryKv(stream_log=path).xlen(KEY_JOURNAL))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from pokerapp.entity.game import Game
+from pokerapp.entity.player import Player
+from pokerapp.kv.batch import ReadBatch
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.kv.metrics import (
+    LATENCY_BUCKETS_SEC,
+    PIPELINE,
+    InstrumentedKv,
+    LatencyHistogram,
+)
+from pokerapp.model.handwallet import HandWallet, reserve_hand, settle_hand
+from pokerapp.model.privatechatmodel import UserPrivateChatModel
+from pokerapp.model.walletmanagermodel import (
+    DEFAULT_MONEY,
+    WalletManagerModel,
+    wallet_values,
+)
+
+
+class TestKvMetrics(unittest.TestCase):
+    def test_histogram_quantiles(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.quantile(0.5))
+        for _ in range(99):
+            histogram.observe(LATENCY_BUCKETS_SEC[0] / 2)
+        histogram.observe(LATENCY_BUCKETS_SEC[-1] * 2)
+
+        self.assertEqual(LATENCY_BUCKETS_SEC[0], histogram.quantile(0.5))
+        self.assertEqual(LATENCY_BUCKETS_SEC[0], histogram.quantile(0.99))
+        self.assertEqual(float("inf"), histogram.quantile(1.0))
+
+    def test_pipeline_is_one_round_trip(self):
+        kv = InstrumentedKv(MemoryKv())
+        kv.set("a", 1)
+        pipe = kv.pipeline()
+        pipe.get("a")
+        pipe.incrby("a", 2)
+        self.assertEqual([b"1", 3], pipe.execute())
+        kv.pipeline().execute()
+
+        report = kv.metrics.report()
+        self.assertEqual(2, report["round_trips"])
+        self.assertEqual({"get": 1, "incrby": 1, "set": 1},
+                         report["commands"])
+        self.assertEqual(1, report["latency"][PIPELINE]["count"])
+
+    def test_read_batch_sends_reads_together(self):
+        kv = InstrumentedKv(MemoryKv())
+        kv.set("a", 1)
+        kv.hset("h", "f", 2)
+        kv.metrics.reset()
+
+        batch = ReadBatch(kv)
+        a = batch.get("a")
+        f = batch.hget("h", "f")
+        missing = batch.get("missing")
+        self.assertEqual(0, kv.metrics.round_trips)
+
+        self.assertEqual(b"2", f.result())
+        self.assertEqual((b"1", None), (a.result(), missing.result()))
+        self.assertEqual(1, kv.metrics.round_trips)
+
+    def test_wallet_values(self):
+        kv = InstrumentedKv(MemoryKv())
+        wallets = [WalletManagerModel(str(i), kv) for i in range(5)]
+        wallets[0].inc(10)
+        wallets.append(HandWallet("5", "game", 7))
+        kv.metrics.reset()
+
+        self.assertEqual(
+            [DEFAULT_MONEY + 10] + [DEFAULT_MONEY] * 4 + [7],
+            wallet_values(kv, wallets),
+        )
+        self.assertEqual(1, kv.metrics.round_trips)
+
+    def test_replace_messages(self):
+        kv = InstrumentedKv(MemoryKv())
+        chat = UserPrivateChatModel("1", kv)
+        chat.push_message(1)
+        chat.push_message(2)
+        kv.metrics.reset()
+
+        self.assertEqual([b"1", b"2"], chat.replace_messages(3))
+        self.assertEqual(1, kv.metrics.round_trips)
+        self.assertEqual(b"3", chat.pop_message())
+        self.assertIsNone(chat.pop_message())
+
+    def test_round_trips_per_hand(self):
+        kv = InstrumentedKv(MemoryKv())
+        wallets = [WalletManagerModel(str(i), kv) for i in range(6)]
+
+        def play_hand() -> None:
+            game = Game()
+            for wallet in wallets:
+                game.players.append(Player(
+                    user_id=wallet.user_id,
+                    user_name=wallet.user_id,
+                    mention_markdown="@test",
+                    wallet=wallet,
+                    ready_message_id="",
+                ))
+            reserve_hand(kv, game)
+            for player in game.players:
+                player.wallet.authorize(game.id, 10)
+            settle_hand(kv, game)
+            kv.metrics.hand_finished()
+
+        # The first hand also loads the scripts.
+        play_hand()
+        kv.metrics.reset()
+        play_hand()
+        play_hand()
+
+        # One reservation and one settlement pipeline.
+        self.assertEqual(2, kv.metrics.round_trips_per_hand())
+
+
+if __name__ == '__main__':
+    unittest.main()
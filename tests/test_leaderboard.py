@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import unittest
+from uuid import uuid4
+
+import redis
+
+from pokerapp.config import Config
+from pokerapp.entity.game import Game
+from pokerapp.entity.player import Player
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.model.handwallet import reserve_hand, settle_hand
+from pokerapp.model.kvschema import leaderboard_key
+from pokerapp.model.leaderboard import Leaderboard
+from pokerapp.model.walletmanagermodel import (
+    DEFAULT_MONEY,
+    WalletManagerModel,
+)
+from scripts.rebuild_leaderboard import rebuild
+
+
+class TestLeaderboard(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestLeaderboard, self).__init__(*args, **kwargs)
+        cfg: Config = Config()
+        self._kv = redis.Redis(
+            host=cfg.REDIS_HOST,
+            port=cfg.REDIS_PORT,
+            db=cfg.REDIS_DB,
+            password=cfg.REDIS_PASS if cfg.REDIS_PASS != "" else None
+        )
+
+    def _score(self, user_id: str, chat_id: str = None) -> int:
+        return int(self._kv.zscore(leaderboard_key(chat_id), user_id))
+
+    def test_scores_follow_every_balance_change(self):
+        chat_id = str(uuid4())
+        board = Leaderboard(self._kv)
+        rich = WalletManagerModel(str(uuid4()), self._kv)
+        poor = WalletManagerModel(str(uuid4()), self._kv)
+        board.join(chat_id, rich.user_id, "Rich_Guy")
+        board.join(chat_id, poor.user_id, "Poor")
+
+        rich.inc(500)
+        rich.add_daily(10)
+        self.assertEqual(DEFAULT_MONEY + 510, self._score(rich.user_id))
+        self.assertEqual(
+            DEFAULT_MONEY + 510,
+            self._score(rich.user_id, chat_id),
+        )
+
+        game = Game()
+        for wallet in (rich, poor):
+            game.players.append(Player(
+                user_id=wallet.user_id,
+                user_name=wallet.user_id,
+                mention_markdown="@test",
+                wallet=wallet,
+                ready_message_id="",
+            ))
+        reserve_hand(self._kv, game)
+        # Reserved stacks still count.
+        self.assertEqual(DEFAULT_MONEY, self._score(poor.user_id, chat_id))
+
+        game.players[1].wallet.authorize(game.id, 300)
+        game.players[0].wallet.inc(300)
+        settle_hand(self._kv, game)
+        self.assertEqual(DEFAULT_MONEY - 300, self._score(poor.user_id))
+        self.assertEqual(
+            DEFAULT_MONEY + 810,
+            self._score(rich.user_id, chat_id),
+        )
+
+        entries = board.page(chat_id=chat_id)
+        self.assertEqual([1, 2], [e.place for e in entries])
+        self.assertEqual(["Rich_Guy", "Poor"], [e.name for e in entries])
+        self.assertEqual(DEFAULT_MONEY + 810, entries[0].money)
+        self.assertEqual(2, board.size(chat_id))
+
+        second = board.page(chat_id=chat_id, page=1, size=1)
+        self.assertEqual([(2, poor.user_id)],
+                         [(e.place, e.user_id) for e in second])
+        self.assertEqual([], board.page(chat_id=chat_id, page=1))
+
+    def test_rebuild(self):
+        chat_id = str(uuid4())
+        wallet = WalletManagerModel(str(uuid4()), self._kv)
+        Leaderboard(self._kv).join(chat_id, wallet.user_id, "Name")
+        wallet.inc(42)
+        self._kv.delete(leaderboard_key(chat_id))
+        self._kv.zrem(leaderboard_key(), wallet.user_id)
+
+        self.assertGreaterEqual(rebuild(self._kv, sleep=0), 1)
+
+        self.assertEqual(DEFAULT_MONEY + 42, self._score(wallet.user_id))
+        self.assertEqual(
+            DEFAULT_MONEY + 42,
+            self._score(wallet.user_id, chat_id),
+        )
+
+
+class TestLeaderboardMemory(TestLeaderboard):
+    def __init__(self, *args, **kwargs):
+        super(TestLeaderboardMemory, self).__init__(*args, **kwargs)
+        self._kv = MemoryKv()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+import unittest
+
+import redis
+
+from pokerapp.config import Config
+from pokerapp.kv.backend import KvBackend
+from pokerapp.kv.factory import create_kv
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.kv.script import LuaScript
+
+
+def _swap_python(kv, keys, args):
+    first = kv.get(keys[0])
+    kv.set(keys[0], kv.get(keys[1]))
+    kv.set(keys[1], first)
+    return int(args[0])
+
+
+_swap = LuaScript(
+    "local a = redis.call('GET', KEYS[1]) "
+    "redis.call('SET', KEYS[1], redis.call('GET', KEYS[2])) "
+    "redis.call('SET', KEYS[2], a) return tonumber(ARGV[1])",
+    _swap_python,
+)
+
+
+class TestMemoryKv(unittest.TestCase):
+    def test_strings(self):
+        kv = MemoryKv()
+        self.assertTrue(kv.set("a", 1))
+        self.assertIsNone(kv.set("a", 2, nx=True))
+        self.assertEqual(b"1", kv.get("a"))
+        self.assertEqual(11, kv.incrby("a", 10))
+        self.assertEqual(-1, kv.incrby("b", -1))
+        self.assertEqual(2, kv.delete("a", "b", "c"))
+        self.assertIsNone(kv.get("a"))
+
+    def test_expiry(self):
+        kv = MemoryKv()
+        kv.set("a", "x", px=20)
+        kv.hset("h", "f", 1)
+        self.assertEqual(-1, kv.ttl("h"))
+        self.assertTrue(kv.expire("h", 100))
+        self.assertGreater(kv.ttl("h"), 0)
+        self.assertEqual(-2, kv.ttl("missing"))
+        time.sleep(0.03)
+        self.assertIsNone(kv.get("a"))
+        self.assertEqual(0, kv.exists("a"))
+
+    def test_hashes_and_lists(self):
+        kv = MemoryKv()
+        self.assertEqual(1, kv.hsetnx("h", "money", 5))
+        self.assertEqual(0, kv.hsetnx("h", "money", 7))
+        self.assertEqual(8, kv.hincrby("h", "money", 3))
+        self.assertEqual({b"money": b"8"}, kv.hgetall("h"))
+        self.assertEqual(1, kv.hdel("h", "money"))
+        self.assertEqual(0, kv.exists("h"))
+
+        self.assertEqual(2, kv.rpush("l", 1, 2))
+        self.assertEqual(b"2", kv.rpop("l"))
+        self.assertEqual([b"1"], kv.lrange("l", 0, -1))
+        self.assertRaises(redis.exceptions.ResponseError, kv.hget, "l", "f")
+
+        kv.rpush("l", 2, 3)
+        self.assertEqual(b"1", kv.lpop("l"))
+        self.assertEqual([b"2", b"3"], kv.lpop("l", 5))
+        self.assertIsNone(kv.lpop("l", 5))
+
+    def test_sorted_sets(self):
+        kv = MemoryKv()
+        kv.zadd("z", {"a": 3, "b": 1, "c": 2})
+        self.assertEqual([b"b", b"c"], kv.zrangebyscore("z", "-inf", 2))
+        self.assertEqual([b"c"], kv.zrangebyscore("z", "(1", "(3"))
+        self.assertEqual([b"a", b"c"], kv.zrevrange("z", 0, 1))
+        self.assertEqual(5.0, kv.zincrby("z", 4, "b"))
+        self.assertEqual(0, kv.zrevrank("z", "b"))
+        self.assertEqual(1, kv.zrem("z", "b", "d"))
+
+    def test_streams(self):
+        kv = MemoryKv()
+        first = kv.xadd("s", {"a": 1}, id="5-0")
+        kv.xadd("s", {"a": 2}, id="5-1")
+        last = kv.xadd("s", {"a": 3})
+        self.assertEqual(b"5-0", first)
+        self.assertRaises(
+            redis.exceptions.ResponseError, kv.xadd, "s", {}, id="5-1",
+        )
+        self.assertEqual(
+            [(b"5-1", {b"a": b"2"})],
+            kv.xrange("s", "5-1", "5"),
+        )
+        self.assertEqual(2, kv.xtrim("s", minid=last, approximate=False))
+        self.assertEqual([last], [i for i, _ in kv.xrange("s")])
+
+    def test_scan_visits_every_key(self):
+        kv = MemoryKv()
+        for i in range(25):
+            kv.set("pokerbot:" + str(i), i)
+        kv.set("other", 0)
+
+        found, cursor = [], 0
+        while True:
+            cursor, keys = kv.scan(cursor, match="pokerbot:*", count=7)
+            found.extend(keys)
+            if cursor == 0:
+                break
+        self.assertEqual(25, len(set(found)))
+
+    def test_scan_is_not_shifted_by_deleted_keys(self):
+        kv = MemoryKv()
+        for i in range(10):
+            kv.set("k" + str(i), i)
+
+        found, cursor = [], 0
+        while True:
+            cursor, keys = kv.scan(cursor, count=3)
+            found.extend(keys)
+            kv.delete(*keys)
+            if cursor == 0:
+                break
+        self.assertEqual(10, len(found))
+
+    def test_pipeline_and_scripts(self):
+        kv = MemoryKv()
+        kv.set("x", "1")
+        kv.set("y", "2")
+
+        self.assertEqual(7, _swap(kv, ["x", "y"], [7]))
+        self.assertEqual((b"2", b"1"), (kv.get("x"), kv.get("y")))
+
+        pipe = kv.pipeline(transaction=True)
+        pipe.incrby("n", 2)
+        _swap.queue(pipe, ["x", "y"], [1])
+        pipe.get("x")
+        self.assertEqual([2, 1, b"1"], pipe.execute())
+
+        self.assertRaises(
+            redis.exceptions.ResponseError,
+            kv.script_load, "return 1",
+        )
+
+    def test_commands_are_atomic_across_threads(self):
+        kv = MemoryKv()
+
+        def work():
+            for _ in range(1000):
+                kv.hincrby("h", "money", 1)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(b"4000", kv.hget("h", "money"))
+
+    def test_create_kv(self):
+        cfg = Config()
+        cfg.KV_BACKEND = "memory"
+        self.assertIsInstance(create_kv(cfg), MemoryKv)
+        cfg.KV_BACKEND = "redis"
+        self.assertIsInstance(create_kv(cfg), KvBackend)
+        cfg.KV_BACKEND = "sqlite"
+        self.assertRaises(ValueError, create_kv, cfg)
+
+
+if __name__ == '__main__':
+    unittest.main()
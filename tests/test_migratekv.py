@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import unittest
+from uuid import uuid4
+
+import redis
+
+from pokerapp.config import Config
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.model.kvschema import game_key, user_key, user_messages_key
+from pokerapp.model.walletmanagermodel import WalletManagerModel
+from scripts.migrate_kv import migrate, new_location
+
+
+class TestMigrateKv(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestMigrateKv, self).__init__(*args, **kwargs)
+        cfg: Config = Config()
+        self._kv = redis.Redis(
+            host=cfg.REDIS_HOST,
+            port=cfg.REDIS_PORT,
+            db=cfg.REDIS_DB,
+            password=cfg.REDIS_PASS if cfg.REDIS_PASS != "" else None
+        )
+
+    def test_new_location(self):
+        self.assertEqual(
+            ("field", "pokerbot:user:7", "money", 0),
+            new_location("pokerbot:7"),
+        )
+        self.assertEqual("daily", new_location("pokerbot:7:daily")[2])
+        self.assertEqual("hand:g", new_location("pokerbot:7:hand:g")[2])
+        self.assertEqual(
+            ("rename", "pokerbot:user:7:messages", None, 0),
+            new_location("pokerbot:chats:7:messages"),
+        )
+        kind, key, field, ttl = new_location("pokerbot:7:g")
+        self.assertEqual(("pokerbot:game:g", "7"), (key, field))
+        self.assertGreater(ttl, 0)
+        self.assertIsNone(new_location("pokerbot:user:7"))
+        self.assertIsNone(new_location("pokerbot:game:g"))
+        self.assertIsNone(new_location("pokerbot:hands"))
+        self.assertIsNone(new_location("pokerbot:top"))
+        self.assertIsNone(new_location("pokerbot:top:-100"))
+        self.assertIsNone(new_location("pokerbot:journal"))
+        self.assertIsNone(new_location("pokerbot:journal:checkpoint"))
+        self.assertIsNone(new_location("pokerbot:snapshot:-100"))
+        self.assertIsNone(new_location("pokerbot:lease:-100"))
+        self.assertIsNone(new_location("pokerbot:inbox:node"))
+
+    def test_migrate(self):
+        user_id = str(uuid4())
+        game_id = str(uuid4())
+        self._kv.set("pokerbot:" + user_id, 750)
+        self._kv.set("pokerbot:" + user_id + ":daily", "18/10/26")
+        self._kv.set("pokerbot:" + user_id + ":" + game_id, 250)
+        self._kv.set("pokerbot:chats:" + user_id, 42)
+        self._kv.rpush("pokerbot:chats:" + user_id + ":messages", 1, 2)
+
+        dry = migrate(self._kv, batch=3, sleep=0, dry_run=True)
+        self.assertGreaterEqual(dry["planned"], 5)
+        self.assertEqual(0, dry["moved"])
+
+        migrate(self._kv, batch=3, sleep=0)
+
+        self.assertEqual(0, self._kv.exists(
+            "pokerbot:" + user_id,
+            "pokerbot:" + user_id + ":daily",
+            "pokerbot:" + user_id + ":" + game_id,
+            "pokerbot:chats:" + user_id,
+            "pokerbot:chats:" + user_id + ":messages",
+        ))
+        wallet = WalletManagerModel(user_id, self._kv)
+        self.assertEqual(750, wallet.value())
+        self.assertEqual(250, wallet.authorized_money(game_id))
+        self.assertGreater(self._kv.ttl(game_key(game_id)), 0)
+        self.assertEqual(b"42", self._kv.hget(user_key(user_id), "chat_id"))
+        self.assertEqual(
+            [b"1", b"2"],
+            self._kv.lrange(user_messages_key(user_id), 0, -1),
+        )
+
+    def test_newer_values_are_kept(self):
+        for kv in (self._kv, MemoryKv()):
+            user_id = str(uuid4())
+            kv.set("pokerbot:" + user_id, 750)
+            kv.rpush("pokerbot:chats:" + user_id + ":messages", 1)
+            # Written by the new code after the deploy.
+            kv.hset(user_key(user_id), "money", 900)
+            kv.rpush(user_messages_key(user_id), 2)
+
+            migrate(kv, batch=3, sleep=0)
+
+            self.assertEqual(0, kv.exists(
+                "pokerbot:" + user_id,
+                "pokerbot:chats:" + user_id + ":messages",
+            ))
+            self.assertEqual(900, WalletManagerModel(user_id, kv).value())
+            self.assertEqual(
+                [b"2"],
+                kv.lrange(user_messages_key(user_id), 0, -1),
+            )
+
+    def test_migrate_memory_kv(self):
+        kv = MemoryKv()
+        kv.set("pokerbot:7", 750)
+        kv.set("pokerbot:7:g", 250)
+        kv.rpush("pokerbot:chats:7:messages", 1, 2)
+
+        self.assertEqual(3, migrate(kv, batch=2, sleep=0)["moved"])
+        wallet = WalletManagerModel("7", kv)
+        self.assertEqual(750, wallet.value())
+        self.assertEqual(250, wallet.authorized_money("g"))
+        self.assertGreater(kv.ttl(game_key("g")), 0)
+        self.assertEqual(
+            [b"1", b"2"],
+            kv.lrange(user_messages_key("7"), 0, -1),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
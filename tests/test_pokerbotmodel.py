@@ -1,19 +1,25 @@
 #!/usr/bin/env python3
 
+import time
 import unittest
+from concurrent.futures import Future
 from unittest.mock import MagicMock
 
 from telegram import Bot, Update
 from telegram.ext import CallbackContext
 
 from pokerapp.config import Config
-from pokerapp.entity.cards import Cards, get_cards
+from pokerapp.entity.cards import Card, Cards, get_cards
+from pokerapp.entity.equity import PlayerEquity
 from pokerapp.entity.game import Game
 from pokerapp.entity.gamestate import GameState
 from pokerapp.entity.player import Player
 from pokerapp.entity.playerbet import PlayerBet
+from pokerapp.entity.playerstate import PlayerState
 from pokerapp.entity.wallet import Wallet
+from pokerapp.model.equitycalculator import EquityCalculator
 from pokerapp.model.pokerbotmodel import PokerBotModel, KEY_OLD_PLAYERS
+from pokerapp.model.walletmanagermodel import WalletRegistry
 from pokerapp.view.pokerbotview import PokerBotViewer
 
 
@@ -22,19 +28,29 @@ class TestPokerBotModel(unittest.TestCase):
     def __init__(self, *args, **kwargs):
         super(TestPokerBotModel, self).__init__(*args, **kwargs)
 
-        self._model: PokerBotModel = PokerBotModel(MagicMock(spec=PokerBotViewer), MagicMock(spec=Bot),
-                                                   MagicMock(spec=Config), None)
+        self._model: PokerBotModel = PokerBotModel(
+            MagicMock(spec=PokerBotViewer),
+            MagicMock(spec=Bot),
+            MagicMock(spec=Config),
+            None,
+        )
         self._view = MagicMock(spec=PokerBotViewer)
         self._view.text = ''
-        self._view.send_message_reply = lambda chat_id, message_id, text: setattr(self._view, 'text', text)
-        self._view.send_message = lambda chat_id, text, reply_markup=None: setattr(self._view, 'text', text)
+        self._view.send_message_reply = \
+            lambda chat_id, message_id, text: setattr(self._view, 'text', text)
+        self._view.send_message = \
+            lambda chat_id, text, reply_markup=None: \
+            setattr(self._view, 'text', text)
         self._model._view = self._view
 
         self._kv = MagicMock(spec=dict)
-        self._kv.get = lambda key: 0
+        self._kv.hget = lambda name, key: 0
         self._kv.inc_amount = 0
-        self._kv.incrby = lambda name, amount: setattr(self._kv, 'inc_amount', amount)
+        self._kv.hincrby = \
+            lambda name, key, amount: setattr(self._kv, 'inc_amount', amount)
+        self._kv.hsetnx = lambda name, key, value: None
         self._model._kv = self._kv
+        self._model._wallets = WalletRegistry(self._kv)
 
         self._cfg = MagicMock(spec=Config)
         self._cfg.DEBUG = False
@@ -42,10 +58,14 @@ class TestPokerBotModel(unittest.TestCase):
 
     @staticmethod
     def _create_player(user_id: str, cards: []) -> Player:
-        player: Player = Player(user_id, user_id, user_id, MagicMock(spec=Wallet), '0')
+        player: Player = Player(
+            user_id, user_id, user_id, MagicMock(spec=Wallet), '0',
+        )
         player.user_id = user_id
-        player.test_amount = 0
-        player.wallet.inc = lambda amount: setattr(player, 'test_amount', player.test_amount + amount)
+        player.wallet.test_amount = 0
+        player.wallet.inc = lambda amount: setattr(
+            player.wallet, 'test_amount', player.wallet.test_amount + amount,
+        )
         player.cards = cards
         player.mention_markdown = user_id
         return player
@@ -68,15 +88,20 @@ class TestPokerBotModel(unittest.TestCase):
         update = MagicMock(spec=Update)
         context = MagicMock(spec=CallbackContext)
 
-        self.assertEqual(0, player_one.test_amount)
-        self.assertEqual(0, player_two.test_amount)
-        self.assertEqual(0, player_three.test_amount)
+        self.assertEqual(0, player_one.wallet.test_amount)
+        self.assertEqual(0, player_two.wallet.test_amount)
+        self.assertEqual(0, player_three.wallet.test_amount)
+
+        odds = Future()
+        self._model._all_in_equity[game.id] = (["1", "3"], odds, 0.0)
 
         self._model.reset_game(update, context)
 
-        self.assertEqual(6, player_one.test_amount)
-        self.assertEqual(0, player_two.test_amount)
-        self.assertEqual(10, player_three.test_amount)
+        self.assertEqual(6, player_one.wallet.test_amount)
+        self.assertEqual(0, player_two.wallet.test_amount)
+        self.assertEqual(10, player_three.wallet.test_amount)
+        self.assertEqual({}, self._model._all_in_equity)
+        self.assertTrue(odds.cancelled())
 
     def test_create_final_result_text(self):
         cards: Cards = get_cards()
@@ -106,6 +131,94 @@ class TestPokerBotModel(unittest.TestCase):
             "/ready to continue"
         ), text)
 
+    def test_create_final_result_text_with_returned_bet(self):
+        player_one: Player = self._create_player(
+            "Player 1", [Card("A♠"), Card("A♥")],
+        )
+        player_two: Player = self._create_player(
+            "Player 2", [Card("K♠"), Card("K♥")],
+        )
+
+        game: Game = MagicMock(spec=Game)
+        game.cards_table = [
+            Card("2♣"), Card("7♦"), Card("9♠"), Card("J♣"), Card("4♥"),
+        ]
+
+        text = self._model._create_final_result_text(
+            [player_one, player_two],
+            game,
+            False,
+            [[player_one, player_one.cards, 100]],
+            returned_bets=[(player_two, 40)],
+        )
+
+        self.assertEqual(1, text.count("GOT:"))
+        self.assertEqual(1, text.count("Winning hand:"))
+        self.assertIn("Player 2:\nRETURNED BET: *40 $*\n", text)
+
+    def test_create_final_result_text_with_all_in_equity(self):
+        player_one: Player = self._create_player(
+            "Player 1", [Card("A♠"), Card("A♥")],
+        )
+        player_two: Player = self._create_player(
+            "Player 2", [Card("K♠"), Card("K♥")],
+        )
+
+        game: Game = MagicMock(spec=Game)
+        game.cards_table = [
+            Card("2♣"), Card("7♦"), Card("9♠"), Card("J♣"), Card("4♥"),
+        ]
+
+        text = self._model._create_final_result_text(
+            [player_one, player_two],
+            game,
+            False,
+            [[player_one, player_one.cards, 100]],
+            {
+                "Player 1": PlayerEquity(81.3, 0.4),
+                "Player 2": PlayerEquity(18.3, 0.4),
+            },
+        )
+
+        self.assertTrue(text.endswith((
+            "All-in odds:\n"
+            "Player 1: 81.3% win, 0.4% tie\n"
+            "Player 2: 18.3% win, 0.4% tie\n\n"
+            "/ready to continue"
+        )), text)
+
+    def test_all_in_equity_is_collected_at_the_finish(self):
+        self._model._equity = EquityCalculator(trials=1000, workers=0)
+        game = Game()
+        game.players = [
+            self._create_player("1", [Card("A♠"), Card("A♥")]),
+            self._create_player("2", [Card("K♠"), Card("K♥")]),
+        ]
+        for player in game.players:
+            player.state = PlayerState.ALL_IN
+        game.cards_table = [Card("2♣"), Card("7♦"), Card("9♠")]
+        used = game.cards_table + [c for p in game.players for c in p.cards]
+        game.remain_cards = [c for c in get_cards() if c not in used]
+
+        self._model._calculate_all_in_equity(game)
+        self.assertEqual({}, game.all_in_equity)
+
+        self._model._collect_all_in_equity(game)
+        self.assertEqual({"1", "2"}, set(game.all_in_equity))
+        self.assertGreater(game.all_in_equity["1"].win, 50)
+
+    def test_late_all_in_equity_is_left_out(self):
+        game = Game()
+        odds = Future()
+        self._model._all_in_equity[game.id] = (
+            ["1", "2"], odds, time.monotonic() + 0.01,
+        )
+
+        self._model._collect_all_in_equity(game)
+        self.assertEqual({}, game.all_in_equity)
+        self.assertEqual({}, self._model._all_in_equity)
+        self.assertTrue(odds.cancelled())
+
     def test_top_up(self):
         model = self._model
 
@@ -124,7 +237,7 @@ class TestPokerBotModel(unittest.TestCase):
     def test_top_up__should_not_top_up_when_wallet_not_empty(self):
         model = self._model
 
-        model._kv.get = lambda key: 1
+        model._kv.hget = lambda name, key: 1
 
         model._game_from_context = lambda a: Game()
 
@@ -166,7 +279,7 @@ class TestPokerBotModel(unittest.TestCase):
     def test_ready(self):
         model = self._model
 
-        model._kv.get = lambda key: 1000
+        model._kv.hget = lambda name, key: 1000
 
         game = Game()
         game.state = GameState.INITIAL
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from pokerapp.constants import MAX_PLAYERS, MIN_PLAYERS
+from pokerapp.entity.cards import Card, Cards, card_codes
+from pokerapp.model.preflopequity import (
+    HAND_CLASSES,
+    PreflopEquityTable,
+    hand_class,
+    hand_class_codes,
+    hand_class_name,
+)
+
+
+def cards(text: str) -> Cards:
+    return [Card(c) for c in text.split()]
+
+
+class TestPreflopEquity(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestPreflopEquity, self).__init__(*args, **kwargs)
+        self._table = PreflopEquityTable()
+
+    def test_hand_classes(self):
+        def name(text: str) -> str:
+            return hand_class_name(hand_class(card_codes(cards(text))))
+
+        self.assertEqual("AA", name("A♠ A♥"))
+        self.assertEqual("AKs", name("K♦ A♦"))
+        self.assertEqual("T9o", name("9♣ 10♦"))
+
+        names = {hand_class_name(i) for i in range(HAND_CLASSES)}
+        self.assertEqual(HAND_CLASSES, len(names))
+        for i in range(HAND_CLASSES):
+            self.assertEqual(i, hand_class(hand_class_codes(i)))
+
+    def test_heads_up_equity(self):
+        equity = self._table.equity(cards("A♠ A♥"), 2)
+        self.assertAlmostEqual(85.2, equity.equity, delta=1)
+
+        equity = self._table.equity(cards("7♠ 2♥"), 2)
+        self.assertAlmostEqual(34.6, equity.equity, delta=1)
+
+    def test_equity_decreases_with_players(self):
+        win = [
+            self._table.equity(cards("A♠ A♥"), players).win
+            for players in range(MIN_PLAYERS, MAX_PLAYERS + 1)
+        ]
+        self.assertListEqual(sorted(win, reverse=True), win)
+
+    def test_players_out_of_range(self):
+        for players in (MIN_PLAYERS - 1, MAX_PLAYERS + 1):
+            with self.assertRaises(ValueError):
+                self._table.equity(cards("A♠ A♥"), players)
+            with self.assertRaises(ValueError):
+                self._table.ranking(players)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pokerapp.entity.cards import Card, Cards
+from pokerapp.model.equitycalculator import EquityCalculator
+from pokerapp.model.rangeequity import HandRange, parse_range, range_equity
+
+
+def cards(text: str) -> Cards:
+    return [Card(c) for c in text.split()]
+
+
+class TestRangeParser(unittest.TestCase):
+    def test_combo_counts(self):
+        counts = {
+            "AA": 6,
+            "AKs": 4,
+            "AKo": 12,
+            "AK": 16,
+            "QQ+": 18,
+            "ATs+": 16,
+            "99-66": 24,
+            "76s-54s": 12,
+            "A5s-A2s": 16,
+            "AhKh": 1,
+            "A♥K♥, AKs": 4,
+            "top 100%": 1326,
+        }
+        for text, count in counts.items():
+            self.assertEqual(count, len(parse_range(text)), text)
+
+    def test_top_percent_starts_with_aces(self):
+        top = parse_range("top 0.4%")
+
+        self.assertEqual(len(parse_range("AA")), len(top))
+        self.assertEqual(parse_range("AA").weights.tolist(),
+                         top.weights.tolist())
+
+    def test_weights(self):
+        hand_range = parse_range("AKs:0.5, AKo, AhKh:0.25")
+
+        self.assertAlmostEqual(3 * 0.5 + 12 + 0.25, hand_range.weights.sum())
+
+    def test_invalid_tokens(self):
+        for text in ("AKx", "top", "AhAh", "AK:x", "76s-A2s", "AKs-AKo"):
+            self.assertRaises(ValueError, parse_range, text)
+
+
+class TestRangeEquity(unittest.TestCase):
+    def test_single_hands_match_equity_calculator(self):
+        hero, villain = cards("A♠ A♥"), cards("K♠ Q♠")
+        board = cards("2♠ 7♠ J♦")
+
+        result = range_equity(
+            HandRange.from_cards(hero),
+            HandRange.from_cards(villain),
+            board,
+        )
+        expected = EquityCalculator(workers=0).calculate(
+            [hero, villain], board,
+        )
+
+        self.assertTrue(result.exact)
+        for got, want in zip(result.players, expected.players):
+            self.assertAlmostEqual(want.win, got.win)
+            self.assertAlmostEqual(want.tie, got.tie)
+
+    def test_card_removal(self):
+        # Only K♦K♣ does not share a card with the board or the hero.
+        result = range_equity(
+            HandRange.from_cards(cards("A♠ K♠")),
+            parse_range("KK"),
+            cards("K♥ 7♦ 2♣ 9♠ 3♥"),
+        )
+
+        self.assertEqual(0, result.players[0].win)
+        self.assertEqual(100, result.players[1].win)
+
+    def test_same_ranges_are_even(self):
+        result = range_equity(
+            parse_range("top 10%"),
+            parse_range("top 10%"),
+            cards("2♠ 7♥ J♦ Q♣"),
+            executor=ThreadPoolExecutor(2),
+        )
+
+        self.assertAlmostEqual(
+            result.players[0].win,
+            result.players[1].win,
+        )
+        self.assertAlmostEqual(100, sum(
+            [result.players[0].win, result.players[1].win,
+             result.players[0].tie],
+        ))
+
+    def test_sampled_preflop(self):
+        result = range_equity(parse_range("AA"), parse_range("KK"), seed=3)
+
+        self.assertFalse(result.exact)
+        self.assertAlmostEqual(82, result.players[0].equity, delta=2)
+
+    def test_ranges_never_meet(self):
+        self.assertIsNone(range_equity(
+            parse_range("AhAs"),
+            parse_range("AhAd"),
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -57,9 +57,13 @@ class TestRoundRateModel(unittest.TestCase):
 
     @staticmethod
     def _create_player(user_id: str) -> Player:
-        player: Player = Player(user_id, user_id, user_id, MagicMock(spec=Wallet), '0')
-        player.bet_amount = 0
-        player.wallet.authorize = lambda game_id, amount: setattr(player, 'bet_amount', player.bet_amount + amount)
+        player: Player = Player(
+            user_id, user_id, user_id, MagicMock(spec=Wallet), '0',
+        )
+        player.wallet.bet_amount = 0
+        player.wallet.authorize = lambda game_id, amount: setattr(
+            player.wallet, 'bet_amount', player.wallet.bet_amount + amount,
+        )
         player.round_rate = 0
         return player
 
@@ -89,15 +93,22 @@ class TestRoundRateModel(unittest.TestCase):
         second_winner = self._next_player(g, 50)
         loser = self._next_player(g, 100)
 
-        self._round_rate.finish_rate(g, player_scores={
+        winners, returned = self._round_rate.finish_rate(g, player_scores={
             1: [with_cards(first_winner), with_cards(second_winner)],
             0: [with_cards(loser)],
         })
         self._approve_all(g)
 
-        self.assertAlmostEqual(100, first_winner.wallet.value(), places=1)
-        self.assertAlmostEqual(100, second_winner.wallet.value(), places=1)
-        self.assertAlmostEqual(0, loser.wallet.value(), places=1)
+        self.assertEqual(
+            [(first_winner, 75), (second_winner, 75)],
+            [(p, money) for p, _, money in winners],
+        )
+        self.assertEqual([(loser, 50)], returned)
+
+        self.assertAlmostEqual(75, first_winner.wallet.value(), places=1)
+        self.assertAlmostEqual(75, second_winner.wallet.value(), places=1)
+        # The uncalled part of the bet goes back.
+        self.assertAlmostEqual(50, loser.wallet.value(), places=1)
         self.assert_authorized_money_zero(
             g.id,
             first_winner,
@@ -119,12 +130,11 @@ class TestRoundRateModel(unittest.TestCase):
         })
         self._approve_all(g)
 
-        # authorized * len(players)
-        self.assertAlmostEqual(60, first_winner.wallet.value(), places=1)
-        # authorized * len(players)
-        self.assertAlmostEqual(20, second_winner.wallet.value(), places=1)
-        # pot - winners
-        self.assertAlmostEqual(120, extra_winner.wallet.value(), places=1)
+        # Main pot 5 * 4 split, side pot 10 * 3.
+        self.assertAlmostEqual(40, first_winner.wallet.value(), places=1)
+        self.assertAlmostEqual(10, second_winner.wallet.value(), places=1)
+        # Side pot 75 * 2.
+        self.assertAlmostEqual(150, extra_winner.wallet.value(), places=1)
 
         self.assertAlmostEqual(0, loser.wallet.value(), places=1)
 
@@ -170,9 +180,9 @@ class TestRoundRateModel(unittest.TestCase):
         })
         self._approve_all(g)
 
-        # pot * (autorized / winners_authorized)
-        self.assertAlmostEqual(4, first_winner.wallet.value(), places=1)
-        self.assertAlmostEqual(79, second_winner.wallet.value(), places=1)
+        # Main pot 3 * 4 split, side pots 7 * 3 and 50 * 1.
+        self.assertAlmostEqual(6, first_winner.wallet.value(), places=1)
+        self.assertAlmostEqual(77, second_winner.wallet.value(), places=1)
 
         self.assertAlmostEqual(0, third_loser.wallet.value(), places=1)
         self.assertAlmostEqual(0, fourth_loser.wallet.value(), places=1)
@@ -192,15 +202,21 @@ class TestRoundRateModel(unittest.TestCase):
             player_three,
         ]
 
-        self.assertEqual(0, player_one.bet_amount)
-        self.assertEqual(0, player_two.bet_amount)
-        self.assertEqual(0, player_three.bet_amount)
+        self.assertEqual(0, player_one.wallet.bet_amount)
+        self.assertEqual(0, player_two.wallet.bet_amount)
+        self.assertEqual(0, player_three.wallet.bet_amount)
 
         self._round_rate.round_pre_flop_rate_before_first_turn(g)
 
-        self.assertEqual(PlayerAction.BIG_BLIND.value / 2, player_one.bet_amount)
-        self.assertEqual(PlayerAction.BIG_BLIND.value, player_two.bet_amount)
-        self.assertEqual(0, player_three.bet_amount)
+        self.assertEqual(
+            PlayerAction.BIG_BLIND.value / 2,
+            player_one.wallet.bet_amount,
+        )
+        self.assertEqual(
+            PlayerAction.BIG_BLIND.value,
+            player_two.wallet.bet_amount,
+        )
+        self.assertEqual(0, player_three.wallet.bet_amount)
 
     def test_raise_rate_bet__preflop_raise_from_small_bling(self):
         g = Game()
@@ -213,19 +229,28 @@ class TestRoundRateModel(unittest.TestCase):
             player_three,
         ]
 
-        self.assertEqual(0, player_one.bet_amount)
-        self.assertEqual(0, player_two.bet_amount)
-        self.assertEqual(0, player_three.bet_amount)
+        self.assertEqual(0, player_one.wallet.bet_amount)
+        self.assertEqual(0, player_two.wallet.bet_amount)
+        self.assertEqual(0, player_three.wallet.bet_amount)
 
         self._round_rate.round_pre_flop_rate_before_first_turn(g)
 
-        self.assertEqual(PlayerAction.BIG_BLIND.value / 2, player_one.bet_amount)
-        self.assertEqual(PlayerAction.BIG_BLIND.value, player_two.bet_amount)
-        self.assertEqual(0, player_three.bet_amount)
+        self.assertEqual(
+            PlayerAction.BIG_BLIND.value / 2,
+            player_one.wallet.bet_amount,
+        )
+        self.assertEqual(
+            PlayerAction.BIG_BLIND.value,
+            player_two.wallet.bet_amount,
+        )
+        self.assertEqual(0, player_three.wallet.bet_amount)
 
         raise_amount = 10
         self._round_rate.raise_rate_bet(g, player_one, raise_amount)
-        self.assertEqual(PlayerAction.BIG_BLIND.value + raise_amount, player_one.bet_amount)
+        self.assertEqual(
+            PlayerAction.BIG_BLIND.value + raise_amount,
+            player_one.wallet.bet_amount,
+        )
 
 
 if __name__ == '__main__':
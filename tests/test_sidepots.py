@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import unittest
+
+from pokerapp.model.sidepots import build_side_pots, pay_side_pots
+
+# Set to millions for a long run, the default keeps the suite fast.
+SIMULATIONS = int(os.getenv("POKERBOT_SIDEPOT_SIMULATIONS", "20000"))
+
+
+class TestSidePots(unittest.TestCase):
+    def test_layers(self):
+        pots = build_side_pots([15, 5, 90, 90], [2, 2, 1, 0])
+
+        self.assertListEqual(
+            [(20, [0, 1]), (30, [0]), (150, [2])],
+            [(pot.amount, pot.winners) for pot in pots],
+        )
+        self.assertListEqual([40, 10, 150, 0], pay_side_pots(pots, 4))
+
+    def test_folded_player_pays_in(self):
+        pots = build_side_pots([40, 20, 20], [None, 1, 0])
+
+        # The 20 only the folded player put in goes to the layer below.
+        self.assertListEqual([0, 80, 0], pay_side_pots(pots, 3))
+
+    def test_odd_chips_go_to_first_seats(self):
+        pots = build_side_pots([5, 5, 5, 0], [1, 0, 1, None])
+
+        self.assertListEqual([8, 0, 7, 0], pay_side_pots(pots, 4))
+
+    def test_chips_are_conserved(self):
+        rnd = random.Random(11)
+        for _ in range(SIMULATIONS):
+            count = rnd.randint(2, 8)
+            contributions = [rnd.randint(0, 50) * 5 for _ in range(count)]
+            scores = [
+                rnd.choice([None, rnd.randint(0, 6)])
+                for _ in range(count)
+            ]
+            # Someone is still in the hand and has put money in.
+            seat = rnd.randrange(count)
+            scores[seat] = rnd.randint(0, 6)
+            contributions[seat] += rnd.randint(1, 3)
+
+            payouts = pay_side_pots(
+                build_side_pots(contributions, scores),
+                count,
+            )
+
+            self.assertEqual(sum(contributions), sum(payouts))
+            for seat in range(count):
+                if scores[seat] is None:
+                    self.assertEqual(0, payouts[seat])
+
+
+if __name__ == '__main__':
+    unittest.main()
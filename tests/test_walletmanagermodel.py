@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+import threading
+import unittest
+from uuid import uuid4
+
+import redis
+
+from pokerapp.config import Config
+from pokerapp.entity.userexception import UserException
+from pokerapp.kv.memory import MemoryKv
+from pokerapp.model.walletmanagermodel import (
+    DEFAULT_MONEY,
+    WalletManagerModel,
+    WalletRegistry,
+)
+
+
+class DictKv:
+    """ Redis stand-in without scripting. """
+
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    def hget(self, name, key):
+        value = self.data.get(name, {}).get(key)
+        return None if value is None else str(value).encode()
+
+    def hset(self, name, key, value):
+        self.data.setdefault(name, {})[key] = value
+
+    def hsetnx(self, name, key, value):
+        if key in self.data.get(name, {}):
+            return 0
+        self.hset(name, key, value)
+        return 1
+
+    def hincrby(self, name, key, amount):
+        fields = self.data.setdefault(name, {})
+        fields[key] = int(fields.get(key, 0)) + amount
+        return fields[key]
+
+    def hdel(self, name, key):
+        return int(self.data.get(name, {}).pop(key, None) is not None)
+
+    def expire(self, name, seconds):
+        self.ttl[name] = seconds
+
+
+class TestWalletManagerModel(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super(TestWalletManagerModel, self).__init__(*args, **kwargs)
+        cfg: Config = Config()
+        self._kv = redis.Redis(
+            host=cfg.REDIS_HOST,
+            port=cfg.REDIS_PORT,
+            db=cfg.REDIS_DB,
+            password=cfg.REDIS_PASS if cfg.REDIS_PASS != "" else None
+        )
+
+    def _assert_wallet_operations(self, kv) -> None:
+        wallet = WalletManagerModel(str(uuid4()), kv=kv)
+        game_id = str(uuid4())
+
+        wallet.authorize(game_id, 300)
+        self.assertEqual(DEFAULT_MONEY - 300, wallet.value())
+        self.assertEqual(300, wallet.authorized_money(game_id))
+
+        self.assertRaises(
+            UserException,
+            wallet.authorize, game_id, DEFAULT_MONEY,
+        )
+        self.assertEqual(DEFAULT_MONEY - 300, wallet.value())
+
+        self.assertEqual(DEFAULT_MONEY - 300, wallet.authorize_all(game_id))
+        self.assertEqual(0, wallet.value())
+        self.assertEqual(DEFAULT_MONEY, wallet.authorized_money(game_id))
+
+        wallet.inc(50)
+        self.assertRaises(UserException, wallet.inc, -51)
+        self.assertEqual(50, wallet.value())
+
+        wallet.approve(game_id)
+        self.assertEqual(0, wallet.authorized_money(game_id))
+
+    def test_scripted_operations(self):
+        self._assert_wallet_operations(self._kv)
+
+    def test_memory_backend_operations(self):
+        self._assert_wallet_operations(MemoryKv())
+
+    def test_plain_commands_without_scripting(self):
+        self._assert_wallet_operations(DictKv())
+
+    def _assert_daily_paid_once(self, kv) -> None:
+        wallets = [WalletManagerModel("daily" + str(uuid4()), kv=kv)]
+        wallets += [
+            WalletManagerModel(wallets[0].user_id, kv=kv, known_to_exist=True)
+            for _ in range(7)
+        ]
+        paid = []
+        start = threading.Barrier(len(wallets))
+
+        def bonus(wallet: WalletManagerModel) -> None:
+            start.wait()
+            try:
+                paid.append(wallet.add_daily(100))
+            except UserException:
+                pass
+
+        threads = [
+            threading.Thread(target=bonus, args=(w,)) for w in wallets
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([DEFAULT_MONEY + 100], paid)
+        self.assertRaises(UserException, wallets[0].add_daily, 100)
+        self.assertEqual(DEFAULT_MONEY + 100, wallets[0].value())
+
+    def test_scripted_daily_bonus_is_paid_once(self):
+        self._assert_daily_paid_once(self._kv)
+
+    def test_memory_daily_bonus_is_paid_once(self):
+        self._assert_daily_paid_once(MemoryKv())
+
+    def test_registry_reuses_wallets(self):
+        kv = DictKv()
+        registry = WalletRegistry(kv, max_size=1)
+
+        wallet = registry.get("1")
+        wallet.inc(5)
+        self.assertIs(wallet, registry.get("1"))
+
+        registry.get("2")
+        # Created again with SET NX, the money is kept.
+        self.assertIsNot(wallet, registry.get("1"))
+        self.assertEqual(DEFAULT_MONEY + 5, registry.get("1").value())
+
+
+if __name__ == '__main__':
+    unittest.main()